@@ -0,0 +1,275 @@
+"""Analyze emails offline and write the results as JSON lines.
+
+    python -m backend PATH [PATH ...] [-o results.jsonl] [--workers N]
+
+A path is an email (EML or MSG), an mbox or zip archive of emails, or a directory of
+any of them. An existing output file is appended to and the emails whose results it
+already holds are skipped, so an interrupted run can be resumed.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import json
+import os
+import sys
+import time
+import typing
+from collections.abc import AsyncIterator, Iterator
+from functools import partial
+from pathlib import Path
+
+from fastapi import status
+from loguru import logger
+from starlette.concurrency import iterate_in_threadpool
+
+from backend import clients, executors, factories, schemas, settings
+from backend.archives import iter_messages
+from backend.batch import IOCAggregator, map_unordered
+from backend.ioc_cache import ioc_cache
+
+# log the progress every PROGRESS_INTERVAL emails
+PROGRESS_INTERVAL = 1000
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend",
+        description="Analyze emails (EML, MSG, mbox and zip archives or directories of them) and write the results as JSON lines.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", type=Path, help="emails, archives or directories"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="-",
+        help="JSON lines file the results are appended to (default: stdout). Emails whose results it already holds are skipped.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of parser processes (0 parses on the event loop, default: number of CPUs)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=None,
+        help="number of emails analyzed at once (default: twice the number of workers)",
+    )
+    parser.add_argument(
+        "--integrations",
+        action="store_true",
+        help="get verdicts from SpamAssassin and the 3rd party APIs whose keys are set (only local verdicts are made by default)",
+    )
+    parser.add_argument("--log-level", default="INFO", help="log level (default: INFO)")
+    return parser.parse_args(argv)
+
+
+def iter_paths(paths: list[Path]) -> Iterator[Path]:
+    for path in paths:
+        if not path.is_dir():
+            yield path
+            continue
+
+        for root, dirs, files in os.walk(path):
+            # walk in a stable order so that runs (and their resumes) are alike
+            dirs.sort()
+            for file in sorted(files):
+                yield Path(root) / file
+
+
+def iter_emails(paths: list[Path]) -> Iterator[tuple[str | None, bytes]]:
+    for path in iter_paths(paths):
+        with path.open("rb") as f:
+            yield from iter_messages(f, str(path))
+
+
+def load_done_ids(output: str) -> set[str]:
+    """Get the IDs of the analyses already in the output (of a previous run)."""
+    ids: set[str] = set()
+    if output == "-" or not Path(output).is_file():
+        return ids
+
+    with open(output, "rb") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # e.g. the last line of an interrupted run
+                continue
+
+            if event.get("type") == "result":
+                ids.add(event["response"]["id"])
+
+    return ids
+
+
+def end_last_line(output: typing.BinaryIO):
+    """End the last line of an output (opened with "a+b") if an interrupted run cut it.
+
+    The results appended to the output then start on a line of their own.
+    """
+    if output.seek(0, os.SEEK_END) == 0:
+        return
+
+    output.seek(-1, os.SEEK_END)
+    if output.read(1) != b"\n":
+        output.write(b"\n")
+
+
+@dataclasses.dataclass
+class Progress:
+    pulled: int = 0
+    skipped: int = 0
+    written: int = 0
+    failed: int = 0
+
+
+async def iter_pending(
+    paths: list[Path], done_ids: set[str], progress: Progress
+) -> AsyncIterator[tuple[int, str | None, bytes]]:
+    # the archives are read (and split) in a thread, one email at a time
+    async for filename, file in iterate_in_threadpool(iter_emails(paths)):
+        if hashlib.sha256(file).hexdigest() in done_ids:
+            progress.skipped += 1
+            continue
+
+        yield progress.pulled, filename, file
+        progress.pulled += 1
+
+
+async def analyze_one(
+    item: tuple[int, str | None, bytes],
+    *,
+    executor: str,
+    spam_assassin: clients.SpamAssassin | None,
+    shared_clients: clients.SharedClients,
+    lookups: dict[str, typing.Any],
+) -> schemas.BatchResultEvent | schemas.BatchErrorEvent:
+    index, filename, file = item
+    try:
+        # raises a ValidationError (ValueError) if the file is not an email
+        file = schemas.FilePayload(file=file).file
+        with ioc_cache.batch(lookups):
+            response = await factories.ResponseFactory.call(
+                file,
+                spam_assassin=spam_assassin,
+                optional_email_rep=shared_clients.email_rep,
+                optional_vt=shared_clients.vt,
+                optional_urlscan=shared_clients.urlscan,
+                optional_ipqs=shared_clients.ipqs,
+                executor=executor,
+            )
+    except Exception as e:
+        logger.warning(f"Failed to analyze {filename}: {e}")
+        return schemas.BatchErrorEvent(
+            index=index,
+            filename=filename,
+            status=(
+                status.HTTP_422_UNPROCESSABLE_ENTITY
+                if isinstance(e, ValueError)
+                else status.HTTP_500_INTERNAL_SERVER_ERROR
+            ),
+            detail=str(e) or type(e).__name__,
+        )
+
+    return schemas.BatchResultEvent(index=index, filename=filename, response=response)
+
+
+async def run(
+    args: argparse.Namespace, output: typing.BinaryIO, done_ids: set[str]
+) -> schemas.BatchSummaryEvent:
+    executor = "process" if args.workers > 0 else "inline"
+    if executor == "process":
+        executors.start_process_pool(max_workers=args.workers)
+
+    # only local verdicts are made without the integrations
+    spam_assassin: clients.SpamAssassin | None = None
+    if args.integrations:
+        spam_assassin = clients.SpamAssassin(
+            host=settings.SPAMASSASSIN_HOST,
+            port=settings.SPAMASSASSIN_PORT,
+            timeout=settings.SPAMASSASSIN_TIMEOUT,
+        )
+
+    progress = Progress()
+    iocs = IOCAggregator()
+    # IOC lookups are shared by all the emails
+    lookups: dict[str, typing.Any] = {}
+    started_at = time.monotonic()
+    async with contextlib.AsyncExitStack() as stack:
+        shared_clients = (
+            await stack.enter_async_context(clients.open_shared_clients())
+            if args.integrations
+            else clients.SharedClients()
+        )
+        async for event in map_unordered(
+            partial(
+                analyze_one,
+                executor=executor,
+                spam_assassin=spam_assassin,
+                shared_clients=shared_clients,
+                lookups=lookups,
+            ),
+            iter_pending(args.paths, done_ids, progress),
+            max_at_once=args.concurrency or max(args.workers * 2, 1),
+        ):
+            if isinstance(event, schemas.BatchErrorEvent):
+                progress.failed += 1
+            else:
+                iocs.add(event.response)
+
+            # flushed line by line, so that an interrupted run can be resumed
+            output.write(event.model_dump_json(by_alias=True).encode() + b"\n")
+            output.flush()
+
+            progress.written += 1
+            if progress.written % PROGRESS_INTERVAL == 0:
+                elapsed = time.monotonic() - started_at
+                logger.info(f"Analyzed {progress.written} emails in {elapsed:.0f}s")
+
+    executors.shutdown_process_pool()
+    executors.shutdown_thread_pool()
+    return schemas.BatchSummaryEvent(
+        total=progress.pulled + progress.skipped,
+        analyzed=progress.written - progress.failed,
+        failed=progress.failed,
+        iocs=iocs.to_summary(),
+    )
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    done_ids = load_done_ids(args.output)
+    if len(done_ids) > 0:
+        logger.info(f"Skipping the {len(done_ids)} emails of a previous run")
+
+    # the parsers are needed right away
+    factories.warm_up()
+
+    with contextlib.ExitStack() as stack:
+        if args.output == "-":
+            output = sys.stdout.buffer
+        else:
+            output = stack.enter_context(open(args.output, "a+b"))
+            end_last_line(output)
+
+        summary = asyncio.run(run(args, output, done_ids))
+
+    logger.info(
+        f"Done: {summary.analyzed} analyzed, {summary.failed} failed, "
+        f"{summary.total - summary.analyzed - summary.failed} skipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
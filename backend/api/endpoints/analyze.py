@@ -1,23 +1,129 @@
-from fastapi import APIRouter, BackgroundTasks, File, HTTPException, status
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import itertools
+import typing
+from collections.abc import AsyncIterable, AsyncIterator, Buffer
+from functools import partial
+
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile, status
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from loguru import logger
 from pydantic import ValidationError
-from redis import Redis
+from redis.asyncio import Redis
+from redis.asyncio.lock import Lock
+from redis.exceptions import LockError
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 
 from backend import clients, dependencies, schemas, settings
-from backend.factories.response import ResponseFactory
+from backend.archives import iter_messages
+from backend.batch import IOCAggregator, map_unordered
+from backend.blobs import store_response_attachments
+from backend.cache import (
+    cache_response,
+    get_cached_response,
+    get_lock_key,
+    wait_for_cached_response,
+)
+from backend.factories.response import (
+    LateVerdictsCallback,
+    ResponseFactory,
+    VerdictTask,
+    get_verdict_tasks,
+    iter_verdicts,
+    parse_async,
+)
+from backend.ioc_cache import ioc_cache
+from backend.schemas.api_model import APIModel
+from backend.singleflight import SingleFlight
+from backend.uploads import UploadTooLargeError, iter_upload, spool_email
 
 router = APIRouter()
 
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
 
-async def _analyze(
-    file: bytes,
+single_flight = SingleFlight()
+
+ForceRefresh = typing.Annotated[
+    bool,
+    Query(
+        description="Re-analyze the file even if a cached analysis result is available"
+    ),
+]
+
+
+async def _analyze_once(
+    file: Buffer,
     *,
+    id: str,
     spam_assassin: clients.SpamAssassin,
+    optional_redis: Redis | None = None,
     optional_email_rep: clients.EmailRep | None = None,
     optional_vt: clients.VirusTotal | None = None,
     optional_urlscan: clients.UrlScan | None = None,
     optional_ipqs: clients.IPQualityScore | None = None,
 ) -> schemas.Response:
+    lock: Lock | None = None
+    if optional_redis is not None and settings.SINGLE_FLIGHT_REDIS_LOCK:
+        lock = optional_redis.lock(
+            get_lock_key(id), timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT
+        )
+        if not await lock.acquire(blocking=False):
+            # another worker is analyzing the same file
+            lock = None
+            cached = await wait_for_cached_response(optional_redis, id)
+            if cached is not None:
+                return cached
+
+    # set once the response is cached (so that late verdicts are not overwritten)
+    cached = asyncio.Event()
+    on_late_verdicts: LateVerdictsCallback | None = None
+    if optional_redis is not None and settings.VERDICTS_COMPLETE_LATE:
+        redis = optional_redis
+
+        async def cache_late_verdicts(completed: schemas.Response):
+            await cached.wait()
+            await cache_response(redis, completed)
+
+        on_late_verdicts = cache_late_verdicts
+
+    try:
+        # only the parse times out (the verdicts which do are reported as timed out)
+        try:
+            response = await ResponseFactory.call(
+                file,
+                optional_email_rep=optional_email_rep,
+                spam_assassin=spam_assassin,
+                optional_urlscan=optional_urlscan,
+                optional_vt=optional_vt,
+                optional_ipqs=optional_ipqs,
+                on_late_verdicts=on_late_verdicts,
+                # the file is not hashed again (e.g. a spooled one is hashed as received)
+                id=id,
+            )
+        except TimeoutError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Parsing the file timed out",
+            ) from exc
+
+        if optional_redis is not None:
+            if settings.ATTACHMENT_BLOB_MODE:
+                await store_response_attachments(optional_redis, response)
+
+            await cache_response(optional_redis, response)
+
+        return response
+    finally:
+        cached.set()
+        if lock is not None:
+            with contextlib.suppress(LockError):
+                await lock.release()
+
+
+def validate_file(file: bytes) -> bytes:
     try:
         payload = schemas.FilePayload(file=file)
     except ValidationError as exc:
@@ -26,95 +132,522 @@ async def _analyze(
             detail=jsonable_encoder(exc.errors()),
         ) from exc
 
-    return await ResponseFactory.call(
-        payload.file,
+    return payload.file
+
+
+async def _analyze_valid(
+    file: Buffer,
+    *,
+    id: str,
+    spam_assassin: clients.SpamAssassin,
+    optional_redis: Redis | None = None,
+    force_refresh: bool = False,
+    optional_email_rep: clients.EmailRep | None = None,
+    optional_vt: clients.VirusTotal | None = None,
+    optional_urlscan: clients.UrlScan | None = None,
+    optional_ipqs: clients.IPQualityScore | None = None,
+) -> schemas.Response:
+    """Analyze a validated file (or get its cached analysis)."""
+    if optional_redis is not None and settings.REDIS_READ_THROUGH and not force_refresh:
+        cached = await get_cached_response(optional_redis, id)
+        if cached is not None:
+            return cached
+
+    analyze_once = partial(
+        _analyze_once,
+        file,
+        id=id,
+        spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
         optional_email_rep=optional_email_rep,
+        optional_urlscan=optional_urlscan,
+        optional_vt=optional_vt,
+        optional_ipqs=optional_ipqs,
+    )
+    if settings.SINGLE_FLIGHT:
+        # concurrent requests of the same file share a single analysis
+        return await single_flight.do(id, analyze_once)
+
+    return await analyze_once()
+
+
+async def _analyze(
+    file: bytes,
+    *,
+    spam_assassin: clients.SpamAssassin,
+    optional_redis: Redis | None = None,
+    force_refresh: bool = False,
+    optional_email_rep: clients.EmailRep | None = None,
+    optional_vt: clients.VirusTotal | None = None,
+    optional_urlscan: clients.UrlScan | None = None,
+    optional_ipqs: clients.IPQualityScore | None = None,
+) -> schemas.Response:
+    file = validate_file(file)
+    return await _analyze_valid(
+        file,
+        id=hashlib.sha256(file).hexdigest(),
         spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
+        optional_email_rep=optional_email_rep,
         optional_urlscan=optional_urlscan,
         optional_vt=optional_vt,
         optional_ipqs=optional_ipqs,
     )
 
 
-def cache_response(
-    redis: Redis,
-    response: schemas.Response,
-    expire: int = settings.REDIS_EXPIRE,
-    key_prefix: str = settings.REDIS_KEY_PREFIX,
-):
-    ex = expire if expire > 0 else None
-    redis.set(f"{key_prefix}:{response.id}", value=response.model_dump_json(), ex=ex)
+async def _analyze_upload(
+    chunks: AsyncIterable[bytes],
+    *,
+    spam_assassin: clients.SpamAssassin,
+    optional_redis: Redis | None = None,
+    force_refresh: bool = False,
+    optional_email_rep: clients.EmailRep | None = None,
+    optional_vt: clients.VirusTotal | None = None,
+    optional_urlscan: clients.UrlScan | None = None,
+    optional_ipqs: clients.IPQualityScore | None = None,
+) -> schemas.Response:
+    try:
+        async with spool_email(chunks) as spool:
+            if not await run_in_threadpool(spool.is_email):
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    # the same error as the validation of a FilePayload
+                    detail=[
+                        {
+                            "type": "value_error",
+                            "loc": ["file"],
+                            "msg": "Value error, Invalid file format.",
+                        }
+                    ],
+                )
+
+            id, view = spool.sha256, spool.view()
+    except UploadTooLargeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE, detail=str(exc)
+        ) from exc
+
+    # the view outlives the spool (as a shared analysis may outlive this request)
+    return await _analyze_valid(
+        view,
+        id=id,
+        spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
+        optional_email_rep=optional_email_rep,
+        optional_urlscan=optional_urlscan,
+        optional_vt=optional_vt,
+        optional_ipqs=optional_ipqs,
+    )
 
 
 @router.post(
     "/",
     response_description="Full analysis result including headers, bodies, attachments, IOCs, and verdicts",
     summary="Analyze an email (base64)",
-    description="Submit a base64-encoded EML or MSG file for analysis. The file is parsed to extract headers, body content, attachments, and IOCs. If configured, results are enriched with VirusTotal, urlscan.io, EmailRep, IPQualityScore, and SpamAssassin verdicts. When Redis is available, results are cached for later retrieval.",
+    description="Submit a base64-encoded EML or MSG file for analysis. The file is parsed to extract headers, body content, attachments, and IOCs. If configured, results are enriched with VirusTotal, urlscan.io, EmailRep, IPQualityScore, and SpamAssassin verdicts. When Redis is available, results are cached for later retrieval and a cached result of the same file is returned unless `force_refresh` is set.",
     responses={
         422: {"description": "Invalid file format or payload validation error"},
+        504: {"description": "Parsing the file timed out"},
     },
 )
 async def analyze(
     payload: schemas.Payload,
     *,
-    background_tasks: BackgroundTasks,
     spam_assassin: dependencies.SpamAssassin,
     optional_redis: dependencies.OptionalRedis,
     optional_email_rep: dependencies.OptionalEmailRep,
     optional_vt: dependencies.OptionalVirusTotal,
     optional_urlscan: dependencies.OptionalUrlScan,
     optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
 ) -> schemas.Response:
-    response = await _analyze(
+    return await _analyze(
         payload.file.encode(),
         spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
         optional_email_rep=optional_email_rep,
         optional_urlscan=optional_urlscan,
         optional_vt=optional_vt,
         optional_ipqs=optional_ipqs,
     )
 
-    if optional_redis is not None:
-        background_tasks.add_task(
-            cache_response, redis=optional_redis, response=response
-        )
-
-    return response
-
 
 @router.post(
     "/file",
     response_description="Full analysis result including headers, bodies, attachments, IOCs, and verdicts",
     summary="Analyze an email (file upload)",
-    description="Upload a raw EML or MSG file for analysis via multipart form data. The file is parsed to extract headers, body content, attachments, and IOCs. If configured, results are enriched with VirusTotal, urlscan.io, EmailRep, IPQualityScore, and SpamAssassin verdicts. When Redis is available, results are cached for later retrieval.",
+    description="Upload a raw EML or MSG file for analysis via multipart form data. The file is parsed to extract headers, body content, attachments, and IOCs. If configured, results are enriched with VirusTotal, urlscan.io, EmailRep, IPQualityScore, and SpamAssassin verdicts. When Redis is available, results are cached for later retrieval and a cached result of the same file is returned unless `force_refresh` is set. The file is spooled (to a temporary file beyond `UPLOAD_MAX_MEMORY_SIZE`) and parsed from there rather than read into memory.",
     responses={
+        413: {"description": "The email is larger than `UPLOAD_MAX_SIZE`"},
         422: {"description": "Invalid file format or payload validation error"},
+        504: {"description": "Parsing the file timed out"},
     },
 )
 async def analyze_file(
-    file: bytes = File(...),
+    file: UploadFile,
     *,
-    background_tasks: BackgroundTasks,
     optional_redis: dependencies.OptionalRedis,
     spam_assassin: dependencies.SpamAssassin,
     optional_email_rep: dependencies.OptionalEmailRep,
     optional_vt: dependencies.OptionalVirusTotal,
     optional_urlscan: dependencies.OptionalUrlScan,
     optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
 ) -> schemas.Response:
-    response = await _analyze(
-        file,
+    return await _analyze_upload(
+        iter_upload(file),
+        spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
         optional_email_rep=optional_email_rep,
+        optional_urlscan=optional_urlscan,
+        optional_vt=optional_vt,
+        optional_ipqs=optional_ipqs,
+    )
+
+
+@router.post(
+    "/raw",
+    response_description="Full analysis result including headers, bodies, attachments, IOCs, and verdicts",
+    summary="Analyze an email (raw request body)",
+    description="Send a raw EML or MSG file as the request body (e.g. `curl --data-binary @email.eml`). The body is spooled to a temporary file and hashed as it is received, so large emails are analyzed without being held in memory as a whole more than once. Otherwise the same as `/api/analyze/file`.",
+    responses={
+        413: {"description": "The email is larger than `UPLOAD_MAX_SIZE`"},
+        422: {"description": "Invalid file format"},
+        504: {"description": "Parsing the file timed out"},
+    },
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                media_type: {"schema": {"type": "string", "format": "binary"}}
+                for media_type in ["message/rfc822", "application/octet-stream"]
+            },
+        }
+    },
+)
+async def analyze_raw(
+    request: Request,
+    *,
+    optional_redis: dependencies.OptionalRedis,
+    spam_assassin: dependencies.SpamAssassin,
+    optional_email_rep: dependencies.OptionalEmailRep,
+    optional_vt: dependencies.OptionalVirusTotal,
+    optional_urlscan: dependencies.OptionalUrlScan,
+    optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
+) -> schemas.Response:
+    return await _analyze_upload(
+        request.stream(),
         spam_assassin=spam_assassin,
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
+        optional_email_rep=optional_email_rep,
         optional_urlscan=optional_urlscan,
         optional_vt=optional_vt,
         optional_ipqs=optional_ipqs,
     )
 
+
+def _to_ndjson(event: APIModel) -> bytes:
+    return event.model_dump_json(by_alias=True).encode() + b"\n"
+
+
+def _to_summary(response: schemas.Response) -> schemas.SummaryEvent:
+    return schemas.SummaryEvent(
+        id=response.id,
+        analyzed_at=response.analyzed_at,
+        verdicts=len(response.verdicts),
+        malicious=len([v for v in response.verdicts if v.malicious]),
+        errors=len([v for v in response.verdicts if v.error is not None]),
+    )
+
+
+async def _stream_cached(response: schemas.Response) -> AsyncIterator[bytes]:
+    yield _to_ndjson(
+        schemas.EmlEvent(
+            id=response.id,
+            eml=response.eml,
+            children=response.children,
+            cache=response.cache,
+        )
+    )
+    for verdict in response.verdicts:
+        yield _to_ndjson(schemas.VerdictEvent(verdict=verdict))
+
+    yield _to_ndjson(_to_summary(response))
+
+
+async def _stream_analysis(
+    response: schemas.Response,
+    tasks: list[tuple[str, VerdictTask]],
+    *,
+    optional_redis: Redis | None = None,
+) -> AsyncIterator[bytes]:
+    yield _to_ndjson(
+        schemas.EmlEvent(id=response.id, eml=response.eml, children=response.children)
+    )
+
+    async for verdict in iter_verdicts(tasks):
+        response.verdicts.append(verdict)
+        yield _to_ndjson(schemas.VerdictEvent(verdict=verdict))
+
     if optional_redis is not None:
-        background_tasks.add_task(
-            cache_response, redis=optional_redis, response=response
+        await cache_response(optional_redis, response)
+
+    yield _to_ndjson(_to_summary(response))
+
+
+@router.post(
+    "/stream",
+    response_class=StreamingResponse,
+    summary="Analyze an email (base64) with streamed results",
+    description="Submit a base64-encoded EML or MSG file for analysis and receive the result as newline-delimited JSON (`application/x-ndjson`) events: an `eml` event with the parsed email first, then a `verdict` event as soon as each verdict is made (local ones such as oleid, DKIM and homoglyph detection usually come within milliseconds) and finally a `summary` event. The full result is cached as `/api/analyze/` does, and a cached result of the same file is streamed unless `force_refresh` is set.",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "Stream of eml, verdict and summary events",
+        },
+        422: {"description": "Invalid file format or payload validation error"},
+        504: {"description": "Parsing the file timed out"},
+    },
+)
+async def analyze_stream(
+    payload: schemas.Payload,
+    *,
+    spam_assassin: dependencies.SpamAssassin,
+    optional_redis: dependencies.OptionalRedis,
+    optional_email_rep: dependencies.OptionalEmailRep,
+    optional_vt: dependencies.OptionalVirusTotal,
+    optional_urlscan: dependencies.OptionalUrlScan,
+    optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
+) -> StreamingResponse:
+    file = validate_file(payload.file.encode())
+    id = hashlib.sha256(file).hexdigest()
+    if optional_redis is not None and settings.REDIS_READ_THROUGH and not force_refresh:
+        cached = await get_cached_response(optional_redis, id)
+        if cached is not None:
+            return StreamingResponse(
+                _stream_cached(cached), media_type=NDJSON_MEDIA_TYPE
+            )
+
+    try:
+        response = await parse_async(file, id=id)
+    except TimeoutError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Parsing the file timed out",
+        ) from exc
+
+    response.analyzed_at = datetime.datetime.now(datetime.UTC)
+    tasks = get_verdict_tasks(
+        response,
+        eml_file=file,
+        spam_assassin=spam_assassin,
+        optional_email_rep=optional_email_rep,
+        optional_vt=optional_vt,
+        optional_urlscan=optional_urlscan,
+        optional_ipqs=optional_ipqs,
+    )
+    if optional_redis is not None and settings.ATTACHMENT_BLOB_MODE:
+        # stored before the eml event (which carries no raw contents then) but the
+        # verdicts (e.g. oleid) still use the raw contents of the original attachments
+        response = response.model_copy(deep=True)
+        await store_response_attachments(optional_redis, response)
+
+    return StreamingResponse(
+        _stream_analysis(response, tasks, optional_redis=optional_redis),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
+
+def _split_batch(files: list[UploadFile]) -> list[tuple[str | None, bytes]]:
+    # the emails of zip archives and mboxes are analyzed as members of the batch
+    messages = itertools.chain.from_iterable(
+        iter_messages(file.file, file.filename) for file in files
+    )
+    batch = list(itertools.islice(messages, settings.BATCH_MAX_FILES + 1))
+    if len(batch) > settings.BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"A batch is limited to {settings.BATCH_MAX_FILES} emails",
+        )
+
+    return batch
+
+
+async def _stream_batch(
+    messages: AsyncIterable[tuple[str | None, bytes]],
+    *,
+    spam_assassin: clients.SpamAssassin,
+    optional_redis: Redis | None = None,
+    force_refresh: bool = False,
+    max_messages: int | None = None,
+    optional_email_rep: clients.EmailRep | None = None,
+    optional_vt: clients.VirusTotal | None = None,
+    optional_urlscan: clients.UrlScan | None = None,
+    optional_ipqs: clients.IPQualityScore | None = None,
+) -> AsyncIterator[bytes]:
+    # IOC lookups are shared by all the emails of the batch
+    lookups: dict[str, typing.Any] = {}
+    total = 0
+    truncated = False
+
+    async def enumerate_messages() -> AsyncIterator[
+        tuple[int, tuple[str | None, bytes]]
+    ]:
+        nonlocal total, truncated
+        async for message in messages:
+            if max_messages is not None and total >= max_messages:
+                truncated = True
+                break
+
+            yield total, message
+            total += 1
+
+    async def analyze_one(
+        item: tuple[int, tuple[str | None, bytes]],
+    ) -> schemas.BatchResultEvent | schemas.BatchErrorEvent:
+        index, (filename, file) = item
+        try:
+            with ioc_cache.batch(lookups):
+                response = await _analyze(
+                    file,
+                    spam_assassin=spam_assassin,
+                    optional_redis=optional_redis,
+                    force_refresh=force_refresh,
+                    optional_email_rep=optional_email_rep,
+                    optional_vt=optional_vt,
+                    optional_urlscan=optional_urlscan,
+                    optional_ipqs=optional_ipqs,
+                )
+        except HTTPException as exc:
+            return schemas.BatchErrorEvent(
+                index=index,
+                filename=filename,
+                status=exc.status_code,
+                detail=exc.detail,
+            )
+        except Exception as exc:
+            logger.exception(exc)
+            return schemas.BatchErrorEvent(
+                index=index,
+                filename=filename,
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=str(exc) or type(exc).__name__,
+            )
+
+        return schemas.BatchResultEvent(
+            index=index, filename=filename, response=response
+        )
+
+    failed = 0
+    iocs = IOCAggregator()
+    async for event in map_unordered(
+        analyze_one, enumerate_messages(), max_at_once=settings.BATCH_MAX_AT_ONCE
+    ):
+        if isinstance(event, schemas.BatchErrorEvent):
+            failed += 1
+        else:
+            iocs.add(event.response)
+        yield _to_ndjson(event)
+
+    yield _to_ndjson(
+        schemas.BatchSummaryEvent(
+            total=total,
+            analyzed=total - failed,
+            failed=failed,
+            truncated=truncated,
+            iocs=iocs.to_summary(),
         )
+    )
+
 
-    return response
+@router.post(
+    "/batch",
+    response_class=StreamingResponse,
+    summary="Analyze many emails (file upload) with streamed results",
+    description="Upload many EML or MSG files (multipart form data, repeated `files` field), zip archives or mboxes of them for analysis in a single request, and receive a newline-delimited JSON (`application/x-ndjson`) `result` (or `error`) event per email as soon as its analysis is done, then a `summary` event with the IOCs of all the emails. Emails are analyzed `BATCH_MAX_AT_ONCE` at a time, and an IOC found in many emails of the batch is looked up once. Each result is cached as `/api/analyze/` does, and a cached result of the same file is returned unless `force_refresh` is set.",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "Stream of result, error and summary events",
+        },
+        413: {"description": "The batch has more than `BATCH_MAX_FILES` emails"},
+    },
+)
+async def analyze_batch(
+    files: typing.Annotated[
+        list[UploadFile],
+        File(description="EML or MSG files, or zip archives or mboxes of them"),
+    ],
+    *,
+    spam_assassin: dependencies.SpamAssassin,
+    optional_redis: dependencies.OptionalRedis,
+    optional_email_rep: dependencies.OptionalEmailRep,
+    optional_vt: dependencies.OptionalVirusTotal,
+    optional_urlscan: dependencies.OptionalUrlScan,
+    optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
+) -> StreamingResponse:
+    batch = await run_in_threadpool(_split_batch, files)
+    return StreamingResponse(
+        _stream_batch(
+            iterate_in_threadpool(iter(batch)),
+            spam_assassin=spam_assassin,
+            optional_redis=optional_redis,
+            force_refresh=force_refresh,
+            optional_email_rep=optional_email_rep,
+            optional_vt=optional_vt,
+            optional_urlscan=optional_urlscan,
+            optional_ipqs=optional_ipqs,
+        ),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
+
+
+@router.post(
+    "/archive",
+    response_class=StreamingResponse,
+    summary="Analyze a mailbox archive (file upload) with streamed results",
+    description="Upload an mbox or a zip archive of EML and MSG files (multipart form data, field name: `file`) and receive a newline-delimited JSON (`application/x-ndjson`) `result` (or `error`) event per email as soon as its analysis is done, then a `summary` event with the IOCs of all the emails. The archive is split one email at a time as the analyses progress (it is never wholly loaded into memory), emails are analyzed `BATCH_MAX_AT_ONCE` at a time and the ones beyond `ARCHIVE_MAX_MESSAGES` are skipped. Each result is cached as `/api/analyze/` does, and a cached result of the same file is returned unless `force_refresh` is set.",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "Stream of result, error and summary events",
+        },
+    },
+)
+async def analyze_archive(
+    file: typing.Annotated[
+        UploadFile, File(description="mbox or zip archive of EML or MSG files")
+    ],
+    *,
+    spam_assassin: dependencies.SpamAssassin,
+    optional_redis: dependencies.OptionalRedis,
+    optional_email_rep: dependencies.OptionalEmailRep,
+    optional_vt: dependencies.OptionalVirusTotal,
+    optional_urlscan: dependencies.OptionalUrlScan,
+    optional_ipqs: dependencies.OptionalIPQualityScore,
+    force_refresh: ForceRefresh = False,
+) -> StreamingResponse:
+    # an upload is spooled to a temporary file, from which the emails are read
+    messages = iterate_in_threadpool(iter_messages(file.file, file.filename))
+    return StreamingResponse(
+        _stream_batch(
+            messages,
+            spam_assassin=spam_assassin,
+            optional_redis=optional_redis,
+            force_refresh=force_refresh,
+            max_messages=settings.ARCHIVE_MAX_MESSAGES,
+            optional_email_rep=optional_email_rep,
+            optional_vt=optional_vt,
+            optional_urlscan=optional_urlscan,
+            optional_ipqs=optional_ipqs,
+        ),
+        media_type=NDJSON_MEDIA_TYPE,
+    )
@@ -0,0 +1,56 @@
+import typing
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
+
+from backend import dependencies
+from backend.blobs import get_blob_size, iter_blob
+
+router = APIRouter()
+
+
+@router.get(
+    "/{sha256}",
+    response_class=StreamingResponse,
+    response_description="The raw attachment content",
+    summary="Download an attachment",
+    description="Stream the raw content of an attachment stored by an analysis made with `ATTACHMENT_BLOB_MODE` enabled. Attachments are content-addressed by their SHA-256 hash. Requires Redis to be configured.",
+    responses={
+        200: {"content": {"application/octet-stream": {}}},
+        404: {"description": "No attachment found for the given SHA-256 hash"},
+        501: {"description": "Redis cache is not configured or unavailable"},
+    },
+)
+async def get_attachment(
+    sha256: str = Path(description="SHA-256 hash of the attachment"),
+    *,
+    optional_redis: dependencies.OptionalRedis,
+    filename: typing.Annotated[
+        str | None, Query(description="Filename of the download")
+    ] = None,
+) -> StreamingResponse:
+    if optional_redis is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Redis cache is not enabled",
+        )
+
+    size = await get_blob_size(optional_redis, sha256)
+    if size is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Attachment not found",
+        )
+
+    headers = {"Content-Length": str(size)}
+    if filename is not None:
+        headers["Content-Disposition"] = (
+            f"attachment; filename*=UTF-8''{quote(filename, safe='')}"
+        )
+
+    return StreamingResponse(
+        iter_blob(optional_redis, sha256, size),
+        media_type="application/octet-stream",
+        headers=headers,
+    )
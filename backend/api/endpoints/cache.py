@@ -1,30 +1,79 @@
-from fastapi import APIRouter, HTTPException, status
+import dataclasses
+import datetime
+import typing
 
-from backend import dependencies, settings
+from fastapi import APIRouter, HTTPException, Query, Response, status
+
+from backend import codec, dependencies, schemas, settings
+from backend.cache import list_cached_ids
+from backend.ioc_cache import ioc_cache
 
 router = APIRouter()
 
 
 @router.get(
     "/",
-    response_description="List of cached analysis IDs",
+    response_description="A page of cached analysis IDs (newest first)",
     summary="List cached analysis keys",
-    description="Retrieve all cached analysis result IDs from Redis. Each ID can be used with the lookup endpoint to fetch the full analysis. Requires Redis to be configured and cache listing to be enabled.",
+    description="Retrieve a page of cached analysis result IDs from Redis, newest first. Each ID can be used with the lookup endpoint to fetch the full analysis. The cursor of the next page is returned in the `X-Next-Cursor` response header (absent on the last page). Requires Redis to be configured and cache listing to be enabled.",
     responses={
+        400: {"description": "Invalid cursor"},
         501: {
             "description": "Redis cache is not configured or cache listing is disabled"
         },
     },
 )
-async def cache_keys(optional_redis: dependencies.OptionalRedis) -> list[str]:
+async def cache_keys(
+    response: Response,
+    optional_redis: dependencies.OptionalRedis,
+    limit: typing.Annotated[
+        int, Query(ge=1, le=1000, description="Maximum number of IDs to return")
+    ] = settings.REDIS_CACHE_LIST_PAGE_SIZE,
+    cursor: typing.Annotated[
+        str | None,
+        Query(description="Cursor returned in `X-Next-Cursor` of the previous page"),
+    ] = None,
+    since: typing.Annotated[
+        datetime.datetime | None,
+        Query(description="Only list analyses made at or after this time"),
+    ] = None,
+    until: typing.Annotated[
+        datetime.datetime | None,
+        Query(description="Only list analyses made at or before this time"),
+    ] = None,
+) -> list[str]:
     if optional_redis is None or not settings.REDIS_CACHE_LIST_AVAILABLE:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
             detail="Redis cache is not enabled",
         )
 
-    byte_keys: list[bytes] = optional_redis.keys(f"{settings.REDIS_KEY_PREFIX}:*")  # type: ignore
-    return [
-        byte_key.decode().removeprefix(f"{settings.REDIS_KEY_PREFIX}:")
-        for byte_key in byte_keys
-    ]
+    try:
+        ids, next_cursor = await list_cached_ids(
+            optional_redis, limit=limit, cursor=cursor, since=since, until=until
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+        ) from exc
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return ids
+
+
+@router.get(
+    "/stats",
+    response_description="Cache statistics of the worker serving the request",
+    summary="Get cache statistics",
+    description="Returns hit and miss counters of the per-IOC lookup cache (VirusTotal, urlscan.io, IPQualityScore and EmailRep) and the raw vs stored size of the analysis results cached by the worker serving the request.",
+)
+async def cache_stats() -> schemas.CacheStats:
+    return schemas.CacheStats(
+        ioc={
+            provider: schemas.IOCCacheCounter(**dataclasses.asdict(counter))
+            for provider, counter in ioc_cache.counters.items()
+        },
+        storage=schemas.CacheStorageCounter(**dataclasses.asdict(codec.counter)),
+    )
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, File, HTTPException, Path, status
+from redis.asyncio import Redis
+
+from backend import dependencies, schemas
+from backend.api.endpoints.analyze import ForceRefresh, validate_file
+from backend.jobs import QueueFullError, enqueue_job, get_job
+
+router = APIRouter()
+
+
+def _require_redis(optional_redis: Redis | None) -> Redis:
+    if optional_redis is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Redis cache is not enabled",
+        )
+
+    return optional_redis
+
+
+async def _submit(
+    file: bytes, *, optional_redis: Redis | None, force_refresh: bool
+) -> schemas.Job:
+    redis = _require_redis(optional_redis)
+    file = validate_file(file)
+    try:
+        return await enqueue_job(redis, file, force_refresh=force_refresh)
+    except QueueFullError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many jobs are queued, try again later",
+        ) from exc
+
+
+@router.post(
+    "/",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_description="The submitted job",
+    summary="Submit an analysis job (base64)",
+    description="Queue a base64-encoded EML or MSG file for analysis by a worker (`python -m backend.worker`) and return the job right away. Poll `/api/jobs/{id}` for its status and result. The job ID is the SHA-256 of the file: a file already queued or being analyzed is not queued again, and a file with a cached analysis result is done right away unless `force_refresh` is set. Requires Redis to be configured.",
+    responses={
+        422: {"description": "Invalid file format or payload validation error"},
+        501: {"description": "Redis cache is not configured or unavailable"},
+        503: {"description": "Too many jobs are queued"},
+    },
+)
+async def submit_job(
+    payload: schemas.Payload,
+    *,
+    optional_redis: dependencies.OptionalRedis,
+    force_refresh: ForceRefresh = False,
+) -> schemas.Job:
+    return await _submit(
+        payload.file.encode(),
+        optional_redis=optional_redis,
+        force_refresh=force_refresh,
+    )
+
+
+@router.post(
+    "/file",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_description="The submitted job",
+    summary="Submit an analysis job (file upload)",
+    description="Queue an uploaded EML or MSG file (multipart form data) for analysis by a worker and return the job right away. Poll `/api/jobs/{id}` for its status and result. Requires Redis to be configured.",
+    responses={
+        422: {"description": "Invalid file format or payload validation error"},
+        501: {"description": "Redis cache is not configured or unavailable"},
+        503: {"description": "Too many jobs are queued"},
+    },
+)
+async def submit_job_file(
+    file: bytes = File(...),
+    *,
+    optional_redis: dependencies.OptionalRedis,
+    force_refresh: ForceRefresh = False,
+) -> schemas.Job:
+    return await _submit(
+        file, optional_redis=optional_redis, force_refresh=force_refresh
+    )
+
+
+@router.get(
+    "/{id}",
+    response_description="The job and, once it is done, its analysis result",
+    summary="Get a job",
+    description="Get the status (`queued`, `running`, `done` or `failed`) of an analysis job. A done job carries its analysis result in `response` (unless the cached result has expired since), and a failed one the reason in `error`. Requires Redis to be configured.",
+    responses={
+        404: {"description": "No job found for the given ID"},
+        501: {"description": "Redis cache is not configured or unavailable"},
+    },
+)
+async def get_job_status(
+    id: str = Path(description="ID of the job (SHA-256 of the file)"),
+    *,
+    optional_redis: dependencies.OptionalRedis,
+) -> schemas.Job:
+    redis = _require_redis(optional_redis)
+    job = await get_job(redis, id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+
+    return job
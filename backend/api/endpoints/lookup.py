@@ -1,17 +1,26 @@
-from fastapi import APIRouter, HTTPException, Path, status
+import typing
 
-from backend import dependencies, schemas, settings
+from fastapi import APIRouter, Header, HTTPException, Path, Query, Response, status
+from loguru import logger
+
+from backend import codec, dependencies, schemas
+from backend.cache import etag_matches, get_etag, get_key
 
 router = APIRouter()
 
 
 @router.get(
     "/{id}",
+    response_model=schemas.Response,
     response_description="The cached analysis result including headers, bodies, attachments, IOCs, and verdicts",
     summary="Lookup cached analysis",
-    description="Retrieve a previously cached analysis result by its unique ID. Returns the full analysis response if found in Redis. Requires Redis to be configured and the analysis to still be within the cache TTL.",
+    description="Retrieve a previously cached analysis result by its unique ID. Returns the full analysis response if found in Redis. The cached JSON is served as it is (set `validate` to re-validate it against the schema) with an `ETag`, so a request with a matching `If-None-Match` gets a 304. Requires Redis to be configured and the analysis to still be within the cache TTL.",
     responses={
+        304: {"description": "The cached analysis matches the `If-None-Match` ETag"},
         404: {"description": "No cached analysis found for the given ID"},
+        500: {
+            "description": "The cached analysis cannot be decoded (e.g. it was written by a newer version)"
+        },
         501: {"description": "Redis cache is not configured or unavailable"},
     },
 )
@@ -19,18 +28,48 @@ async def lookup(
     id: str = Path(description="Unique analysis result ID"),
     *,
     optional_redis: dependencies.OptionalRedis,
-) -> schemas.Response:
+    validate: typing.Annotated[
+        bool,
+        Query(description="Validate the cached analysis against the response schema"),
+    ] = False,
+    if_none_match: typing.Annotated[str | None, Header()] = None,
+) -> Response:
     if optional_redis is None:
         raise HTTPException(
             status_code=status.HTTP_501_NOT_IMPLEMENTED,
             detail="Redis cache is not enabled",
         )
 
-    got: bytes | None = optional_redis.get(f"{settings.REDIS_KEY_PREFIX}:{id}")  # type: ignore
+    got: bytes | None = await optional_redis.get(get_key(id))
     if got is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cache not found",
         )
 
-    return schemas.Response.model_validate_json(got.decode())
+    etag = get_etag(got)
+    if etag_matches(if_none_match, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+
+    try:
+        content = codec.decode(got)
+    except codec.CodecError as e:
+        logger.warning(f"Failed to decode the cached analysis {id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"The cached analysis cannot be decoded: {e}",
+        ) from e
+
+    # legacy entries were stored with field names instead of aliases
+    if validate or codec.is_legacy(got):
+        content = (
+            schemas.Response.model_validate_json(content)
+            .model_dump_json(by_alias=True)
+            .encode()
+        )
+
+    return Response(
+        content=content, media_type="application/json", headers={"ETag": etag}
+    )
@@ -2,6 +2,7 @@ import httpx
 from fastapi import APIRouter, HTTPException, status
 
 from backend import dependencies, schemas
+from backend.blobs import get_blob
 from backend.schemas.eml import Attachment
 from backend.utils import attachment_to_file
 
@@ -12,14 +13,18 @@ router = APIRouter()
     "/virustotal",
     response_description="Submission result with a link to the VirusTotal detection page",
     summary="Submit an attachment to VirusTotal",
-    description="Submit an email attachment to VirusTotal for malware scanning. Returns a reference URL to the VirusTotal detection results page for the submitted file. Requires a valid VirusTotal API key to be configured.",
+    description="Submit an email attachment to VirusTotal for malware scanning. Returns a reference URL to the VirusTotal detection results page for the submitted file. If `raw` is omitted, the attachment stored as a blob (see `ATTACHMENT_BLOB_MODE`) is submitted by its SHA-256 hash. Requires a valid VirusTotal API key to be configured.",
     status_code=200,
     responses={
         403: {"description": "VirusTotal API key is not configured"},
+        404: {"description": "No attachment blob found for the given SHA-256 hash"},
     },
 )
 async def submit_to_virustotal(
-    attachment: Attachment, *, optional_vt: dependencies.OptionalVirusTotal
+    attachment: Attachment,
+    *,
+    optional_vt: dependencies.OptionalVirusTotal,
+    optional_redis: dependencies.OptionalRedis,
 ) -> schemas.SubmissionResult:
     if optional_vt is None:
         raise HTTPException(
@@ -27,8 +32,19 @@ async def submit_to_virustotal(
             detail="You don't have the VirusTotal API key",
         )
 
+    content: bytes | None = None
+    if attachment.raw is None:
+        if optional_redis is not None:
+            content = await get_blob(optional_redis, attachment.hash.sha256)
+
+        if content is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Attachment not found",
+            )
+
     try:
-        await optional_vt.scan_file_async(attachment_to_file(attachment))
+        await optional_vt.scan_file_async(attachment_to_file(attachment, content))
         sha256 = attachment.hash.sha256
         return schemas.SubmissionResult(
             reference_url=f"https://www.virustotal.com/gui/file/{sha256}/detection"
@@ -0,0 +1,138 @@
+import re
+import zipfile
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from loguru import logger
+
+from backend import settings
+
+ZIP_SIGNATURE = b"PK\x03\x04"
+# the "From " line which starts each message of an mbox
+MBOX_SIGNATURE = b"From "
+
+# a ">From " line escaped by mboxrd (">>From " for a ">From " line and so on)
+_ESCAPED_FROM_RE = re.compile(rb"^>+From ")
+
+
+def is_zip_file(head: bytes) -> bool:
+    return head.startswith(ZIP_SIGNATURE)
+
+
+def is_mbox_file(head: bytes) -> bool:
+    return head.startswith(MBOX_SIGNATURE)
+
+
+def _get_name(filename: str | None, name: str) -> str:
+    return f"{filename}/{name}" if filename else name
+
+
+def _read_member(
+    archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_size: int | None
+) -> bytes:
+    if max_size is None:
+        return archive.read(info)
+
+    if info.file_size > max_size:
+        raise ValueError(f"Over {max_size} bytes")
+
+    # the size in the header may lie, so no more than max_size bytes are decompressed
+    with archive.open(info) as member:
+        content = member.read(max_size + 1)
+
+    if len(content) > max_size:
+        raise ValueError(f"Over {max_size} bytes")
+
+    return content
+
+
+def iter_zip(
+    file: BinaryIO,
+    filename: str | None = None,
+    *,
+    max_member_size: int | None = settings.ARCHIVE_MAX_MEMBER_SIZE,
+) -> Iterator[tuple[str, bytes]]:
+    """Yield the members of a zip archive one at a time (as (name, content)).
+
+    The members larger than max_member_size bytes (once decompressed) are skipped, as
+    are the broken, encrypted or otherwise unreadable ones.
+    """
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+
+            name = _get_name(filename, info.filename)
+            try:
+                content = _read_member(archive, info, max_member_size)
+            except (
+                ValueError,
+                zipfile.BadZipFile,
+                RuntimeError,
+                NotImplementedError,
+            ) as e:
+                logger.warning(f"Skipped {name}: {e}")
+                continue
+
+            yield name, content
+
+
+def iter_mbox(
+    file: BinaryIO, filename: str | None = None
+) -> Iterator[tuple[str, bytes]]:
+    """Split an mbox into its messages (as (name, content)) while reading it line by line.
+
+    A message starts at each "From " line, which is not part of the message, and the
+    ">From " lines escaped by mboxrd are unescaped.
+    """
+    lines: list[bytes] | None = None
+    count = 0
+
+    def to_message(lines: list[bytes]) -> tuple[str, bytes]:
+        # the blank line separating a message from the next "From " line
+        if len(lines) > 0 and lines[-1].strip() == b"":
+            lines = lines[:-1]
+        return _get_name(filename, f"{count}"), b"".join(lines)
+
+    for line in file:
+        if line.startswith(MBOX_SIGNATURE):
+            if lines is not None:
+                yield to_message(lines)
+
+            count += 1
+            lines = []
+            continue
+
+        if lines is None:
+            # not an mbox (or garbage before its first message)
+            continue
+
+        if _ESCAPED_FROM_RE.match(line):
+            line = line[1:]
+
+        lines.append(line)
+
+    if lines is not None:
+        yield to_message(lines)
+
+
+def iter_messages(
+    file: BinaryIO, filename: str | None = None
+) -> Iterator[tuple[str | None, bytes]]:
+    """Yield the emails of a zip archive, of an mbox or the email the file is itself.
+
+    The file has to be seekable. The emails are read one at a time, so an archive is
+    never wholly loaded into memory.
+    """
+    file.seek(0)
+    head = file.read(max(len(ZIP_SIGNATURE), len(MBOX_SIGNATURE)))
+    # a broken zip archive is left to the validation of the file
+    is_zip = is_zip_file(head) and zipfile.is_zipfile(file)
+    file.seek(0)
+
+    if is_zip:
+        yield from iter_zip(file, filename)
+    elif is_mbox_file(head):
+        yield from iter_mbox(file, filename)
+    else:
+        yield filename, file.read()
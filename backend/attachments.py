@@ -0,0 +1,72 @@
+import base64
+import mmap
+import tempfile
+import threading
+from typing import TYPE_CHECKING
+
+from backend import settings
+
+if TYPE_CHECKING:
+    from backend.schemas.eml import Attachment
+
+# number of base64 characters decoded at once into a temporary file (a multiple of 4, as
+# eml_parser encodes the attachments without line breaks)
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def decode_to_file(raw: str) -> memoryview:
+    """Decode a base64 string chunk by chunk into a temporary file and map it."""
+    with tempfile.TemporaryFile() as file:
+        for start in range(0, len(raw), DECODE_CHUNK_SIZE):
+            file.write(base64.b64decode(raw[start : start + DECODE_CHUNK_SIZE]))
+
+        if file.tell() == 0:
+            return memoryview(b"")
+
+        file.flush()
+        # the map holds a file descriptor of its own, so the (unlinked) file is
+        # removed once the map is dropped
+        return memoryview(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class AttachmentStore:
+    """The decoded contents of the attachments of an analysis, keyed by SHA-256.
+
+    An attachment is decoded once, on first use, and its content is shared as a read-only
+    memoryview by the consumers (oleid, the attached emails, the attachment blobs). The
+    contents are kept in memory up to max_memory_size bytes in total and in temporary
+    files beyond. It is shared by the threads of the checks, so it is locked while an
+    attachment is decoded.
+    """
+
+    def __init__(self, *, max_memory_size: int = settings.ATTACHMENT_MAX_MEMORY_SIZE):
+        self.max_memory_size = max_memory_size
+        self.memory_size = 0
+
+        self._contents: dict[str, memoryview] = {}
+        self._lock = threading.Lock()
+
+    def __deepcopy__(self, memo: dict) -> "AttachmentStore":
+        # the contents are read-only, so a copy of a response shares them
+        return self
+
+    def get(self, attachment: "Attachment") -> memoryview | None:
+        """Get the content of an attachment (None if its raw content has been stripped)."""
+        sha256 = attachment.hash.sha256
+        # an attachment got by several threads at once is decoded (and counted) once
+        with self._lock:
+            content = self._contents.get(sha256)
+            if content is not None:
+                return content
+
+            if attachment.raw is None:
+                return None
+
+            if self.memory_size + attachment.size <= self.max_memory_size:
+                content = memoryview(base64.b64decode(attachment.raw))
+                self.memory_size += len(content)
+            else:
+                content = decode_to_file(attachment.raw)
+
+            self._contents[sha256] = content
+            return content
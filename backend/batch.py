@@ -0,0 +1,67 @@
+import asyncio
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable
+
+from backend import schemas
+
+
+async def map_unordered[T, R](
+    func: Callable[[T], Awaitable[R]],
+    items: AsyncIterable[T],
+    *,
+    max_at_once: int,
+) -> AsyncIterator[R]:
+    """Yield func(item) of each item as soon as it is done, running max_at_once at a time.
+
+    Unlike aiometer.amap, the items are pulled from the iterable only once a slot is
+    free, so an archive is split as fast as its emails are analyzed.
+    """
+    pending: set[asyncio.Future[R]] = set()
+    try:
+        async for item in items:
+            if len(pending) >= max_at_once:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+
+            pending.add(asyncio.ensure_future(func(item)))
+
+        while len(pending) > 0:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        # e.g. the client of a stream has disconnected
+        for task in pending:
+            task.cancel()
+
+
+class IOCAggregator:
+    """Collects the IOCs of the analyses of a batch."""
+
+    def __init__(self) -> None:
+        self.urls: set[str] = set()
+        self.domains: set[str] = set()
+        self.ip_addresses: set[str] = set()
+        self.emails: set[str] = set()
+        self.sha256s: set[str] = set()
+
+    def add(self, response: schemas.Response):
+        self.urls.update(response.urls)
+        self.domains.update(response.domains)
+        self.ip_addresses.update(response.ip_addresses)
+        self.sha256s.update(response.sha256s)
+        for body in response.bodies:
+            self.emails.update(body.emails)
+
+    def to_summary(self) -> schemas.IOCSummary:
+        return schemas.IOCSummary(
+            urls=sorted(self.urls),
+            domains=sorted(self.domains),
+            ip_addresses=sorted(self.ip_addresses),
+            emails=sorted(self.emails),
+            sha256s=sorted(self.sha256s),
+        )
@@ -0,0 +1,110 @@
+from collections.abc import AsyncIterator
+
+from redis.asyncio import Redis
+
+from backend import schemas, settings
+from backend.attachments import AttachmentStore
+
+
+class BlobExpiredError(Exception):
+    pass
+
+
+def get_blob_key(sha256: str) -> str:
+    return f"blob:{sha256}"
+
+
+async def store_attachments(
+    redis: Redis,
+    attachments: list[schemas.Attachment],
+    *,
+    store: AttachmentStore | None = None,
+    expire: int = settings.REDIS_EXPIRE,
+) -> None:
+    """Store the raw contents of the attachments as blobs and strip them from the attachments.
+
+    Blobs are content-addressed by SHA-256, so an attachment already stored (by another
+    analysis) is not sent again and only has its expiration extended. The contents are
+    read from the store, where the analysis has already decoded them.
+
+    The expiration is extended by the check itself (EXPIRE fails on a missing key), so a
+    blob which expires meanwhile is taken as missing and stored again.
+    """
+    if store is None:
+        store = AttachmentStore()
+
+    ex = expire if expire > 0 else None
+    attachments = [
+        attachment for attachment in attachments if attachment.raw is not None
+    ]
+    keys = [get_blob_key(attachment.hash.sha256) for attachment in attachments]
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in keys:
+            if ex is not None:
+                pipe.expire(key, ex)
+            else:
+                pipe.exists(key)
+        stored: list[int] = await pipe.execute()
+
+    missing = [
+        (attachment, key)
+        for attachment, key, exists in zip(attachments, keys, stored, strict=True)
+        if not exists
+    ]
+    if len(missing) > 0:
+        async with redis.pipeline(transaction=False) as pipe:
+            for attachment, key in missing:
+                pipe.set(key, store.get(attachment) or b"", ex=ex)
+            await pipe.execute()
+
+    for attachment in attachments:
+        attachment.raw = None
+
+
+async def store_response_attachments(
+    redis: Redis, response: schemas.Response, *, expire: int = settings.REDIS_EXPIRE
+) -> None:
+    """Store the attachments of the email and of the emails attached to it as blobs."""
+    await store_attachments(
+        redis,
+        [attachment for eml in response.iter_emls() for attachment in eml.attachments],
+        store=response.attachment_store,
+        expire=expire,
+    )
+
+
+async def get_blob(redis: Redis, sha256: str) -> bytes | None:
+    return await redis.get(get_blob_key(sha256))
+
+
+async def get_blob_size(redis: Redis, sha256: str) -> int | None:
+    key = get_blob_key(sha256)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.exists(key)
+        pipe.strlen(key)
+        exists, size = await pipe.execute()
+
+    return size if exists else None
+
+
+async def iter_blob(
+    redis: Redis,
+    sha256: str,
+    size: int,
+    *,
+    chunk_size: int = settings.ATTACHMENT_BLOB_CHUNK_SIZE,
+) -> AsyncIterator[bytes]:
+    """Iterate over the chunks of a blob of the given size (see get_blob_size).
+
+    Raises BlobExpiredError if the blob expires (or is evicted) midway, which aborts a
+    response streaming it rather than cutting its content short silently.
+    """
+    key = get_blob_key(sha256)
+    for start in range(0, size, chunk_size):
+        end = min(start + chunk_size, size)
+        chunk: bytes = await redis.getrange(key, start, end - 1)
+        if len(chunk) != end - start:
+            raise BlobExpiredError(f"Blob {sha256} has expired while being read")
+
+        yield chunk
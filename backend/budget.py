@@ -0,0 +1,89 @@
+import dataclasses
+import time
+from typing import TYPE_CHECKING
+
+from backend import settings
+
+if TYPE_CHECKING:
+    from backend.schemas import Response
+
+# names of the limits reported in Eml.exceeded_limits
+MIME_PARTS = "mime_parts"
+ATTACHMENT_BYTES = "attachment_bytes"
+BODY_SCAN_SIZE = "body_scan_size"
+# an IOC longer than backend.ioc.MAX_CANDIDATE_SIZE (which is cut)
+IOC_SIZE = "ioc_size"
+ATTACHED_DEPTH = "attached_depth"
+ATTACHED_BYTES = "attached_bytes"
+
+
+def stage_time(stage: str) -> str:
+    return f"{stage}_time"
+
+
+@dataclasses.dataclass
+class ParseBudget:
+    """Limits of parsing an email and the ones which were hit so far.
+
+    Stage timeouts are cooperative: a stage checks is_expired between its units of work
+    and skips the rest of them once its deadline has passed.
+    """
+
+    stage_timeout: float | None = settings.PARSE_STAGE_TIMEOUT
+    max_mime_parts: int | None = settings.PARSE_MAX_MIME_PARTS
+    max_body_scan_size: int | None = settings.PARSE_MAX_BODY_SCAN_SIZE
+    max_attachment_bytes: int | None = settings.PARSE_MAX_ATTACHMENT_BYTES
+
+    exceeded: list[str] = dataclasses.field(default_factory=list)
+    stage: str | None = None
+    deadline: float | None = None
+
+    def start(self, stage: str):
+        self.stage = stage
+        self.deadline = (
+            time.monotonic() + self.stage_timeout
+            if self.stage_timeout is not None
+            else None
+        )
+
+    def is_expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+    def check(self) -> bool:
+        # flag the current stage if it has run out of time
+        if self.stage is not None and self.is_expired():
+            self.exceed(stage_time(self.stage))
+            return True
+
+        return False
+
+    def exceed(self, limit: str):
+        if limit not in self.exceeded:
+            self.exceeded.append(limit)
+
+
+@dataclasses.dataclass
+class AttachedBudget:
+    """Limits of parsing the emails attached to an email (and to those, recursively).
+
+    It is shared by the whole tree of attached emails, so max_bytes bounds their total
+    size and an email attached more than once is parsed only once.
+    """
+
+    max_depth: int = settings.PARSE_MAX_ATTACHED_DEPTH
+    max_bytes: int | None = settings.PARSE_MAX_ATTACHED_BYTES
+
+    parsed_bytes: int = 0
+    # SHA-256s of the emails of the tree
+    seen: set[str] = dataclasses.field(default_factory=set)
+    # emails parsed along with the one they are attached to (by SHA-256), which are left
+    # to be taken as its children
+    parsed: dict[str, "Response"] = dataclasses.field(default_factory=dict)
+
+    def take(self, size: int) -> bool:
+        """Reserve size bytes, unless it would go beyond max_bytes."""
+        if self.max_bytes is not None and self.parsed_bytes + size > self.max_bytes:
+            return False
+
+        self.parsed_bytes += size
+        return True
@@ -0,0 +1,277 @@
+import asyncio
+import datetime
+import hashlib
+
+from loguru import logger
+from pydantic import ValidationError
+from redis.asyncio import ConnectionPool, Redis
+
+from backend import codec, schemas, settings
+
+
+def create_redis(url: str) -> Redis:
+    """Create a Redis client backed by a connection pool meant to be shared for the app lifetime."""
+    pool = ConnectionPool.from_url(
+        url,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+    )
+    # the client owns the pool (closing the client disconnects the pool)
+    return Redis.from_pool(pool)
+
+
+def get_key(id: str, *, key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"{key_prefix}:{id}"
+
+
+def get_index_key(*, key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"index:{key_prefix}"
+
+
+def get_lock_key(id: str, *, key_prefix: str = settings.REDIS_KEY_PREFIX) -> str:
+    return f"lock:{key_prefix}:{id}"
+
+
+def get_cache_status(
+    analyzed_at: datetime.datetime | None,
+    *,
+    stale_after: int = settings.REDIS_STALE_AFTER,
+    now: datetime.datetime | None = None,
+) -> schemas.CacheStatus:
+    if analyzed_at is None:
+        # an entry cached before analyzed_at was introduced
+        return schemas.CacheStatus(hit=True)
+
+    now = now or datetime.datetime.now(datetime.UTC)
+    age = max(int((now - analyzed_at).total_seconds()), 0)
+    stale = stale_after > 0 and age > stale_after
+    return schemas.CacheStatus(hit=True, age=age, stale=stale)
+
+
+async def cache_response(
+    redis: Redis,
+    response: schemas.Response,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+):
+    ex = expire if expire > 0 else None
+    analyzed_at = response.analyzed_at or datetime.datetime.now(datetime.UTC)
+    score = analyzed_at.timestamp()
+    index_key = get_index_key(key_prefix=key_prefix)
+
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(
+            get_key(response.id, key_prefix=key_prefix),
+            # stored as served by the API, so that lookups can serve it as it is
+            value=codec.encode(response.model_dump_json(by_alias=True).encode()),
+            ex=ex,
+        )
+        # the catalogue of cached analyses (scored by analyzed_at) used for listing
+        pipe.zadd(index_key, {response.id: score})
+        if ex is not None:
+            # prune the entries whose analysis has expired
+            pipe.zremrangebyscore(index_key, "-inf", f"({score - ex}")
+        await pipe.execute()
+
+
+def get_etag(stored: bytes) -> str:
+    return f'"{hashlib.blake2b(stored, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    # weak comparison (a compressing proxy may have weakened the tag)
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag.removeprefix("W/") in tags
+
+
+def encode_cursor(score: float, id: str) -> str:
+    return f"{score!r}:{id}"
+
+
+def decode_cursor(cursor: str) -> tuple[float, str]:
+    score, sep, id = cursor.partition(":")
+    if sep == "" or id == "":
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+    return float(score), id
+
+
+async def list_cached_ids(
+    redis: Redis,
+    *,
+    limit: int = settings.REDIS_CACHE_LIST_PAGE_SIZE,
+    cursor: str | None = None,
+    since: datetime.datetime | None = None,
+    until: datetime.datetime | None = None,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+) -> tuple[list[str], str | None]:
+    """List the IDs of cached analyses from newest to oldest.
+
+    Returns a page of IDs and the cursor of the next page (None if it is the last page).
+    Raises ValueError if the cursor is invalid.
+    """
+    index_key = get_index_key(key_prefix=key_prefix)
+
+    min_score = since.timestamp() if since else float("-inf")
+    if expire > 0:
+        now = datetime.datetime.now(datetime.UTC).timestamp()
+        min_score = max(min_score, now - expire)
+
+    max_score = until.timestamp() if until else float("inf")
+    after: tuple[float, str] | None = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        max_score = min(max_score, after[0])
+
+    # members sharing a score are ordered by ID (descending), so the ones at or
+    # before the cursor are skipped
+    page: list[tuple[str, float]] = []
+    offset = 0
+    while len(page) <= limit:
+        batch: list[tuple[bytes, float]] = await redis.zrange(
+            index_key,
+            max_score,
+            min_score,
+            desc=True,
+            byscore=True,
+            offset=offset,
+            num=limit + 1,
+            withscores=True,
+        )
+        if len(batch) == 0:
+            break
+
+        offset += len(batch)
+        for member, score in batch:
+            id = member.decode()
+            if after is not None and score == after[0] and id >= after[1]:
+                continue
+
+            page.append((id, score))
+
+        if len(batch) <= limit:
+            break
+
+    next_cursor: str | None = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][1], page[-1][0])
+
+    return [id for id, _ in page], next_cursor
+
+
+async def backfill_index(
+    redis: Redis,
+    *,
+    expire: int = settings.REDIS_EXPIRE,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+    batch_size: int = 500,
+) -> int:
+    """Add the cached analyses missing from the index (e.g. cached before it was introduced).
+
+    An entry is scored by the time it was cached, told from its TTL (or by now if it
+    has none), so that it drops out of the list as it expires. The ones in the index
+    are left as they are. Returns the number of entries added.
+    """
+    index_key = get_index_key(key_prefix=key_prefix)
+    prefix = f"{key_prefix}:"
+    added = 0
+
+    async def index(keys: list[str]) -> int:
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.ttl(key)
+            ttls: list[int] = await pipe.execute()
+
+        now = datetime.datetime.now(datetime.UTC).timestamp()
+        scores: dict[str, float] = {}
+        for key, ttl in zip(keys, ttls, strict=True):
+            if ttl == -2:
+                # expired in the meantime
+                continue
+
+            score = now - (expire - ttl) if expire > 0 and ttl >= 0 else now
+            scores[key.removeprefix(prefix)] = score
+
+        if len(scores) == 0:
+            return 0
+
+        return await redis.zadd(index_key, scores, nx=True)
+
+    keys: list[str] = []
+    async for key in redis.scan_iter(match=f"{prefix}*", count=batch_size):
+        keys.append(key.decode())
+        if len(keys) >= batch_size:
+            added += await index(keys)
+            keys = []
+
+    if len(keys) > 0:
+        added += await index(keys)
+
+    return added
+
+
+async def get_cached_response(
+    redis: Redis,
+    id: str,
+    *,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+    stale_after: int = settings.REDIS_STALE_AFTER,
+) -> schemas.Response | None:
+    got: bytes | None = await redis.get(get_key(id, key_prefix=key_prefix))
+    if got is None:
+        return None
+
+    try:
+        decoded = codec.decode(got)
+    except codec.CodecError as e:
+        # e.g. written by a newer version or with a codec which is not installed
+        logger.warning(f"Failed to decode the cached analysis {id}: {e}")
+        return None
+
+    try:
+        response = schemas.Response.model_validate_json(decoded)
+    except ValidationError as e:
+        # e.g. written with another version of the schema, so it is analyzed again
+        logger.warning(f"Failed to validate the cached analysis {id}: {e}")
+        return None
+
+    response.cache = get_cache_status(response.analyzed_at, stale_after=stale_after)
+    return response
+
+
+async def wait_for_cached_response(
+    redis: Redis,
+    id: str,
+    *,
+    key_prefix: str = settings.REDIS_KEY_PREFIX,
+    wait_timeout: float = settings.SINGLE_FLIGHT_LOCK_TIMEOUT,
+    interval: float = settings.SINGLE_FLIGHT_POLL_INTERVAL,
+) -> schemas.Response | None:
+    """Wait for another worker holding the lock of the ID to cache its analysis.
+
+    Returns None if the lock is released (or expires) without the analysis being cached.
+    """
+    lock_key = get_lock_key(id, key_prefix=key_prefix)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait_timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(interval)
+
+        cached = await get_cached_response(redis, id, key_prefix=key_prefix)
+        if cached is not None:
+            return cached
+
+        if not await redis.exists(lock_key):
+            break
+
+    return None
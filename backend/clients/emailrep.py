@@ -5,10 +5,11 @@ from backend import schemas
 
 
 class EmailRep(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
+    def __init__(self, api_key: Secret, **kwargs) -> None:
         super().__init__(
             base_url="https://emailrep.io",
             headers={"key": str(api_key), "user-agent": "EML-Analyzer"},
+            **kwargs,
         )
 
     async def lookup(self, email: str) -> schemas.EmailRepLookup:
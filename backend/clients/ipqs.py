@@ -14,9 +14,9 @@ class IPQSError(Exception):
 
 
 class IPQualityScore(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
+    def __init__(self, api_key: Secret, **kwargs) -> None:
         self._api_key = str(api_key)
-        super().__init__(base_url="https://ipqualityscore.com")
+        super().__init__(base_url="https://ipqualityscore.com", **kwargs)
 
     @staticmethod
     def _check_success(data: dict) -> None:
@@ -0,0 +1,86 @@
+import dataclasses
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import aiohttp
+import httpx
+from vt import Client as VirusTotal
+
+from backend import settings
+
+from .emailrep import EmailRep
+from .ipqs import IPQualityScore
+from .urlscan import UrlScan
+
+
+def get_httpx_options() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(settings.HTTP_TIMEOUT),
+        "http2": settings.HTTP_HTTP2,
+    }
+
+
+def get_vt_connector() -> aiohttp.TCPConnector:
+    # vt-py is built on aiohttp (HTTP/1.1 only)
+    return aiohttp.TCPConnector(
+        limit=settings.HTTP_MAX_CONNECTIONS,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+@dataclasses.dataclass
+class SharedClients:
+    """3rd party API clients shared across requests (None if the API key is not set)."""
+
+    vt: VirusTotal | None = None
+    urlscan: UrlScan | None = None
+    email_rep: EmailRep | None = None
+    ipqs: IPQualityScore | None = None
+
+    async def aclose(self) -> None:
+        if self.vt is not None:
+            await self.vt.close_async()
+
+        for client in (self.urlscan, self.email_rep, self.ipqs):
+            if client is not None:
+                await client.aclose()
+
+
+def create_shared_clients() -> SharedClients:
+    shared = SharedClients()
+    if settings.VIRUSTOTAL_API_KEY:
+        shared.vt = VirusTotal(
+            apikey=str(settings.VIRUSTOTAL_API_KEY), connector=get_vt_connector()
+        )
+
+    if settings.URLSCAN_API_KEY:
+        shared.urlscan = UrlScan(
+            api_key=settings.URLSCAN_API_KEY, **get_httpx_options()
+        )
+
+    if settings.EMAIL_REP_API_KEY:
+        shared.email_rep = EmailRep(
+            api_key=settings.EMAIL_REP_API_KEY, **get_httpx_options()
+        )
+
+    if settings.IPQUALITYSCORE_API_KEY:
+        shared.ipqs = IPQualityScore(
+            api_key=settings.IPQUALITYSCORE_API_KEY, **get_httpx_options()
+        )
+
+    return shared
+
+
+@asynccontextmanager
+async def open_shared_clients() -> AsyncIterator[SharedClients]:
+    # must be called with a running event loop (aiohttp connectors are bound to it)
+    shared = create_shared_clients()
+    try:
+        yield shared
+    finally:
+        await shared.aclose()
@@ -7,9 +7,9 @@ from backend import schemas
 
 
 class UrlScan(httpx.AsyncClient):
-    def __init__(self, api_key: Secret) -> None:
+    def __init__(self, api_key: Secret, **kwargs) -> None:
         super().__init__(
-            base_url="https://urlscan.io", headers={"api-key": str(api_key)}
+            base_url="https://urlscan.io", headers={"api-key": str(api_key)}, **kwargs
         )
 
     async def lookup(
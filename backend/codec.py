@@ -0,0 +1,148 @@
+# Storage format of cached analysis results: a 5 bytes header (magic, format version
+# and codec ID) followed by the (compressed) JSON serialized response. Values without
+# the header are legacy plain JSON entries and are read as they are.
+
+import dataclasses
+import zlib
+
+from loguru import logger
+
+from backend import settings
+
+MAGIC = b"EAC"
+VERSION = 1
+
+JSON = "json"
+ZLIB = "zlib"
+ZSTD = "zstd"
+
+CODEC_IDS: dict[str, int] = {JSON: 0, ZLIB: 1, ZSTD: 2}
+CODEC_NAMES: dict[int, str] = {v: k for k, v in CODEC_IDS.items()}
+
+
+class CodecError(Exception):
+    """Raised when a stored value cannot be decoded."""
+
+
+@dataclasses.dataclass
+class StorageCounter:
+    writes: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+
+
+counter = StorageCounter()
+
+
+def _import_zstandard():
+    # zstandard is an optional dependency
+    try:
+        import zstandard
+    except ImportError:
+        return None
+
+    return zstandard
+
+
+def _compress(data: bytes, codec: str, level: int | None) -> bytes:
+    if codec == ZLIB:
+        return zlib.compress(data, level if level is not None else 6)
+
+    if codec == ZSTD:
+        zstandard = _import_zstandard()
+        if zstandard is None:
+            raise CodecError("zstandard is not installed")
+
+        return zstandard.ZstdCompressor(
+            level=level if level is not None else 3
+        ).compress(data)
+
+    return data
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == ZLIB:
+        return zlib.decompress(data)
+
+    if codec == ZSTD:
+        zstandard = _import_zstandard()
+        if zstandard is None:
+            raise CodecError("zstandard is not installed")
+
+        try:
+            return zstandard.ZstdDecompressor().decompress(data)
+        except zstandard.ZstdError as e:
+            raise CodecError(str(e)) from e
+
+    return data
+
+
+def check_codec(codec: str) -> None:
+    """Raise a ValueError for a codec which cannot be written, before the first write."""
+    if codec not in CODEC_IDS:
+        raise ValueError(
+            f"Unknown cache codec {codec!r} (expected one of {', '.join(CODEC_IDS)})"
+        )
+
+    if codec == ZSTD and _import_zstandard() is None:
+        raise ValueError(
+            f"Cache codec {codec!r} requires zstandard (install the zstd extra)"
+        )
+
+
+def get_default_codec() -> str:
+    codec = settings.REDIS_CACHE_CODEC
+    if codec not in CODEC_IDS:
+        logger.warning(f"Unknown cache codec {codec}, falling back to {JSON}")
+        return JSON
+
+    if codec == ZSTD and _import_zstandard() is None:
+        logger.warning(f"zstandard is not installed, falling back to {ZLIB}")
+        return ZLIB
+
+    return codec
+
+
+def encode(
+    data: bytes,
+    *,
+    codec: str | None = None,
+    level: int | None = None,
+) -> bytes:
+    codec = codec or get_default_codec()
+    if level is None:
+        level = settings.REDIS_CACHE_COMPRESSION_LEVEL
+    header = MAGIC + bytes([VERSION, CODEC_IDS[codec]])
+    stored = header + _compress(data, codec, level)
+
+    counter.writes += 1
+    counter.raw_bytes += len(data)
+    counter.stored_bytes += len(stored)
+    return stored
+
+
+def is_legacy(stored: bytes) -> bool:
+    return not stored.startswith(MAGIC)
+
+
+def decode(stored: bytes) -> bytes:
+    if is_legacy(stored):
+        # a legacy plain JSON entry
+        return stored
+
+    header_size = len(MAGIC) + 2
+    if len(stored) < header_size:
+        raise CodecError("Truncated header")
+
+    version, codec_id = stored[len(MAGIC)], stored[len(MAGIC) + 1]
+    if version != VERSION:
+        raise CodecError(f"Unsupported format version: {version}")
+
+    codec = CODEC_NAMES.get(codec_id)
+    if codec is None:
+        raise CodecError(f"Unknown codec ID: {codec_id}")
+
+    try:
+        return _decompress(stored[header_size:], codec)
+    except (zlib.error, ValueError) as e:
+        raise CodecError(str(e)) from e
@@ -3,7 +3,7 @@ import typing
 from fastapi import Depends, HTTPException, Request, Security
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from loguru import logger
-from redis import Redis
+from redis.asyncio import Redis
 
 from backend import clients, settings
 
@@ -11,51 +11,30 @@ if not settings.CLERK_SECRET_KEY:
     logger.warning("CLERK_SECRET_KEY is not configured — authentication is disabled")
 
 
-def get_optional_redis():
-    if settings.REDIS_URL:
-        redis: Redis = Redis.from_url(str(settings.REDIS_URL))  # type: ignore
-        try:
-            yield redis
-        finally:
-            redis.close()
-    else:
-        yield None
-
-
-async def get_optional_vt():
-    if settings.VIRUSTOTAL_API_KEY:
-        async with clients.VirusTotal(
-            apikey=str(settings.VIRUSTOTAL_API_KEY)
-        ) as client:
-            yield client
-    else:
-        yield None
-
-
-async def get_optional_urlscan():
-    if settings.URLSCAN_API_KEY:
-        async with clients.UrlScan(api_key=settings.URLSCAN_API_KEY) as client:
-            yield client
-    else:
-        yield None
-
-
-async def get_optional_email_rep():
-    if settings.EMAIL_REP_API_KEY:
-        async with clients.EmailRep(api_key=settings.EMAIL_REP_API_KEY) as client:
-            yield client
-    else:
-        yield None
-
-
-async def get_optional_ipqs():
-    if settings.IPQUALITYSCORE_API_KEY:
-        async with clients.IPQualityScore(
-            api_key=settings.IPQUALITYSCORE_API_KEY
-        ) as client:
-            yield client
-    else:
-        yield None
+def get_optional_redis(request: Request) -> Redis | None:
+    # set by the lifespan handler in backend.main (None if REDIS_URL is not set)
+    return request.app.state.redis
+
+
+def get_shared_clients(request: Request) -> clients.SharedClients:
+    # set by the lifespan handler in backend.main
+    return request.app.state.clients
+
+
+def get_optional_vt(request: Request) -> clients.VirusTotal | None:
+    return get_shared_clients(request).vt
+
+
+def get_optional_urlscan(request: Request) -> clients.UrlScan | None:
+    return get_shared_clients(request).urlscan
+
+
+def get_optional_email_rep(request: Request) -> clients.EmailRep | None:
+    return get_shared_clients(request).email_rep
+
+
+def get_optional_ipqs(request: Request) -> clients.IPQualityScore | None:
+    return get_shared_clients(request).ipqs
 
 
 def get_spam_assassin() -> clients.SpamAssassin:
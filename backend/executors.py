@@ -0,0 +1,162 @@
+import asyncio
+import multiprocessing
+import typing
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from backend import settings
+
+# where the parser runs (see PARSE_EXECUTOR)
+PARSE_EXECUTORS = ("inline", "process")
+
+_process_pool: ProcessPoolExecutor | None = None
+# options of the last start_process_pool (reused when a broken pool is replaced)
+_pool_options: dict[str, int | None] = {}
+# pools killed by terminate_process_pool (whose jobs are worth retrying)
+_recycled_pools: weakref.WeakSet[ProcessPoolExecutor] = weakref.WeakSet()
+# threads of the checks which may outlive their callers (e.g. the oleid checks)
+_thread_pool: ThreadPoolExecutor | None = None
+
+
+def check_parse_executor(executor: str) -> None:
+    """Raise a ValueError for an unknown executor, which would be taken as inline."""
+    if executor not in PARSE_EXECUTORS:
+        raise ValueError(
+            f"Unknown parse executor {executor!r} (expected one of {', '.join(PARSE_EXECUTORS)})"
+        )
+
+
+def start_process_pool(
+    *,
+    max_workers: int | None = settings.PARSE_POOL_SIZE,
+    max_tasks_per_child: int | None = settings.PARSE_POOL_MAX_TASKS_PER_CHILD,
+) -> ProcessPoolExecutor:
+    """(Re)create the process pool, e.g. with a size other than PARSE_POOL_SIZE."""
+    global _process_pool
+
+    shutdown_process_pool()
+    _pool_options.update(
+        max_workers=max_workers, max_tasks_per_child=max_tasks_per_child
+    )
+    # use spawn to avoid forking a process which has a running event loop & threads
+    _process_pool = ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=max_tasks_per_child,
+    )
+    return _process_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    if _process_pool is None:
+        return start_process_pool(**_pool_options)
+
+    return _process_pool
+
+
+def shutdown_process_pool(*, wait: bool = True) -> None:
+    global _process_pool
+
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=wait, cancel_futures=True)
+        _process_pool = None
+
+
+def terminate_process_pool() -> None:
+    """Kill the worker processes of the pool, so the next job starts a fresh pool.
+
+    A job running in a worker process cannot be cancelled, so this is the only way to
+    free a worker stuck on it (e.g. on a pathological email). The other jobs of the
+    pool fail with BrokenProcessPool.
+    """
+    global _process_pool
+
+    pool = _process_pool
+    if pool is None:
+        return
+
+    _process_pool = None
+    _recycled_pools.add(pool)
+    for process in list((pool._processes or {}).values()):
+        process.terminate()
+    pool.shutdown(wait=False)
+
+
+async def _submit(
+    pool: ProcessPoolExecutor,
+    func: typing.Callable[..., typing.Any],
+    *args: typing.Any,
+) -> typing.Any:
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, partial(func, *args))
+    except BrokenProcessPool:
+        if pool is _process_pool:
+            # a worker died (e.g. OOM killed), so create a fresh pool for the next job
+            shutdown_process_pool(wait=False)
+        raise
+
+
+async def run_in_process(
+    func: typing.Callable[..., typing.Any],
+    *args: typing.Any,
+    job_timeout: float | None = None,
+) -> typing.Any:
+    """Run a picklable function in the process pool and await its result.
+
+    A job which does not finish in job_timeout seconds raises a TimeoutError and the
+    pool is recycled (see terminate_process_pool), as the job would keep its worker
+    busy otherwise. A job which fails as another one recycled the pool is retried once.
+    """
+    pool = get_process_pool()
+    try:
+        async with asyncio.timeout(job_timeout):
+            try:
+                return await _submit(pool, func, *args)
+            except BrokenProcessPool:
+                if pool not in _recycled_pools:
+                    raise
+
+            pool = get_process_pool()
+            return await _submit(pool, func, *args)
+    except TimeoutError:
+        if pool is _process_pool:
+            terminate_process_pool()
+        raise
+
+
+def get_thread_pool(
+    *, max_workers: int = settings.OLEID_POOL_SIZE
+) -> ThreadPoolExecutor:
+    global _thread_pool
+
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="check"
+        )
+
+    return _thread_pool
+
+
+def shutdown_thread_pool() -> None:
+    global _thread_pool
+
+    if _thread_pool is not None:
+        # the checks left running cannot be stopped, so do not wait for them
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+
+
+async def run_in_thread(
+    func: typing.Callable[..., typing.Any], *args: typing.Any
+) -> typing.Any:
+    """Run a function in the bounded thread pool of the checks and await its result.
+
+    Unlike run_in_threadpool, a job whose awaiting task is cancelled (e.g. by a timeout)
+    keeps holding a thread of this pool rather than of the one shared with the request
+    handlers, so runaway jobs only delay the other checks.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_thread_pool(), partial(func, *args))
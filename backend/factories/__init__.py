@@ -1,16 +1,61 @@
-from .dkim_ import DKIMVerdictFactory  # noqa: F401
-from .email_auth import EmailAuthVerdictFactory  # noqa: F401
-from .emailrep import EmailRepVerdictFactory  # noqa: F401
-from .eml import EmlFactory  # noqa: F401
-from .homoglyph import HomoglyphVerdictFactory  # noqa: F401
-from .ipqs import (  # noqa: F401
-    IPQSEmailVerdictFactory,
-    IPQSIPVerdictFactory,
-    IPQSURLVerdictFactory,
-)
-from .oldid import OleIDVerdictFactory  # noqa: F401
-from .response import ResponseFactory  # noqa: F401
-from .spamassassin import SpamAssassinVerdictFactory  # noqa: F401
-from .url_unshorten import URLUnshortenVerdictFactory  # noqa: F401
-from .urlscan import UrlScanVerdictFactory  # noqa: F401
-from .virustotal import VirusTotalVerdictFactory  # noqa: F401
+import importlib
+import typing
+
+# the factories (and their heavy dependencies such as eml_parser, dateparser, ioc_finder
+# and oletools) are imported on first use to keep the startup of a worker fast
+_FACTORIES: dict[str, str] = {
+    "DKIMVerdictFactory": ".dkim_",
+    "EmailAuthVerdictFactory": ".email_auth",
+    "EmailRepVerdictFactory": ".emailrep",
+    "EmlFactory": ".eml",
+    "HomoglyphVerdictFactory": ".homoglyph",
+    "IPQSEmailVerdictFactory": ".ipqs",
+    "IPQSIPVerdictFactory": ".ipqs",
+    "IPQSURLVerdictFactory": ".ipqs",
+    "OleIDVerdictFactory": ".oldid",
+    "ResponseFactory": ".response",
+    "SpamAssassinVerdictFactory": ".spamassassin",
+    "URLUnshortenVerdictFactory": ".url_unshorten",
+    "UrlScanVerdictFactory": ".urlscan",
+    "VirusTotalVerdictFactory": ".virustotal",
+}
+
+__all__ = list(_FACTORIES)
+
+if typing.TYPE_CHECKING:
+    from .dkim_ import DKIMVerdictFactory  # noqa: F401
+    from .email_auth import EmailAuthVerdictFactory  # noqa: F401
+    from .emailrep import EmailRepVerdictFactory  # noqa: F401
+    from .eml import EmlFactory  # noqa: F401
+    from .homoglyph import HomoglyphVerdictFactory  # noqa: F401
+    from .ipqs import (  # noqa: F401
+        IPQSEmailVerdictFactory,
+        IPQSIPVerdictFactory,
+        IPQSURLVerdictFactory,
+    )
+    from .oldid import OleIDVerdictFactory  # noqa: F401
+    from .response import ResponseFactory  # noqa: F401
+    from .spamassassin import SpamAssassinVerdictFactory  # noqa: F401
+    from .url_unshorten import URLUnshortenVerdictFactory  # noqa: F401
+    from .urlscan import UrlScanVerdictFactory  # noqa: F401
+    from .virustotal import VirusTotalVerdictFactory  # noqa: F401
+
+
+def __getattr__(name: str) -> typing.Any:
+    module_name = _FACTORIES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+
+
+def warm_up():
+    """Import all the factories ahead of their first use."""
+    for name in __all__:
+        __getattr__(name)
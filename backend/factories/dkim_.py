@@ -1,3 +1,5 @@
+from collections.abc import Buffer
+
 import dkim
 
 from backend import schemas
@@ -44,13 +46,13 @@ class DKIMVerdictFactory(AbstractAsyncFactory):
     async def call(
         self,
         eml: schemas.Eml,
-        eml_file: bytes,
+        eml_file: Buffer,
     ):
         """
         Verify DKIM signature of an email message.
 
         Args:
-            eml_file: Raw email file bytes (can be EML or MSG format)
+            eml_file: Raw email file bytes or a view of them (can be EML or MSG format)
 
         Returns:
             Verdict with DKIM verification result
@@ -58,5 +60,6 @@ class DKIMVerdictFactory(AbstractAsyncFactory):
         if not has_dkim_signature(eml):
             return None
 
-        is_valid = await dkim.verify_async(eml_file)
+        # dkimpy takes bytes, which a view of a spooled email is copied to only here
+        is_valid = await dkim.verify_async(bytes(eml_file))
         return transform(is_valid, name=self.name)
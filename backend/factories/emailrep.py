@@ -1,10 +1,19 @@
+from functools import partial
+
 from backend import clients, schemas
+from backend.ioc_cache import ioc_cache
 
 from .abstract import AbstractAsyncFactory
 
 
 async def lookup(email: str, *, client: clients.EmailRep) -> schemas.EmailRepLookup:
-    return await client.lookup(email)
+    return await ioc_cache.get_or_fetch(
+        "emailrep",
+        email,
+        partial(client.lookup, email),
+        dumps=lambda lookup: lookup.model_dump_json(),
+        loads=schemas.EmailRepLookup.model_validate_json,
+    )
 
 
 def transform(lookup: schemas.EmailRepLookup, *, key_or_name: str):
@@ -1,18 +1,34 @@
 import datetime
+import email
+import email.utils
+import functools
+from collections.abc import Buffer
+from email.feedparser import BytesFeedParser
+from email.message import Message as MIMEPart
+from email.policy import Policy
 from io import BytesIO
 from typing import Any
 
 import dateparser
 from eml_parser import EmlParser
-from ioc_finder import parse_domain_names, parse_email_addresses, parse_ipv4_addresses
 
 from backend import schemas
+from backend.budget import (
+    ATTACHMENT_BYTES,
+    BODY_SCAN_SIZE,
+    IOC_SIZE,
+    MIME_PARTS,
+    ParseBudget,
+)
 from backend.outlookmsgfile_wrapper import Message
-from backend.utils import parse_urls_from_body
-from backend.validator import is_msg_file
+from backend.utils import extract_body_iocs
+from backend.validator import is_msg_file, is_ole_file
 
 from .abstract import AbstractFactory
 
+# number of bytes of an email decoded at a time by the parser
+PARSE_CHUNK_SIZE = 64 * 1024
+
 
 def is_inline_forward_attachment(attachment: dict) -> bool:
     content_header = attachment.get("content_header", {})
@@ -34,8 +50,9 @@ def is_inline_forward_attachment(attachment: dict) -> bool:
     return is_rfc822 and is_inline
 
 
-def to_eml(data: bytes) -> bytes:
-    if is_msg_file(data):
+def to_eml(data: Buffer) -> Buffer:
+    # only an OLE file may be a msg file (which libmagic tells by reading all of it)
+    if is_ole_file(data) and is_msg_file(bytes(data)):
         # assume data is a msg file
         file = BytesIO(data)
         message = Message(file)
@@ -45,9 +62,84 @@ def to_eml(data: bytes) -> bytes:
     return data
 
 
-def parse(data: bytes) -> dict:
+def is_attachment_part(part: MIMEPart) -> bool:
+    return part.get_filename() is not None or part.get_content_maintype() != "text"
+
+
+def prune_parts(message: MIMEPart, budget: ParseBudget):
+    """Drop the MIME parts beyond the limits of the budget (in depth-first order)."""
+    parts = 0
+    attachment_bytes = 0
+
+    def keep(part: MIMEPart) -> bool:
+        nonlocal parts, attachment_bytes
+
+        parts += 1
+        if budget.max_mime_parts is not None and parts > budget.max_mime_parts:
+            budget.exceed(MIME_PARTS)
+            return False
+
+        if part.is_multipart():
+            part.set_payload([p for p in part.get_payload() if keep(p)])
+            return True
+
+        if is_attachment_part(part):
+            # the encoded size, which is known without decoding the payload
+            size = len(part.get_payload() or "")
+            if (
+                budget.max_attachment_bytes is not None
+                and attachment_bytes + size > budget.max_attachment_bytes
+            ):
+                budget.exceed(ATTACHMENT_BYTES)
+                return False
+
+            attachment_bytes += size
+
+        return True
+
+    keep(message)
+
+
+def message_from_buffer(data: Buffer, policy: Policy) -> MIMEPart:
+    """Same as email.message_from_bytes but the data is decoded a chunk at a time.
+
+    message_from_bytes decodes the whole email into a string (and splits it into lines)
+    before parsing it, which costs a few times the size of the email.
+    """
+    parser = BytesFeedParser(policy=policy)
+    with memoryview(data) as view:
+        for start in range(0, len(view), PARSE_CHUNK_SIZE):
+            parser.feed(view[start : start + PARSE_CHUNK_SIZE].tobytes())
+
+    return parser.close()
+
+
+def parse(data: Buffer, budget: ParseBudget) -> dict:
     parser = EmlParser(include_raw_body=True, include_attachment_data=True)
-    return parser.decode_email_bytes(data)
+    # same as EmlParser.decode_email_bytes but the parts beyond the limits are dropped
+    # before eml_parser decodes and scans them
+    parser.msg = message_from_buffer(data, parser.policy)
+    # the repair of broken multipart parts is newer than the eml_parser versions allowed
+    # (>=2.0.0), whose decode_email_bytes does not repair them
+    if (repair_multipart := getattr(parser, "repair_multipart", None)) is not None:
+        repair_multipart(parser.msg)
+    prune_parts(parser.msg, budget)
+    return parser.parse_email()
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_datetime_str(dt: str) -> datetime.datetime | str:
+    # fast path for RFC 5322 dates with a (known) time zone, which most of them are
+    try:
+        parsed = email.utils.parsedate_to_datetime(dt)
+    except (TypeError, ValueError):
+        parsed = None
+
+    if parsed is not None and parsed.tzinfo is not None:
+        return parsed
+
+    # dateparser is slow, so it is only used for the rest (e.g. malformed dates)
+    return dateparser.parse(dt) or dt
 
 
 def parse_datetime(
@@ -57,7 +149,7 @@ def parse_datetime(
         return dt
 
     if isinstance(dt, str):
-        return dateparser.parse(dt) or dt
+        return _parse_datetime_str(dt)
 
     return None
 
@@ -85,16 +177,11 @@ def _normalize_received(received: list[dict]) -> list[dict]:
 
     first = received[0]
 
-    optional_base_datetime: datetime.datetime | str | None = None
-    first_date = first.get("date")
-    if first_date:
-        optional_base_datetime = parse_datetime(first_date)
+    optional_base_datetime: datetime.datetime | str | None = first.get("date")
 
     for r in received:
-        optional_datetime: datetime.datetime | str | None = None
-        date = r.get("date")
-        if date:
-            optional_datetime = parse_datetime(date)
+        # dates are already parsed by _normalize_received_date
+        optional_datetime: datetime.datetime | str | None = r.get("date")
 
         if optional_base_datetime is None or optional_datetime is None:
             continue
@@ -104,6 +191,12 @@ def _normalize_received(received: list[dict]) -> list[dict]:
         ):
             continue
 
+        # naive and aware datetimes cannot be subtracted
+        if (optional_base_datetime.tzinfo is None) != (
+            optional_datetime.tzinfo is None
+        ):
+            continue
+
         delay = (optional_datetime - optional_base_datetime).seconds
         r["delay"] = delay
         optional_base_datetime = optional_datetime
@@ -124,13 +217,31 @@ def normalize_header(parsed: dict) -> dict:
     return parsed
 
 
-def _normalize_body(body: dict[str, Any]) -> dict[str, Any]:
+def _normalize_body(body: dict[str, Any], budget: ParseBudget) -> dict[str, Any]:
     content = body.get("content", "")
     content_type = body.get("content_type", "")
-    body["urls"] = parse_urls_from_body(content, content_type)
-    body["emails"] = parse_email_addresses(content)
-    body["domains"] = parse_domain_names(content)
-    body["ip_addresses"] = parse_ipv4_addresses(content)
+
+    if budget.check():
+        # no time is left for the IOC extraction
+        content = ""
+
+    if (
+        budget.max_body_scan_size is not None
+        and len(content) > budget.max_body_scan_size
+    ):
+        budget.exceed(BODY_SCAN_SIZE)
+        content = content[: budget.max_body_scan_size]
+
+    # all the IOCs are extracted in a single scan of the content (of the visible text
+    # and the links of an HTML body)
+    iocs, urls = extract_body_iocs(content, content_type, deadline=budget.deadline)
+    if iocs.truncated and not budget.check():
+        # the scan was not stopped by the deadline, so an IOC was cut
+        budget.exceed(IOC_SIZE)
+    body["urls"] = urls
+    body["emails"] = sorted(iocs.emails)
+    body["domains"] = sorted(iocs.domains)
+    body["ip_addresses"] = sorted(iocs.ipv4s)
 
     for key in ["uri", "email", "domain", "ip"]:
         body.pop(key, None)
@@ -138,10 +249,11 @@ def _normalize_body(body: dict[str, Any]) -> dict[str, Any]:
     return body
 
 
-def normalize_bodies(parsed: dict) -> dict:
+def normalize_bodies(parsed: dict, budget: ParseBudget) -> dict:
     bodies = parsed.get("body", [])
-    parsed["bodies"] = [_normalize_body(body) for body in bodies]
+    parsed["bodies"] = [_normalize_body(body, budget) for body in bodies]
     parsed.pop("body", None)
+    budget.check()
     return parsed
 
 
@@ -150,15 +262,20 @@ def normalize_attachments(parsed: dict) -> dict:
     attachments = parsed.get("attachment", [])
 
     non_inline_forward_attachments = []
+    inline_forwards = []
     for attachment in attachments:
         content_header = attachment.get("content_header", {})
         if content_id := content_header.get("content-id"):
             attachment["content_id"] = content_id[0]
 
-        if not is_inline_forward_attachment(attachment):
+        if is_inline_forward_attachment(attachment):
+            # not listed as an attachment but parsed as an attached email
+            inline_forwards.append(attachment)
+        else:
             non_inline_forward_attachments.append(attachment)
 
     parsed["attachments"] = non_inline_forward_attachments
+    parsed["inline_forwards"] = inline_forwards
     parsed.pop("attachment", None)
     return parsed
 
@@ -168,10 +285,22 @@ def transform(parsed: dict) -> schemas.Eml:
 
 
 class EmlFactory(AbstractFactory):
-    def call(self, data: bytes) -> schemas.Eml:
+    def call(self, data: Buffer, budget: ParseBudget | None = None) -> schemas.Eml:
+        budget = budget or ParseBudget()
+
         eml = to_eml(data)
-        parsed = parse(eml)
+
+        # eml_parser cannot be interrupted, so its stage is bounded by pruning the
+        # MIME parts and its time is only reported
+        budget.start("parse")
+        parsed = parse(eml, budget)
+        budget.check()
+
         parsed = normalize_header(parsed)
         parsed = normalize_attachments(parsed)
-        parsed = normalize_bodies(parsed)
+
+        budget.start("bodies")
+        parsed = normalize_bodies(parsed, budget)
+
+        parsed["exceeded_limits"] = budget.exceeded
         return transform(parsed)
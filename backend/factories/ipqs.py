@@ -5,6 +5,7 @@ from functools import partial
 import aiometer
 
 from backend import clients, schemas, settings, types
+from backend.ioc_cache import ioc_cache
 
 from .abstract import AbstractAsyncFactory
 
@@ -27,7 +28,13 @@ async def lookup_ip(
     ip: str, *, client: clients.IPQualityScore
 ) -> schemas.IPQSIPLookup | None:
     with contextlib.suppress(Exception):
-        return await client.lookup_ip(ip)
+        return await ioc_cache.get_or_fetch(
+            "ipqs_ip",
+            ip,
+            partial(client.lookup_ip, ip),
+            dumps=lambda lookup: lookup.model_dump_json(),
+            loads=schemas.IPQSIPLookup.model_validate_json,
+        )
     return None
 
 
@@ -110,7 +117,13 @@ async def lookup_url(
     url: str, *, client: clients.IPQualityScore
 ) -> schemas.IPQSURLLookup | None:
     with contextlib.suppress(Exception):
-        return await client.lookup_url(url)
+        return await ioc_cache.get_or_fetch(
+            "ipqs_url",
+            url,
+            partial(client.lookup_url, url),
+            dumps=lambda lookup: lookup.model_dump_json(),
+            loads=schemas.IPQSURLLookup.model_validate_json,
+        )
     return None
 
 
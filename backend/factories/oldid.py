@@ -1,22 +1,47 @@
+import asyncio
 import base64
 import itertools
+from collections.abc import Buffer
 
-from backend import schemas
+from starlette.concurrency import run_in_threadpool
+
+from backend import executors, schemas, settings
+from backend.attachments import AttachmentStore
 from backend.oleid import OleID
+from backend.validator import is_office_file
+
+from .abstract import AbstractAsyncFactory
+
+# number of the first base64 characters of an attachment its signature is told from
+# (decoded to 9 bytes)
+HEAD_SIZE = 12
+
+
+def is_office_attachment(attachment: schemas.Attachment) -> bool:
+    """Whether the attachment is an OLE or an OOXML file, told without decoding it whole."""
+    if attachment.raw is None:
+        return False
+
+    return is_office_file(base64.b64decode(attachment.raw[:HEAD_SIZE]))
+
 
-from .abstract import AbstractFactory
+def get_content(attachment: schemas.Attachment, store: AttachmentStore) -> Buffer:
+    data = store.get(attachment)
+    if data is None:
+        raise ValueError(f"{attachment.filename} has no content")
 
+    return data
 
-def parse(attachment: schemas.Attachment) -> OleID:
-    data: bytes = base64.b64decode(attachment.raw)
+
+def parse(data: Buffer) -> OleID:
     return OleID(data)
 
 
-def attachment_to_details(
-    attachment: schemas.Attachment,
-) -> list[schemas.VerdictDetail]:
-    file_info = f"{attachment.filename}({attachment.hash.sha256})"
+def get_file_info(attachment: schemas.Attachment) -> str:
+    return f"{attachment.filename}({attachment.hash.sha256})"
 
+
+def data_to_details(data: Buffer, file_info: str) -> list[schemas.VerdictDetail]:
     def transform(oleid: OleID):
         details: list[schemas.VerdictDetail] = []
         if oleid.has_vba_macros:
@@ -65,36 +90,102 @@ def attachment_to_details(
 
         return details
 
-    parsed = parse(attachment)
+    parsed = parse(data)
     return transform(parsed)
 
 
-class OleIDVerdictFactory(AbstractFactory):
-    def __init__(self, name: str = "oleid"):
+def attachment_to_details(
+    attachment: schemas.Attachment, store: AttachmentStore
+) -> list[schemas.VerdictDetail]:
+    return data_to_details(get_content(attachment, store), get_file_info(attachment))
+
+
+class OleIDVerdictFactory(AbstractAsyncFactory):
+    def __init__(
+        self,
+        name: str = "oleid",
+        *,
+        executor: str = settings.OLEID_EXECUTOR,
+        timeout: float | None = settings.OLEID_TIMEOUT,
+    ):
         self.name = name
+        self.executor = executor
+        self.timeout = timeout
+
+    async def scan(
+        self, attachment: schemas.Attachment, store: AttachmentStore
+    ) -> list[schemas.VerdictDetail]:
+        if self.executor != "process":
+            return await executors.run_in_thread(
+                attachment_to_details, attachment, store
+            )
+
+        data = await run_in_threadpool(get_content, attachment, store)
+        return await executors.run_in_process(
+            data_to_details, bytes(data), get_file_info(attachment)
+        )
 
-    def call(
+    async def call(
         self,
         attachments: list[schemas.Attachment],
+        *,
+        store: AttachmentStore | None = None,
     ) -> schemas.Verdict:
-        def process(attachment: schemas.Attachment):
+        if store is None:
+            store = AttachmentStore()
+
+        async def process(
+            attachment: schemas.Attachment,
+        ) -> tuple[list[schemas.VerdictDetail], list[schemas.VerdictDetail]]:
+            # e.g. a PDF or an image, which is not even decoded
+            if not is_office_attachment(attachment):
+                return [], []
+
+            # a check which is not done is reported apart from the findings, so that
+            # a document crafted to stall or break the parser does not pass as benign
+            # (nor does a document which merely trips it up pass as malicious)
             try:
-                return attachment_to_details(attachment)
-            except Exception:
-                return []
-
-        details = list(
-            itertools.chain.from_iterable(
-                [process(attachment) for attachment in attachments]
-            )
+                async with asyncio.timeout(self.timeout):
+                    return await self.scan(attachment, store), []
+            except TimeoutError:
+                return [], [
+                    schemas.VerdictDetail(
+                        key="timeout",
+                        description=f"{get_file_info(attachment)} could not be checked in {self.timeout} seconds.",
+                    )
+                ]
+            except Exception as e:
+                return [], [
+                    schemas.VerdictDetail(
+                        key="error",
+                        description=f"{get_file_info(attachment)} could not be checked: {e}",
+                    )
+                ]
+
+        results = await asyncio.gather(
+            *[process(attachment) for attachment in attachments]
+        )
+        details = list(itertools.chain.from_iterable(found for found, _ in results))
+        unchecked = list(
+            itertools.chain.from_iterable(unknown for _, unknown in results)
         )
 
         malicious = len(details) > 0
-        if not malicious:
+        if not malicious and not unchecked:
             details.append(
                 schemas.VerdictDetail(
                     key="benign",
                     description="There is no suspicious OLE file in attachments.",
                 )
             )
-        return schemas.Verdict(name=self.name, malicious=malicious, details=details)
+
+        error: str | None = None
+        if unchecked:
+            error = f"{len(unchecked)} of the OLE files in attachments could not be checked."
+
+        return schemas.Verdict(
+            name=self.name,
+            malicious=malicious,
+            details=details + unchecked,
+            error=error,
+        )
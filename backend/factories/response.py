@@ -1,42 +1,211 @@
+import asyncio
+import datetime
 import hashlib
-from collections.abc import Coroutine
+from collections.abc import AsyncIterator, Awaitable, Buffer, Callable, Coroutine
 from functools import partial
 from typing import Any
 
 import aiometer
 from loguru import logger
 
-from backend import clients, schemas, types
-from backend.factories.dkim_ import DKIMVerdictFactory
+from backend import clients, executors, factories, schemas, settings, types, utils
+from backend.attachments import AttachmentStore
+from backend.budget import ATTACHED_BYTES, ATTACHED_DEPTH, AttachedBudget
 
 from .abstract import AbstractAsyncFactory
-from .email_auth import EmailAuthVerdictFactory
-from .emailrep import EmailRepVerdictFactory
-from .eml import EmlFactory
-from .homoglyph import HomoglyphVerdictFactory
-from .ipqs import IPQSEmailVerdictFactory, IPQSIPVerdictFactory, IPQSURLVerdictFactory
-from .oldid import OleIDVerdictFactory
-from .spamassassin import SpamAssassinVerdictFactory
-from .url_unshorten import URLUnshortenVerdictFactory
-from .urlscan import UrlScanVerdictFactory
-from .virustotal import VirusTotalVerdictFactory
+
+VerdictTask = partial[Coroutine[Any, Any, schemas.Verdict | None]]
+LateVerdictsCallback = Callable[[schemas.Response], Awaitable[None]]
+
+TIMED_OUT = "timed out"
+
+# keeps references to the background tasks completing late verdicts
+_background_tasks: set[asyncio.Task] = set()
 
 
 def log_exception(exception: Exception):
     logger.exception(exception)
 
 
-def parse(eml_file: bytes) -> schemas.Response:
-    return schemas.Response(
-        eml=EmlFactory().call(eml_file), id=hashlib.sha256(eml_file).hexdigest()
+def parse_eml(eml_file: Buffer) -> schemas.Eml:
+    return factories.EmlFactory().call(eml_file)
+
+
+def get_id(eml_file: Buffer) -> str:
+    return hashlib.sha256(eml_file).hexdigest()
+
+
+def parse(eml_file: Buffer, *, id: str | None = None) -> schemas.Response:
+    """Parse an email. Its SHA-256 is computed unless given as id (e.g. by a spool)."""
+    return schemas.Response(eml=parse_eml(eml_file), id=id or get_id(eml_file))
+
+
+async def _parse_async(
+    eml_file: Buffer,
+    *,
+    executor: str,
+    parse_timeout: float | None,
+    id: str | None = None,
+) -> schemas.Response:
+    if executor != "process":
+        return parse(eml_file, id=id)
+
+    # a view of a spooled email is sent to the pool as bytes
+    eml = await executors.run_in_process(
+        parse_eml, bytes(eml_file), job_timeout=parse_timeout
+    )
+    return schemas.Response(eml=eml, id=id or get_id(eml_file))
+
+
+def _select_attached_messages(
+    messages: dict[str, bytes], *, budget: AttachedBudget, exceeded_limits: list[str]
+) -> tuple[list[schemas.Response], list[bytes]]:
+    """Select the attached emails to parse within the budget.
+
+    The ones already parsed along with an email they are attached to (see
+    parse_attached_messages) are returned as they are, and the ones seen elsewhere in
+    the tree are skipped.
+    """
+    adopted: list[schemas.Response] = []
+    selected: list[bytes] = []
+    for id, message in messages.items():
+        if (child := budget.parsed.pop(id, None)) is not None:
+            adopted.append(child)
+            continue
+
+        if id in budget.seen:
+            continue
+
+        if not budget.take(len(message)):
+            if ATTACHED_BYTES not in exceeded_limits:
+                exceeded_limits.append(ATTACHED_BYTES)
+            continue
+
+        budget.seen.add(id)
+        selected.append(message)
+
+    return adopted, selected
+
+
+async def _parse_messages(
+    messages: list[bytes], *, executor: str, parse_timeout: float | None
+) -> list[schemas.Response]:
+    """Parse emails in parallel, skipping the ones which fail to parse."""
+
+    async def parse_one(message: bytes) -> schemas.Response | None:
+        try:
+            return await _parse_async(
+                message, executor=executor, parse_timeout=parse_timeout
+            )
+        except Exception as e:
+            log_exception(e)
+            return None
+
+    parsed = await asyncio.gather(*[parse_one(message) for message in messages])
+    return [response for response in parsed if response is not None]
+
+
+async def parse_attached_messages(
+    response: schemas.Response,
+    *,
+    budget: AttachedBudget,
+    store: AttachmentStore,
+    executor: str = settings.PARSE_EXECUTOR,
+    parse_timeout: float | None = settings.PARSE_TIMEOUT,
+    depth: int = 0,
+):
+    """Parse the emails attached to the email of the response into its children.
+
+    The attached emails of a level are parsed in parallel (in the process pool with the
+    process executor), then the emails attached to them and so on. The ones beyond the
+    limits of the budget are skipped and flagged in the exceededLimits of the email they
+    are attached to, and the ones which fail to parse are skipped. The attachments are
+    decoded into the store of the whole tree.
+    """
+    messages = utils.get_attached_messages(response.eml, store)
+    if len(messages) == 0:
+        return
+
+    exceeded_limits = response.eml.exceeded_limits
+    if depth >= budget.max_depth:
+        if ATTACHED_DEPTH not in exceeded_limits:
+            exceeded_limits.append(ATTACHED_DEPTH)
+        return
+
+    adopted, selected = _select_attached_messages(
+        messages, budget=budget, exceeded_limits=exceeded_limits
+    )
+    parsed = await _parse_messages(
+        selected, executor=executor, parse_timeout=parse_timeout
+    )
+    # eml_parser lists the emails attached to an attached email as well (as its MIME
+    # parts are walked), so the ones attached to a sibling are left to be its children
+    nested = set().union(
+        *[utils.get_attached_message_ids(child.eml) for child in parsed]
     )
+    for child in parsed:
+        if child.id in nested:
+            budget.parsed[child.id] = child
+
+    children = [child for child in parsed if child.id not in nested] + adopted
+    for child in children:
+        child.parent_id = response.id
+
+    await asyncio.gather(
+        *[
+            parse_attached_messages(
+                child,
+                budget=budget,
+                store=store,
+                executor=executor,
+                parse_timeout=parse_timeout,
+                depth=depth + 1,
+            )
+            for child in children
+        ]
+    )
+    # e.g. the ones attached to a sibling beyond the depth limit
+    for id in nested:
+        budget.parsed.pop(id, None)
+
+    response.children = children
+
+
+async def parse_async(
+    eml_file: Buffer,
+    *,
+    executor: str = settings.PARSE_EXECUTOR,
+    parse_timeout: float | None = settings.PARSE_TIMEOUT,
+    max_attached_depth: int = settings.PARSE_MAX_ATTACHED_DEPTH,
+    max_attached_bytes: int | None = settings.PARSE_MAX_ATTACHED_BYTES,
+    id: str | None = None,
+) -> schemas.Response:
+    response = await _parse_async(
+        eml_file, executor=executor, parse_timeout=parse_timeout, id=id
+    )
+    if max_attached_depth > 0:
+        budget = AttachedBudget(
+            max_depth=max_attached_depth,
+            max_bytes=max_attached_bytes,
+            seen={response.id},
+        )
+        await parse_attached_messages(
+            response,
+            budget=budget,
+            store=response.attachment_store,
+            executor=executor,
+            parse_timeout=parse_timeout,
+        )
+
+    return response
 
 
 async def get_spam_assassin_verdict(
-    eml_file: bytes, *, client: clients.SpamAssassin
+    eml_file: Buffer, *, client: clients.SpamAssassin
 ) -> schemas.Verdict | None:
     try:
-        return await SpamAssassinVerdictFactory(client).call(eml_file)
+        # a view of a spooled email is copied to the bytes aiospamc sends
+        return await factories.SpamAssassinVerdictFactory(client).call(bytes(eml_file))
     except Exception as e:
         log_exception(e)
 
@@ -44,10 +213,10 @@ async def get_spam_assassin_verdict(
 
 
 async def get_oleid_verdict(
-    attachments: list[schemas.Attachment],
+    attachments: list[schemas.Attachment], *, store: AttachmentStore | None = None
 ) -> schemas.Verdict | None:
     try:
-        return OleIDVerdictFactory().call(attachments)
+        return await factories.OleIDVerdictFactory().call(attachments, store=store)
     except Exception as e:
         log_exception(e)
 
@@ -58,7 +227,7 @@ async def get_email_rep_verdicts(
     from_, *, client: clients.EmailRep
 ) -> schemas.Verdict | None:
     try:
-        return await EmailRepVerdictFactory(client).call(from_)
+        return await factories.EmailRepVerdictFactory(client).call(from_)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -70,7 +239,7 @@ async def get_urlscan_verdict(
     urls: types.ListSet[str], *, client: clients.UrlScan
 ) -> schemas.Verdict | None:
     try:
-        return await UrlScanVerdictFactory(client).call(urls)
+        return await factories.UrlScanVerdictFactory(client).call(urls)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -82,7 +251,7 @@ async def get_vt_verdict(
     sha256s: types.ListSet[str], *, client: clients.VirusTotal
 ) -> schemas.Verdict | None:
     try:
-        return await VirusTotalVerdictFactory(client).call(sha256s)
+        return await factories.VirusTotalVerdictFactory(client).call(sha256s)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -90,9 +259,11 @@ async def get_vt_verdict(
         )
 
 
-async def get_dkim_verdict(eml_file: bytes, eml: schemas.Eml) -> schemas.Verdict | None:
+async def get_dkim_verdict(
+    eml_file: Buffer, eml: schemas.Eml
+) -> schemas.Verdict | None:
     try:
-        return await DKIMVerdictFactory().call(eml_file=eml_file, eml=eml)
+        return await factories.DKIMVerdictFactory().call(eml_file=eml_file, eml=eml)
     except Exception as e:
         log_exception(e)
 
@@ -101,7 +272,7 @@ async def get_dkim_verdict(eml_file: bytes, eml: schemas.Eml) -> schemas.Verdict
 
 async def get_email_auth_verdict(eml: schemas.Eml) -> schemas.Verdict | None:
     try:
-        return await EmailAuthVerdictFactory().call(eml)
+        return await factories.EmailAuthVerdictFactory().call(eml)
     except Exception as e:
         log_exception(e)
 
@@ -112,7 +283,7 @@ async def get_url_unshorten_verdict(
     urls: types.ListSet[str],
 ) -> schemas.Verdict | None:
     try:
-        return await URLUnshortenVerdictFactory().call(urls)
+        return await factories.URLUnshortenVerdictFactory().call(urls)
     except Exception as e:
         log_exception(e)
 
@@ -123,7 +294,7 @@ async def get_homoglyph_verdict(
     domains: types.ListSet[str], from_: str | None
 ) -> schemas.Verdict | None:
     try:
-        return await HomoglyphVerdictFactory().call(domains, from_)
+        return await factories.HomoglyphVerdictFactory().call(domains, from_)
     except Exception as e:
         log_exception(e)
 
@@ -134,7 +305,7 @@ async def get_ipqs_ip_verdict(
     ips: types.ListSet[str], *, client: clients.IPQualityScore
 ) -> schemas.Verdict | None:
     try:
-        return await IPQSIPVerdictFactory(client).call(ips)
+        return await factories.IPQSIPVerdictFactory(client).call(ips)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -146,7 +317,7 @@ async def get_ipqs_url_verdict(
     urls: types.ListSet[str], *, client: clients.IPQualityScore
 ) -> schemas.Verdict | None:
     try:
-        return await IPQSURLVerdictFactory(client).call(urls)
+        return await factories.IPQSURLVerdictFactory(client).call(urls)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -158,7 +329,7 @@ async def get_ipqs_email_verdict(
     email: str, *, client: clients.IPQualityScore
 ) -> schemas.Verdict | None:
     try:
-        return await IPQSEmailVerdictFactory(client).call(email)
+        return await factories.IPQSEmailVerdictFactory(client).call(email)
     except Exception as e:
         log_exception(e)
         return schemas.Verdict(
@@ -166,67 +337,263 @@ async def get_ipqs_email_verdict(
         )
 
 
-async def set_verdicts(
+async def run_verdict(
+    name: str,
+    task: VerdictTask,
+    *,
+    verdict_timeout: float | None = settings.VERDICT_TIMEOUT,
+    deadline: float | None = None,
+    late: dict[str, asyncio.Future] | None = None,
+) -> schemas.Verdict | None:
+    """Run a verdict task within its timeout and the deadline (in terms of loop.time).
+
+    A verdict which does not finish in time is returned as a timed out one. Its task
+    keeps running if late is given (and is put into it), otherwise it is cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    whens = [deadline]
+    if verdict_timeout is not None:
+        whens.append(loop.time() + verdict_timeout)
+    when = min((w for w in whens if w is not None), default=None)
+
+    future = asyncio.ensure_future(task())
+    try:
+        async with asyncio.timeout_at(when):
+            return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except TimeoutError:
+        if late is not None:
+            late[name] = future
+        else:
+            future.cancel()
+
+        return schemas.Verdict(name=name, malicious=False, error=TIMED_OUT)
+
+
+async def complete_late_verdicts(
     response: schemas.Response,
+    late: dict[str, asyncio.Future],
+    callback: LateVerdictsCallback,
     *,
-    eml_file: bytes,
-    spam_assassin: clients.SpamAssassin,
+    late_timeout: float | None = settings.VERDICTS_LATE_TIMEOUT,
+):
+    """Wait for the timed out verdicts and pass the response with them to the callback."""
+    done, pending = await asyncio.wait(late.values(), timeout=late_timeout)
+    for future in pending:
+        future.cancel()
+
+    completed: dict[str, schemas.Verdict] = {}
+    for name, future in late.items():
+        if future not in done or future.cancelled() or future.exception():
+            continue
+
+        if (verdict := future.result()) is not None:
+            completed[name] = verdict
+
+    if len(completed) == 0:
+        return
+
+    verdicts = [
+        completed.get(verdict.name, verdict) if verdict.error == TIMED_OUT else verdict
+        for verdict in response.verdicts
+    ]
+    try:
+        await callback(response.model_copy(update={"verdicts": verdicts}))
+    except Exception as e:
+        log_exception(e)
+
+
+def get_verdict_tasks(
+    response: schemas.Response,
+    *,
+    eml_file: Buffer,
+    spam_assassin: clients.SpamAssassin | None,
     optional_email_rep: clients.EmailRep | None = None,
     optional_vt: clients.VirusTotal | None = None,
     optional_urlscan: clients.UrlScan | None = None,
     optional_ipqs: clients.IPQualityScore | None = None,
-) -> schemas.Response:
-    tasks: list[partial[Coroutine[Any, Any, schemas.Verdict | None]]] = [
-        partial(get_spam_assassin_verdict, eml_file, client=spam_assassin),
-        partial(get_oleid_verdict, response.eml.attachments),
-        partial(get_dkim_verdict, eml_file=eml_file, eml=response.eml),
-        partial(get_email_auth_verdict, response.eml),
-        partial(get_homoglyph_verdict, response.domains, response.eml.header.from_),
-    ]
+) -> list[tuple[str, VerdictTask]]:
+    tasks: list[tuple[str, VerdictTask]] = []
+    if spam_assassin is not None:
+        tasks.append(
+            (
+                "SpamAssassin",
+                partial(get_spam_assassin_verdict, eml_file, client=spam_assassin),
+            )
+        )
+
+    tasks.extend(
+        [
+            (
+                "oleid",
+                partial(
+                    get_oleid_verdict,
+                    response.attachments,
+                    store=response.attachment_store,
+                ),
+            ),
+            ("DKIM", partial(get_dkim_verdict, eml_file=eml_file, eml=response.eml)),
+            ("Email Authentication", partial(get_email_auth_verdict, response.eml)),
+            (
+                "Homoglyph Detection",
+                partial(
+                    get_homoglyph_verdict, response.domains, response.eml.header.from_
+                ),
+            ),
+        ]
+    )
 
     if response.urls:
-        tasks.append(partial(get_url_unshorten_verdict, response.urls))
+        tasks.append(
+            ("URL Unshortening", partial(get_url_unshorten_verdict, response.urls))
+        )
 
     if response.eml.header.from_ is not None and optional_email_rep is not None:
         tasks.append(
-            partial(
-                get_email_rep_verdicts,
-                response.eml.header.from_,
-                client=optional_email_rep,
+            (
+                "EmailRep",
+                partial(
+                    get_email_rep_verdicts,
+                    response.eml.header.from_,
+                    client=optional_email_rep,
+                ),
             )
         )
 
     if optional_vt:
-        tasks.append(partial(get_vt_verdict, response.sha256s, client=optional_vt))
+        tasks.append(
+            (
+                "VirusTotal",
+                partial(get_vt_verdict, response.sha256s, client=optional_vt),
+            )
+        )
 
     if optional_urlscan:
         tasks.append(
-            partial(get_urlscan_verdict, response.urls, client=optional_urlscan)
+            (
+                "urlscan.io",
+                partial(get_urlscan_verdict, response.urls, client=optional_urlscan),
+            )
         )
 
     if optional_ipqs:
         if response.ip_addresses:
             tasks.append(
-                partial(
-                    get_ipqs_ip_verdict, response.ip_addresses, client=optional_ipqs
+                (
+                    "IPQS IP",
+                    partial(
+                        get_ipqs_ip_verdict, response.ip_addresses, client=optional_ipqs
+                    ),
                 )
             )
         combined_urls = response.urls | response.domains
         if combined_urls:
             tasks.append(
-                partial(get_ipqs_url_verdict, combined_urls, client=optional_ipqs)
+                (
+                    "IPQS URL",
+                    partial(get_ipqs_url_verdict, combined_urls, client=optional_ipqs),
+                )
             )
         if response.eml.header.from_ is not None:
             tasks.append(
-                partial(
-                    get_ipqs_email_verdict,
-                    response.eml.header.from_,
-                    client=optional_ipqs,
+                (
+                    "IPQS Email",
+                    partial(
+                        get_ipqs_email_verdict,
+                        response.eml.header.from_,
+                        client=optional_ipqs,
+                    ),
                 )
             )
 
-    results = await aiometer.run_all(tasks)
+    return tasks
+
+
+def get_verdict_runners(
+    tasks: list[tuple[str, VerdictTask]],
+    *,
+    verdict_timeout: float | None = settings.VERDICT_TIMEOUT,
+    verdicts_deadline: float | None = settings.VERDICTS_DEADLINE,
+    late: dict[str, asyncio.Future] | None = None,
+) -> list[partial[Coroutine[Any, Any, schemas.Verdict | None]]]:
+    loop = asyncio.get_running_loop()
+    deadline = (
+        loop.time() + verdicts_deadline if verdicts_deadline is not None else None
+    )
+    return [
+        partial(
+            run_verdict,
+            name,
+            task,
+            verdict_timeout=verdict_timeout,
+            deadline=deadline,
+            late=late,
+        )
+        for name, task in tasks
+    ]
+
+
+async def iter_verdicts(
+    tasks: list[tuple[str, VerdictTask]],
+    *,
+    verdict_timeout: float | None = settings.VERDICT_TIMEOUT,
+    verdicts_deadline: float | None = settings.VERDICTS_DEADLINE,
+) -> AsyncIterator[schemas.Verdict]:
+    """Yield verdicts in the order of their completion."""
+    runners = get_verdict_runners(
+        tasks, verdict_timeout=verdict_timeout, verdicts_deadline=verdicts_deadline
+    )
+    async with aiometer.amap(lambda runner: runner(), runners) as results:
+        async for result in results:
+            if result:
+                yield result
+
+
+async def set_verdicts(
+    response: schemas.Response,
+    *,
+    eml_file: Buffer,
+    spam_assassin: clients.SpamAssassin | None,
+    optional_email_rep: clients.EmailRep | None = None,
+    optional_vt: clients.VirusTotal | None = None,
+    optional_urlscan: clients.UrlScan | None = None,
+    optional_ipqs: clients.IPQualityScore | None = None,
+    verdict_timeout: float | None = settings.VERDICT_TIMEOUT,
+    verdicts_deadline: float | None = settings.VERDICTS_DEADLINE,
+    on_late_verdicts: LateVerdictsCallback | None = None,
+) -> schemas.Response:
+    tasks = get_verdict_tasks(
+        response,
+        eml_file=eml_file,
+        spam_assassin=spam_assassin,
+        optional_email_rep=optional_email_rep,
+        optional_vt=optional_vt,
+        optional_urlscan=optional_urlscan,
+        optional_ipqs=optional_ipqs,
+    )
+    late: dict[str, asyncio.Future] | None = (
+        {} if on_late_verdicts is not None else None
+    )
+    results = await aiometer.run_all(
+        get_verdict_runners(
+            tasks,
+            verdict_timeout=verdict_timeout,
+            verdicts_deadline=verdicts_deadline,
+            late=late,
+        )
+    )
     response.verdicts = [result for result in results if result]
+
+    if late and on_late_verdicts is not None:
+        # complete the timed out verdicts in the background
+        background = asyncio.create_task(
+            complete_late_verdicts(response, late, on_late_verdicts)
+        )
+        _background_tasks.add(background)
+        background.add_done_callback(_background_tasks.discard)
+
     return response
 
 
@@ -234,15 +601,19 @@ class ResponseFactory(AbstractAsyncFactory):
     @classmethod
     async def call(
         cls,
-        eml_file: bytes,
+        eml_file: Buffer,
         *,
-        spam_assassin: clients.SpamAssassin,
+        spam_assassin: clients.SpamAssassin | None,
         optional_email_rep: clients.EmailRep | None,
         optional_vt: clients.VirusTotal | None = None,
         optional_urlscan: clients.UrlScan | None = None,
         optional_ipqs: clients.IPQualityScore | None = None,
+        on_late_verdicts: LateVerdictsCallback | None = None,
+        executor: str = settings.PARSE_EXECUTOR,
+        id: str | None = None,
     ) -> schemas.Response:
-        parsed = parse(eml_file)
+        parsed = await parse_async(eml_file, executor=executor, id=id)
+        parsed.analyzed_at = datetime.datetime.now(datetime.UTC)
         return await set_verdicts(
             parsed,
             eml_file=eml_file,
@@ -251,4 +622,5 @@ class ResponseFactory(AbstractAsyncFactory):
             optional_vt=optional_vt,
             optional_urlscan=optional_urlscan,
             optional_ipqs=optional_ipqs,
+            on_late_verdicts=on_late_verdicts,
         )
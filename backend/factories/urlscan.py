@@ -5,13 +5,22 @@ from functools import partial
 import aiometer
 
 from backend import clients, schemas, settings, types
+from backend.ioc_cache import ioc_cache
 
 from .abstract import AbstractAsyncFactory
 
 
 async def lookup(url: str, *, client: clients.UrlScan) -> schemas.UrlScanLookup | None:
     with contextlib.suppress(Exception):
-        return await client.lookup(url)
+        return await ioc_cache.get_or_fetch(
+            "urlscan",
+            url,
+            partial(client.lookup, url),
+            dumps=lambda lookup: lookup.model_dump_json(),
+            loads=schemas.UrlScanLookup.model_validate_json,
+            # no malicious scan of the URL is (yet) known
+            is_negative=lambda lookup: len(lookup.results) == 0,
+        )
 
 
 async def bulk_lookup(
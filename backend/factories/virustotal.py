@@ -1,21 +1,56 @@
 import contextlib
+import json
 from functools import partial
 
 import aiometer
 import vt
 
 from backend import clients, schemas, settings, types
+from backend.ioc_cache import ioc_cache
 
 from .abstract import AbstractAsyncFactory
 
 NAME = "VirusTotal"
 
 
+def slim_file_object(obj: vt.Object) -> vt.Object:
+    # keep only the attributes used by transform to make the object cheap to cache
+    return vt.Object.from_dict(
+        {
+            "type": obj.type,
+            "id": obj.id,
+            "attributes": {
+                "sha256": obj.sha256,
+                "last_analysis_stats": obj.last_analysis_stats,
+            },
+        }
+    )
+
+
+async def fetch_file_object(
+    sha256: str, *, client: clients.VirusTotal
+) -> vt.Object | None:
+    try:
+        obj = await client.get_object_async(f"/files/{sha256}")
+    except vt.APIError as e:
+        if e.code == "NotFoundError":
+            return None
+        raise
+
+    return slim_file_object(obj)
+
+
 async def get_file_object(
     sha256: str, *, client: clients.VirusTotal
 ) -> vt.Object | None:
     with contextlib.suppress(Exception):
-        return await client.get_object_async(f"/files/{sha256}")
+        return await ioc_cache.get_or_fetch(
+            "virustotal",
+            sha256,
+            partial(fetch_file_object, sha256, client=client),
+            dumps=lambda obj: json.dumps(obj.to_dict()),
+            loads=lambda data: vt.Object.from_dict(json.loads(data)),
+        )
 
     return None
 
@@ -0,0 +1,175 @@
+import dataclasses
+from html.parser import HTMLParser
+
+try:
+    # lxml is optional (it is faster than html.parser but it is not a dependency)
+    from lxml import etree
+except ImportError:  # pragma: no cover
+    etree = None
+
+# elements whose content is not rendered
+IGNORED_TAGS = {"head", "script", "style", "template", "title"}
+
+# ignored elements whose end tag may be left out (they are ended by the body)
+HEAD_TAGS = {"head", "title"}
+
+# elements which separate the text around them
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "br",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "fieldset",
+    "figcaption",
+    "figure",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "hr",
+    "li",
+    "main",
+    "nav",
+    "ol",
+    "p",
+    "pre",
+    "section",
+    "table",
+    "td",
+    "th",
+    "tr",
+    "ul",
+}
+
+# elements which start the body (and end an unclosed head)
+BODY_TAGS = {"a", "body", "img", *BLOCK_TAGS}
+
+
+@dataclasses.dataclass
+class HTMLContent:
+    text: str
+    hrefs: list[str]
+
+
+class Collector:
+    """Collects links and visible text from the events of an HTML tokenizer."""
+
+    def __init__(self):
+        self.hrefs: list[str] = []
+        self._parts: list[str] = []
+        # the open ignored elements
+        self._ignored: list[str] = []
+
+    def start(self, tag: str, attrs: dict[str, str | None]):
+        if tag in BODY_TAGS:
+            # e.g. <head><meta charset="utf-8"><body>, where </head> is left out
+            self._ignored = [
+                ignored for ignored in self._ignored if ignored not in HEAD_TAGS
+            ]
+
+        if tag in IGNORED_TAGS:
+            self._ignored.append(tag)
+            return
+
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+        if tag == "a" and (href := attrs.get("href")) is not None:
+            self.hrefs.append(href)
+
+        if tag == "img":
+            # rendered as its alt text and its source (as html2text does), so that the
+            # URLs of the images are extracted from the text
+            alt = attrs.get("alt") or ""
+            src = attrs.get("src") or ""
+            self._parts.append(f" {alt} {src} ")
+
+    def end(self, tag: str):
+        if tag in IGNORED_TAGS:
+            if tag in self._ignored:
+                self._ignored.remove(tag)
+            return
+
+        if tag in BLOCK_TAGS:
+            self._parts.append("\n")
+
+    def data(self, data: str):
+        if not self._ignored:
+            self._parts.append(data)
+
+    def close(self) -> HTMLContent:
+        return HTMLContent(text="".join(self._parts), hrefs=self.hrefs)
+
+
+class _HTMLParser(HTMLParser):
+    def __init__(self, collector: Collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        self.collector.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag: str):
+        self.collector.end(tag)
+
+    def handle_data(self, data: str):
+        self.collector.data(data)
+
+
+class _LXMLTarget:
+    # adapts lxml's parser target interface (attributes are given as a dict)
+    def __init__(self, collector: Collector):
+        self.collector = collector
+
+    def start(self, tag: str, attrib: dict[str, str]):
+        self.collector.start(tag, dict(attrib))
+
+    def end(self, tag: str):
+        self.collector.end(tag)
+
+    def data(self, data: str):
+        self.collector.data(data)
+
+    def close(self) -> HTMLContent:
+        return self.collector.close()
+
+
+def _tokenize_with_html_parser(html: str) -> HTMLContent:
+    collector = Collector()
+    parser = _HTMLParser(collector)
+    parser.feed(html)
+    parser.close()
+    return collector.close()
+
+
+def _tokenize_with_lxml(html: str) -> HTMLContent:
+    parser = etree.HTMLParser(target=_LXMLTarget(Collector()))  # type: ignore
+    parser.feed(html)
+    return parser.close()
+
+
+def tokenize(html: str, *, use_lxml: bool | None = None) -> HTMLContent:
+    """Extract links and visible text from HTML in a single pass.
+
+    lxml is used if it is installed (unless use_lxml is False).
+    """
+    if use_lxml is None:
+        use_lxml = etree is not None
+
+    if use_lxml and html != "":
+        try:
+            return _tokenize_with_lxml(html)
+        except etree.Error:  # type: ignore
+            pass
+
+    return _tokenize_with_html_parser(html)
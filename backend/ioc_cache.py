@@ -0,0 +1,219 @@
+import contextlib
+import contextvars
+import dataclasses
+import time
+import typing
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterator
+
+from loguru import logger
+from redis.asyncio import Redis
+
+from backend import settings
+from backend.singleflight import SingleFlight
+
+# marker stored for IOCs the provider has no information about
+NOT_FOUND_VALUE = ""
+
+MISSING = object()
+_NOT_FOUND = object()
+
+# lookups made within IOCCache.batch (keyed by their cache key)
+_batch_lookups: contextvars.ContextVar[dict[str, typing.Any] | None] = (
+    contextvars.ContextVar("batch_lookups", default=None)
+)
+
+
+@dataclasses.dataclass
+class Counter:
+    memory_hits: int = 0
+    redis_hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+
+
+class LRUCache:
+    """A size-bounded in-process LRU cache whose entries expire after their TTL."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, typing.Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> typing.Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: typing.Any, ttl: int) -> None:
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class IOCCache:
+    """Two-tier (in-process LRU and Redis) cache of per-IOC lookup results.
+
+    A lookup returning None means the provider has no information about the IOC,
+    which is cached with the negative TTL. Errors are not cached.
+    """
+
+    def __init__(
+        self,
+        *,
+        ttls: dict[str, int],
+        negative_ttl: int = settings.IOC_CACHE_NEGATIVE_TTL,
+        max_size: int = settings.IOC_CACHE_MAX_SIZE,
+        key_prefix: str = settings.IOC_CACHE_KEY_PREFIX,
+        enabled: bool = settings.IOC_CACHE_ENABLED,
+    ):
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self.key_prefix = key_prefix
+        self.enabled = enabled
+        self.redis: Redis | None = None
+
+        self._memory = LRUCache(max_size)
+        self._counters: dict[str, Counter] = {}
+        self._single_flight = SingleFlight()
+
+    def _get_counter(self, provider: str) -> Counter:
+        return self._counters.setdefault(provider, Counter())
+
+    @property
+    def counters(self) -> dict[str, Counter]:
+        return self._counters
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self._counters.clear()
+
+    @contextlib.contextmanager
+    def batch(self, lookups: dict[str, typing.Any] | None = None) -> Iterator[None]:
+        """Look up each IOC once across the analyses (tasks) made within the block.
+
+        Lookups are shared even if the cache is disabled (or the TTL of the provider is
+        0), so that the same IOC in many emails of a batch is looked up once. Blocks
+        entered with the same lookups (e.g. one per task of a batch) share them.
+        """
+        token = _batch_lookups.set({} if lookups is None else lookups)
+        try:
+            yield
+        finally:
+            _batch_lookups.reset(token)
+
+    async def _get_from_batch(
+        self, key: str, fetch: Callable[[], Awaitable[typing.Any]]
+    ) -> typing.Any:
+        lookups = _batch_lookups.get()
+        if lookups is None:
+            return await fetch()
+
+        if key in lookups:
+            return lookups[key]
+
+        async def fetch_once() -> typing.Any:
+            fetched = await fetch()
+            lookups[key] = fetched
+            return fetched
+
+        return await self._single_flight.do(key, fetch_once)
+
+    async def _get_from_redis(self, key: str) -> bytes | None:
+        if self.redis is None:
+            return None
+
+        try:
+            return await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Failed to get {key} from Redis: {e}")
+            return None
+
+    async def _set_to_redis(self, key: str, value: str, ttl: int) -> None:
+        if self.redis is None:
+            return
+
+        try:
+            await self.redis.set(key, value, ex=ttl)
+        except Exception as e:
+            logger.warning(f"Failed to set {key} to Redis: {e}")
+
+    async def get_or_fetch(
+        self,
+        provider: str,
+        ioc: str,
+        fetch: Callable[[], Awaitable[typing.Any]],
+        *,
+        dumps: Callable[[typing.Any], str],
+        loads: Callable[[bytes], typing.Any],
+        is_negative: Callable[[typing.Any], bool] | None = None,
+    ) -> typing.Any:
+        ttl = self.ttls.get(provider, 0)
+        key = f"{self.key_prefix}:{provider}:{ioc}"
+        if not self.enabled or ttl <= 0:
+            return await self._get_from_batch(key, fetch)
+
+        counter = self._get_counter(provider)
+
+        value = self._memory.get(key)
+        if value is not MISSING:
+            counter.memory_hits += 1
+            if value is _NOT_FOUND:
+                counter.negative_hits += 1
+                return None
+            return value
+
+        got = await self._get_from_redis(key)
+        if got is not None:
+            counter.redis_hits += 1
+            if got.decode() == NOT_FOUND_VALUE:
+                counter.negative_hits += 1
+                self._memory.set(key, _NOT_FOUND, self.negative_ttl)
+                return None
+
+            value = loads(got)
+            self._memory.set(key, value, ttl)
+            return value
+
+        async def fetch_and_set() -> typing.Any:
+            counter.misses += 1
+            fetched = await fetch()
+            if fetched is None:
+                self._memory.set(key, _NOT_FOUND, self.negative_ttl)
+                await self._set_to_redis(key, NOT_FOUND_VALUE, self.negative_ttl)
+                return None
+
+            fetched_ttl = (
+                self.negative_ttl if is_negative and is_negative(fetched) else ttl
+            )
+            self._memory.set(key, fetched, fetched_ttl)
+            await self._set_to_redis(key, dumps(fetched), fetched_ttl)
+            return fetched
+
+        # concurrent lookups of the same IOC share a single API call
+        return await self._single_flight.do(key, fetch_and_set)
+
+
+ioc_cache = IOCCache(
+    ttls={
+        "virustotal": settings.IOC_CACHE_VIRUSTOTAL_TTL,
+        "urlscan": settings.IOC_CACHE_URLSCAN_TTL,
+        "ipqs_ip": settings.IOC_CACHE_IPQS_TTL,
+        "ipqs_url": settings.IOC_CACHE_IPQS_TTL,
+        "emailrep": settings.IOC_CACHE_EMAILREP_TTL,
+    }
+)
@@ -0,0 +1,485 @@
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import time
+import uuid
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import WatchError
+
+from backend import clients, schemas, settings
+from backend.blobs import store_response_attachments
+from backend.cache import cache_response, get_cached_response, get_key
+from backend.factories.response import LateVerdictsCallback, ResponseFactory
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# the fields of a job hash returned by get_job (the file is left out)
+_FIELDS = ["status", "submitted_at", "started_at", "finished_at", "error"]
+# time.time() of the last heartbeat of the worker running a job
+HEARTBEAT_AT = "heartbeat_at"
+# number of times a job has been taken by a worker
+ATTEMPTS = "attempts"
+
+ABANDONED_ERROR = "The workers running the job stopped"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def get_job_key(id: str, *, key_prefix: str = settings.JOB_KEY_PREFIX) -> str:
+    return f"{key_prefix}:{id}"
+
+
+def get_queue_key(*, key_prefix: str = settings.JOB_KEY_PREFIX) -> str:
+    return f"queue:{key_prefix}"
+
+
+def get_processing_key(
+    worker_id: str, *, key_prefix: str = settings.JOB_KEY_PREFIX
+) -> str:
+    # the jobs taken by a worker, until they are done with
+    return f"processing:{key_prefix}:{worker_id}"
+
+
+def get_lease_key(worker_id: str, *, key_prefix: str = settings.JOB_KEY_PREFIX) -> str:
+    return f"lease:{key_prefix}:{worker_id}"
+
+
+def get_workers_key(*, key_prefix: str = settings.JOB_KEY_PREFIX) -> str:
+    return f"workers:{key_prefix}"
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.UTC).isoformat()
+
+
+def _queue_status(
+    pipe: Pipeline, key: str, status: str, *, expire: int, **fields: str
+) -> None:
+    pipe.hset(key, mapping={"status": status, **fields})
+    if status in (DONE, FAILED):
+        # the file is not needed anymore
+        pipe.hdel(key, "file")
+    if expire > 0:
+        pipe.expire(key, expire)
+
+
+async def _set_status(
+    redis: Redis,
+    id: str,
+    status: str,
+    *,
+    expire: int = settings.JOB_EXPIRE,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    **fields: str,
+):
+    key = get_job_key(id, key_prefix=key_prefix)
+    async with redis.pipeline(transaction=True) as pipe:
+        _queue_status(pipe, key, status, expire=expire, **fields)
+        await pipe.execute()
+
+
+async def get_job(
+    redis: Redis,
+    id: str,
+    *,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+) -> schemas.Job | None:
+    """Get a job and, once it is done, its analysis result (from the analysis cache)."""
+    values: list[bytes | None] = await redis.hmget(
+        get_job_key(id, key_prefix=key_prefix), _FIELDS
+    )
+    if values[0] is None:
+        return None
+
+    fields = {
+        field: value.decode()
+        for field, value in zip(_FIELDS, values, strict=False)
+        if value is not None
+    }
+    job = schemas.Job.model_validate({"id": id, **fields})
+    if job.status == DONE:
+        # None if the cached analysis has expired (or been evicted) since
+        job.response = await get_cached_response(redis, id)
+
+    return job
+
+
+async def enqueue_job(
+    redis: Redis,
+    file: bytes,
+    *,
+    force_refresh: bool = False,
+    max_queued: int | None = settings.JOB_MAX_QUEUED,
+    expire: int = settings.JOB_EXPIRE,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+) -> schemas.Job:
+    """Queue an analysis of the file for a worker.
+
+    A job is identified by the SHA-256 of its file (as its analysis result), so a file
+    which is already queued or being analyzed is not queued again and a file with a
+    cached analysis result is done right away (unless force_refresh is set).
+    Raises QueueFullError if max_queued jobs are already waiting.
+    """
+    id = hashlib.sha256(file).hexdigest()
+    key = get_job_key(id, key_prefix=key_prefix)
+    queue_key = get_queue_key(key_prefix=key_prefix)
+
+    while True:
+        async with redis.pipeline(transaction=True) as pipe:
+            # the job is checked and queued atomically: a concurrent submission of the
+            # same file which changes it first fails the transaction
+            await pipe.watch(key)
+            # (a job abandoned by its worker is queued again by requeue_abandoned_jobs)
+            status: bytes | None = await pipe.hget(key, "status")
+            if status is not None and status.decode() in (QUEUED, RUNNING):
+                break
+
+            now = _now()
+            if (
+                not force_refresh
+                and settings.REDIS_READ_THROUGH
+                and await pipe.exists(get_key(id))
+            ):
+                pipe.multi()
+                _queue_status(
+                    pipe, key, DONE, expire=expire, submitted_at=now, finished_at=now
+                )
+            else:
+                if max_queued is not None and await pipe.llen(queue_key) >= max_queued:
+                    raise QueueFullError(f"{max_queued} jobs are already queued")
+
+                pipe.multi()
+                # a previous run of the job leaves its timestamps and error behind
+                pipe.delete(key)
+                pipe.hset(
+                    key, mapping={"status": QUEUED, "submitted_at": now, "file": file}
+                )
+                if expire > 0:
+                    pipe.expire(key, expire)
+                pipe.lpush(queue_key, id)
+
+            with contextlib.suppress(WatchError):
+                await pipe.execute()
+                break
+
+    job = await get_job(redis, id, key_prefix=key_prefix)
+    # e.g. the job has expired in the meantime
+    return job or schemas.Job(id=id, status=QUEUED)
+
+
+async def _heartbeat(
+    redis: Redis,
+    key: str,
+    *,
+    interval: float = settings.JOB_HEARTBEAT_INTERVAL,
+    expire: int = settings.JOB_EXPIRE,
+):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, HEARTBEAT_AT, str(time.time()))
+                if expire > 0:
+                    pipe.expire(key, expire)
+                await pipe.execute()
+        except Exception as e:
+            # the next heartbeat may get through (before the lease times out)
+            logger.warning(f"Failed to send the heartbeat of {key}: {e}")
+
+
+async def run_job(
+    redis: Redis,
+    id: str,
+    *,
+    shared_clients: clients.SharedClients,
+    spam_assassin: clients.SpamAssassin,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    heartbeat_interval: float = settings.JOB_HEARTBEAT_INTERVAL,
+):
+    key = get_job_key(id, key_prefix=key_prefix)
+    file: bytes | None = await redis.hget(key, "file")
+    if file is None:
+        # the job has expired while it was queued
+        logger.warning(f"Job {id} has no file, skipping it")
+        return
+
+    async with redis.pipeline(transaction=True) as pipe:
+        _queue_status(
+            pipe,
+            key,
+            RUNNING,
+            expire=settings.JOB_EXPIRE,
+            started_at=_now(),
+            **{HEARTBEAT_AT: str(time.time())},
+        )
+        pipe.hincrby(key, ATTEMPTS, 1)
+        await pipe.execute()
+
+    # keeps the job from being taken as abandoned while it runs
+    heartbeat = asyncio.create_task(_heartbeat(redis, key, interval=heartbeat_interval))
+
+    # set once the response is cached (so that late verdicts are not overwritten)
+    cached = asyncio.Event()
+    on_late_verdicts: LateVerdictsCallback | None = None
+    if settings.VERDICTS_COMPLETE_LATE:
+
+        async def cache_late_verdicts(completed: schemas.Response):
+            await cached.wait()
+            await cache_response(redis, completed)
+
+        on_late_verdicts = cache_late_verdicts
+
+    try:
+        response = await ResponseFactory.call(
+            file,
+            id=id,
+            spam_assassin=spam_assassin,
+            optional_email_rep=shared_clients.email_rep,
+            optional_vt=shared_clients.vt,
+            optional_urlscan=shared_clients.urlscan,
+            optional_ipqs=shared_clients.ipqs,
+            on_late_verdicts=on_late_verdicts,
+            # parsed off the event loop, which keeps sending the heartbeats
+            executor="process",
+        )
+        if settings.ATTACHMENT_BLOB_MODE:
+            await store_response_attachments(redis, response)
+
+        # stored in the analysis cache, where lookups (and get_job) find it
+        await cache_response(redis, response)
+    except Exception as e:
+        logger.exception(e)
+        await _set_status(
+            redis,
+            id,
+            FAILED,
+            key_prefix=key_prefix,
+            finished_at=_now(),
+            error=str(e) or type(e).__name__,
+        )
+        return
+    finally:
+        heartbeat.cancel()
+        cached.set()
+
+    await _set_status(redis, id, DONE, key_prefix=key_prefix, finished_at=_now())
+
+
+async def requeue_abandoned_jobs(
+    redis: Redis,
+    *,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+    expire: int = settings.JOB_EXPIRE,
+) -> int:
+    """Queue again the jobs taken by the workers whose lease has expired (e.g. killed).
+
+    A job which has been taken max_attempts times already (e.g. as it crashes its
+    workers) fails instead. Returns the number of jobs queued again.
+    """
+    workers_key = get_workers_key(key_prefix=key_prefix)
+    queue_key = get_queue_key(key_prefix=key_prefix)
+    requeued = 0
+    for member in await redis.smembers(workers_key):
+        worker_id = member.decode()
+        if await redis.exists(get_lease_key(worker_id, key_prefix=key_prefix)):
+            continue
+
+        processing_key = get_processing_key(worker_id, key_prefix=key_prefix)
+        async with redis.pipeline(transaction=True) as pipe:
+            # the jobs are moved atomically: another worker reaping the same list at
+            # once fails the transaction
+            await pipe.watch(processing_key)
+            ids = [id.decode() for id in await pipe.lrange(processing_key, 0, -1)]
+            values = [
+                await pipe.hmget(
+                    get_job_key(id, key_prefix=key_prefix), ["status", ATTEMPTS]
+                )
+                for id in ids
+            ]
+
+            pipe.multi()
+            count = 0
+            # the processing list is taken from the left, so its oldest job is pushed
+            # last and taken first
+            for id, (status, attempts) in zip(ids, values, strict=True):
+                # e.g. a job which has expired or was done right before its worker died
+                if status is None or status.decode() not in (QUEUED, RUNNING):
+                    continue
+
+                key = get_job_key(id, key_prefix=key_prefix)
+                if attempts is not None and int(attempts) >= max_attempts:
+                    _queue_status(
+                        pipe,
+                        key,
+                        FAILED,
+                        expire=expire,
+                        finished_at=_now(),
+                        error=ABANDONED_ERROR,
+                    )
+                    continue
+
+                pipe.hdel(key, "started_at", HEARTBEAT_AT)
+                _queue_status(pipe, key, QUEUED, expire=expire)
+                pipe.rpush(queue_key, id)
+                count += 1
+
+            pipe.delete(processing_key)
+            pipe.srem(workers_key, worker_id)
+            try:
+                await pipe.execute()
+            except WatchError:
+                continue
+
+        requeued += count
+        if len(ids) > 0:
+            logger.warning(f"Worker {worker_id} stopped, {count} of its jobs requeued")
+
+    return requeued
+
+
+async def _renew_lease(
+    redis: Redis,
+    worker_id: str,
+    *,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    lease_timeout: float = settings.JOB_LEASE_TIMEOUT,
+):
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(
+            get_lease_key(worker_id, key_prefix=key_prefix),
+            _now(),
+            px=int(lease_timeout * 1000),
+        )
+        pipe.sadd(get_workers_key(key_prefix=key_prefix), worker_id)
+        await pipe.execute()
+
+
+async def _keep_lease(
+    redis: Redis,
+    worker_id: str,
+    *,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    interval: float = settings.JOB_HEARTBEAT_INTERVAL,
+    lease_timeout: float = settings.JOB_LEASE_TIMEOUT,
+    max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+):
+    # each worker reaps the others, so jobs are recovered as long as one is running
+    while True:
+        try:
+            await requeue_abandoned_jobs(
+                redis, key_prefix=key_prefix, max_attempts=max_attempts
+            )
+        except Exception as e:
+            logger.warning(f"Failed to requeue the abandoned jobs: {e}")
+
+        await asyncio.sleep(interval)
+        try:
+            await _renew_lease(
+                redis, worker_id, key_prefix=key_prefix, lease_timeout=lease_timeout
+            )
+        except Exception as e:
+            # the next renewal may get through (before the lease times out)
+            logger.warning(f"Failed to renew the lease of worker {worker_id}: {e}")
+
+
+async def run_worker(
+    redis: Redis,
+    *,
+    shared_clients: clients.SharedClients,
+    spam_assassin: clients.SpamAssassin,
+    stopping: asyncio.Event,
+    worker_id: str | None = None,
+    concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+    poll_timeout: float = settings.JOB_POLL_TIMEOUT,
+    key_prefix: str = settings.JOB_KEY_PREFIX,
+    heartbeat_interval: float = settings.JOB_HEARTBEAT_INTERVAL,
+    lease_timeout: float = settings.JOB_LEASE_TIMEOUT,
+    max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+):
+    """Run the queued jobs (up to concurrency at once) until stopping is set.
+
+    A job is only taken from the queue once a slot is free, so the jobs a worker cannot
+    run yet are left to the other workers. A taken job is moved to the processing list
+    of the worker, from which the other workers queue it again once the lease of the
+    worker expires (see requeue_abandoned_jobs). The running jobs are awaited on
+    stopping.
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    queue_key = get_queue_key(key_prefix=key_prefix)
+    processing_key = get_processing_key(worker_id, key_prefix=key_prefix)
+    slots = asyncio.Semaphore(concurrency)
+    running: set[asyncio.Task] = set()
+
+    def release(task: asyncio.Task):
+        running.discard(task)
+        slots.release()
+
+    async def run(id: str):
+        try:
+            await run_job(
+                redis,
+                id,
+                shared_clients=shared_clients,
+                spam_assassin=spam_assassin,
+                key_prefix=key_prefix,
+                heartbeat_interval=heartbeat_interval,
+            )
+        finally:
+            try:
+                await redis.lrem(processing_key, 1, id)
+            except Exception as e:
+                # the job is requeued if the worker dies, and then skipped (no file)
+                logger.warning(f"Failed to remove job {id} from {processing_key}: {e}")
+
+    await _renew_lease(
+        redis, worker_id, key_prefix=key_prefix, lease_timeout=lease_timeout
+    )
+    lease = asyncio.create_task(
+        _keep_lease(
+            redis,
+            worker_id,
+            key_prefix=key_prefix,
+            interval=heartbeat_interval,
+            lease_timeout=lease_timeout,
+            max_attempts=max_attempts,
+        )
+    )
+    try:
+        while not stopping.is_set():
+            await slots.acquire()
+            if stopping.is_set():
+                slots.release()
+                break
+
+            # the timeout has to be shorter than REDIS_SOCKET_TIMEOUT
+            taken: bytes | None = await redis.blmove(
+                queue_key, processing_key, poll_timeout, "RIGHT", "LEFT"
+            )
+            if taken is None:
+                slots.release()
+                continue
+
+            task = asyncio.create_task(run(taken.decode()))
+            running.add(task)
+            task.add_done_callback(release)
+    finally:
+        if len(running) > 0:
+            await asyncio.gather(*running, return_exceptions=True)
+
+        lease.cancel()
+        # the other workers reap the processing list right away (it is empty unless a
+        # job could not be removed from it)
+        try:
+            await redis.delete(get_lease_key(worker_id, key_prefix=key_prefix))
+        except Exception as e:
+            logger.warning(f"Failed to release the lease of worker {worker_id}: {e}")
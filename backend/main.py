@@ -1,11 +1,46 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 from loguru import logger
 from Secweb.ContentSecurityPolicy import ContentSecurityPolicy
 
-from backend import settings
+from backend import clients, codec, executors, factories, settings
 from backend.api.api import api_router
+from backend.cache import create_redis
+from backend.ioc_cache import ioc_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # fail on startup rather than quietly parse inline
+    executors.check_parse_executor(settings.PARSE_EXECUTOR)
+    codec.check_codec(settings.REDIS_CACHE_CODEC)
+
+    # a single connection pool is shared by the cache endpoints, the cache writer
+    # and the per-IOC cache
+    app.state.redis = (
+        create_redis(str(settings.REDIS_URL)) if settings.REDIS_URL else None
+    )
+    ioc_cache.redis = app.state.redis
+
+    if settings.PARSE_WARM_UP:
+        # the factories are imported lazily, so the first request would pay for it
+        factories.warm_up()
+
+    # 3rd party API clients are shared across requests to reuse their connections
+    async with clients.open_shared_clients() as shared_clients:
+        app.state.clients = shared_clients
+        yield
+
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+        app.state.redis = None
+        ioc_cache.redis = None
+
+    executors.shutdown_process_pool()
+    executors.shutdown_thread_pool()
 
 
 def create_app():
@@ -15,6 +50,7 @@ def create_app():
 
     app = FastAPI(
         debug=settings.DEBUG,
+        lifespan=lifespan,
         title=settings.PROJECT_NAME,
         description="REST API for analyzing EML and MSG email files. Extracts headers, body content, IOCs (URLs, domains, IPs, emails), attachments, and DKIM signatures. Integrates with VirusTotal, urlscan.io, EmailRep, IPQualityScore, and SpamAssassin for threat intelligence.",
         version="1.0.0",
@@ -26,11 +62,19 @@ def create_app():
                 "name": "analyze",
                 "description": "Upload and analyze EML/MSG email files",
             },
+            {
+                "name": "jobs",
+                "description": "Queue analyses for the workers and poll their results",
+            },
             {
                 "name": "submit",
                 "description": "Submit IOCs to external threat intelligence services",
             },
             {"name": "lookup", "description": "Retrieve cached analysis results by ID"},
+            {
+                "name": "attachments",
+                "description": "Download attachments stored as blobs",
+            },
             {"name": "cache", "description": "Browse cached analysis keys"},
             {
                 "name": "status",
@@ -1,15 +1,19 @@
+from collections.abc import Buffer
+
 import oletools.oleid
-from olefile import isOleFile
 
 from backend.utils import is_truthy
+from backend.validator import is_ole_file, is_ooxml_file
 
 
 class OleID:
-    def __init__(self, data: bytes):
+    def __init__(self, data: Buffer):
         self.oid: oletools.oleid.OleID | None = None
 
-        if isOleFile(data):
-            self.oid = oletools.oleid.OleID(data=data)
+        # oletools takes bytes, which only OLE files and OOXML packages are copied to
+        # (not any zip file, e.g. an archive or a JAR)
+        if is_ole_file(data) or is_ooxml_file(data):
+            self.oid = oletools.oleid.OleID(data=bytes(data))
             self.oid.check()
 
     def _is_truthy_by_indicator_id(self, indicator_id: str) -> bool:
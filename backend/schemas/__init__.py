@@ -1,10 +1,26 @@
+from .cache import (  # noqa: F401
+    CacheStats,
+    CacheStatus,
+    CacheStorageCounter,
+    IOCCacheCounter,
+)
 from .emailrep import EmailRepLookup  # noqa: F401
 from .eml import Attachment, Body, Eml  # noqa: F401
 from .ipqs import IPQSEmailLookup, IPQSIPLookup, IPQSURLLookup  # noqa: F401
+from .job import Job, JobStatus  # noqa: F401
 from .payload import FilePayload, Payload  # noqa: F401
 from .response import Response  # noqa: F401
 from .spamassasin import SpamAssassinDetail, SpamAssassinReport  # noqa: F401
 from .status import Status  # noqa: F401
+from .stream import (  # noqa: F401
+    BatchErrorEvent,
+    BatchResultEvent,
+    BatchSummaryEvent,
+    EmlEvent,
+    IOCSummary,
+    SummaryEvent,
+    VerdictEvent,
+)
 from .submission import SubmissionResult  # noqa: F401
 from .urlscan import UrlScanLookup  # noqa: F401
 from .verdict import Verdict, VerdictDetail  # noqa: F401
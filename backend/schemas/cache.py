@@ -0,0 +1,48 @@
+from pydantic import Field
+
+from .api_model import APIModel
+
+
+class CacheStatus(APIModel):
+    hit: bool = Field(description="Whether the result was served from the cache")
+    age: int | None = Field(
+        default=None,
+        description="Seconds elapsed since the cached analysis was made, if known",
+    )
+    stale: bool = Field(
+        default=False,
+        description="Whether the cached analysis is older than the staleness threshold",
+    )
+
+
+class IOCCacheCounter(APIModel):
+    memory_hits: int = Field(
+        default=0, description="Lookups served from the in-process cache"
+    )
+    redis_hits: int = Field(default=0, description="Lookups served from Redis")
+    negative_hits: int = Field(
+        default=0,
+        description="Cache hits for IOCs the provider has no information about",
+    )
+    misses: int = Field(default=0, description="Lookups sent to the provider")
+
+
+class CacheStorageCounter(APIModel):
+    writes: int = Field(default=0, description="Analysis results written to Redis")
+    raw_bytes: int = Field(
+        default=0, description="Total size of the written results as plain JSON"
+    )
+    stored_bytes: int = Field(
+        default=0, description="Total size of the written results as stored in Redis"
+    )
+
+
+class CacheStats(APIModel):
+    ioc: dict[str, IOCCacheCounter] = Field(
+        default_factory=dict,
+        description="Per-provider counters of the per-IOC lookup cache of this worker",
+    )
+    storage: CacheStorageCounter = Field(
+        default_factory=CacheStorageCounter,
+        description="Storage counters of the analysis results cached by this worker",
+    )
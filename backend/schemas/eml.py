@@ -13,7 +13,10 @@ class Hash(APIModel):
 
 
 class Attachment(APIModel):
-    raw: str = Field(description="Base64-encoded raw attachment content")
+    raw: str | None = Field(
+        default=None,
+        description="Base64-encoded raw attachment content (omitted when attachments are stored as blobs, see /api/attachments/{sha256})",
+    )
     filename: str = Field(description="Original filename of the attachment")
     size: int = Field(description="File size in bytes")
     extension: str | None = Field(
@@ -111,3 +114,12 @@ class Eml(APIModel):
         description="Email body parts (text/plain, text/html, etc.)"
     )
     header: Header = Field(description="Parsed email headers")
+    exceeded_limits: list[str] = Field(
+        default_factory=list,
+        description="Parse limits which were hit (the result is partial if any)",
+    )
+    inline_forwards: list[Attachment] = Field(
+        default_factory=list,
+        exclude=True,
+        description="Emails forwarded inline, which are not listed as attachments but parsed as attached emails",
+    )
@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Literal
+
+from pydantic import Field
+
+from .api_model import APIModel
+from .response import Response
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class Job(APIModel):
+    id: str = Field(
+        description="Unique identifier of the job (and of its analysis result)"
+    )
+    status: JobStatus = Field(description="Status of the job")
+    submitted_at: datetime | None = Field(
+        default=None, description="When the job was submitted"
+    )
+    started_at: datetime | None = Field(
+        default=None, description="When a worker started the analysis"
+    )
+    finished_at: datetime | None = Field(
+        default=None, description="When the analysis finished (or failed)"
+    )
+    error: str | None = Field(default=None, description="Why the analysis failed")
+    response: Response | None = Field(
+        default=None, description="Analysis result (once the job is done)"
+    )
@@ -1,10 +1,15 @@
 import itertools
+from collections.abc import Iterator
+from datetime import datetime
 from functools import cached_property
 
 from pydantic import Field
 
+from backend.attachments import AttachmentStore
+
 from .api_model import APIModel
-from .eml import Eml
+from .cache import CacheStatus
+from .eml import Attachment, Body, Eml
 from .verdict import Verdict
 
 
@@ -17,28 +22,68 @@ class Response(APIModel):
         description="Threat intelligence verdicts from configured services",
     )
     id: str = Field(description="Unique identifier for this analysis result")
+    analyzed_at: datetime | None = Field(
+        default=None, description="When the analysis was made"
+    )
+    cache: CacheStatus | None = Field(
+        default=None,
+        description="Cache status when the result was served from the cache",
+    )
+    parent_id: str | None = Field(
+        default=None,
+        description="ID of the analysis of the email this one is attached to",
+    )
+    children: list["Response"] = Field(
+        default_factory=list,
+        description="Analyses of the emails attached to this one (.eml and .msg attachments and inline forwards). Their IOCs are included in the verdicts of this one.",
+    )
+
+    def iter_emls(self) -> Iterator[Eml]:
+        """Yield the email and the emails attached to it (recursively)."""
+        yield self.eml
+        for child in self.children:
+            yield from child.iter_emls()
 
     @cached_property
-    def urls(self) -> set[str]:
-        return set(
-            itertools.chain.from_iterable([body.urls for body in self.eml.bodies])
+    def bodies(self) -> list[Body]:
+        return list(
+            itertools.chain.from_iterable(eml.bodies for eml in self.iter_emls())
         )
 
+    @cached_property
+    def attachments(self) -> list[Attachment]:
+        # an attachment of an attached email may be one of the email as well
+        attachments: dict[str, Attachment] = {}
+        for eml in self.iter_emls():
+            for attachment in eml.attachments:
+                attachments.setdefault(attachment.hash.sha256, attachment)
+        return list(attachments.values())
+
+    @cached_property
+    def attachment_store(self) -> AttachmentStore:
+        # the decoded contents of the attachments (of the attached emails as well)
+        return AttachmentStore()
+
+    @cached_property
+    def urls(self) -> set[str]:
+        return set(itertools.chain.from_iterable([body.urls for body in self.bodies]))
+
     @cached_property
     def sha256s(self) -> set[str]:
-        return {attachment.hash.sha256 for attachment in self.eml.attachments}
+        return {attachment.hash.sha256 for attachment in self.attachments}
 
     @cached_property
     def ip_addresses(self) -> set[str]:
         ips: set[str] = set()
-        if self.eml.header.received_ip:
-            ips.update(self.eml.header.received_ip)
-        for body in self.eml.bodies:
+        for eml in self.iter_emls():
+            if eml.header.received_ip:
+                ips.update(eml.header.received_ip)
+        for body in self.bodies:
             ips.update(body.ip_addresses)
         return ips
 
     @cached_property
     def domains(self) -> set[str]:
         return set(
-            itertools.chain.from_iterable([body.domains for body in self.eml.bodies])
+            itertools.chain.from_iterable([body.domains for body in self.bodies])
         )
@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Any, Literal
+
+from pydantic import Field
+
+from .api_model import APIModel
+from .cache import CacheStatus
+from .eml import Eml
+from .response import Response
+from .verdict import Verdict
+
+
+class EmlEvent(APIModel):
+    type: Literal["eml"] = "eml"
+    id: str = Field(description="Unique identifier for this analysis result")
+    eml: Eml = Field(
+        description="Parsed email content including headers, bodies, and attachments"
+    )
+    children: list[Response] = Field(
+        default_factory=list,
+        description="Analyses of the emails attached to this one (without verdicts)",
+    )
+    cache: CacheStatus | None = Field(
+        default=None,
+        description="Cache status when the result was served from the cache",
+    )
+
+
+class VerdictEvent(APIModel):
+    type: Literal["verdict"] = "verdict"
+    verdict: Verdict = Field(description="A verdict (sent as soon as it is made)")
+
+
+class SummaryEvent(APIModel):
+    type: Literal["summary"] = "summary"
+    id: str = Field(description="Unique identifier for this analysis result")
+    analyzed_at: datetime | None = Field(
+        default=None, description="When the analysis was made"
+    )
+    verdicts: int = Field(description="Number of verdicts")
+    malicious: int = Field(description="Number of malicious verdicts")
+    errors: int = Field(description="Number of verdicts which failed or timed out")
+
+
+class BatchResultEvent(APIModel):
+    type: Literal["result"] = "result"
+    index: int = Field(description="Position of the email in the batch")
+    filename: str | None = Field(default=None, description="Filename of the email")
+    response: Response = Field(description="Analysis result of the email")
+
+
+class BatchErrorEvent(APIModel):
+    type: Literal["error"] = "error"
+    index: int = Field(description="Position of the email in the batch")
+    filename: str | None = Field(default=None, description="Filename of the email")
+    status: int = Field(description="HTTP status code the analysis would have got")
+    detail: Any = Field(description="Why the analysis failed")
+
+
+class IOCSummary(APIModel):
+    urls: list[str] = Field(default_factory=list, description="URLs of the bodies")
+    domains: list[str] = Field(
+        default_factory=list, description="Domains of the bodies"
+    )
+    ip_addresses: list[str] = Field(
+        default_factory=list,
+        description="IP addresses of the bodies and the Received headers",
+    )
+    emails: list[str] = Field(
+        default_factory=list, description="Email addresses of the bodies"
+    )
+    sha256s: list[str] = Field(
+        default_factory=list,
+        alias="sha256s",
+        description="SHA-256 hashes of the attachments",
+    )
+
+
+class BatchSummaryEvent(APIModel):
+    type: Literal["summary"] = "summary"
+    total: int = Field(description="Number of emails in the batch")
+    analyzed: int = Field(description="Number of analyzed emails")
+    failed: int = Field(description="Number of emails which failed to be analyzed")
+    truncated: bool = Field(
+        default=False,
+        description="Whether the emails beyond the limit of an archive were skipped",
+    )
+    iocs: IOCSummary = Field(
+        default_factory=IOCSummary,
+        description="IOCs of all the analyzed emails (deduplicated)",
+    )
@@ -29,6 +29,79 @@ REDIS_KEY_PREFIX: str = config("REDIS_KEY_PREFIX", cast=str, default="analysis")
 REDIS_CACHE_LIST_AVAILABLE: bool = config(
     "REDIS_CACHE_LIST_AVAILABLE", cast=bool, default=True
 )
+REDIS_CACHE_LIST_PAGE_SIZE: int = config(
+    "REDIS_CACHE_LIST_PAGE_SIZE", cast=int, default=100
+)
+# codec of cached analysis results ("zlib", "zstd" (requires zstandard) or "json")
+REDIS_CACHE_CODEC: str = config("REDIS_CACHE_CODEC", cast=str, default="zlib")
+REDIS_CACHE_COMPRESSION_LEVEL: int | None = config(
+    "REDIS_CACHE_COMPRESSION_LEVEL", cast=int, default=None
+)
+REDIS_MAX_CONNECTIONS: int = config("REDIS_MAX_CONNECTIONS", cast=int, default=50)
+REDIS_HEALTH_CHECK_INTERVAL: int = config(
+    "REDIS_HEALTH_CHECK_INTERVAL", cast=int, default=30
+)
+REDIS_SOCKET_TIMEOUT: float | None = config(
+    "REDIS_SOCKET_TIMEOUT", cast=float, default=5.0
+)
+REDIS_SOCKET_CONNECT_TIMEOUT: float | None = config(
+    "REDIS_SOCKET_CONNECT_TIMEOUT", cast=float, default=5.0
+)
+REDIS_READ_THROUGH: bool = config("REDIS_READ_THROUGH", cast=bool, default=True)
+REDIS_STALE_AFTER: int = config("REDIS_STALE_AFTER", cast=int, default=0)
+
+# Attachment blobs (attachments are stored in Redis and fetched from
+# /api/attachments/{sha256} instead of being embedded in the analysis result)
+ATTACHMENT_BLOB_MODE: bool = config("ATTACHMENT_BLOB_MODE", cast=bool, default=False)
+ATTACHMENT_BLOB_CHUNK_SIZE: int = config(
+    "ATTACHMENT_BLOB_CHUNK_SIZE", cast=int, default=1024 * 1024
+)
+
+# Decoded attachments of an analysis (kept in memory up to ATTACHMENT_MAX_MEMORY_SIZE
+# bytes in total and in temporary files beyond)
+ATTACHMENT_MAX_MEMORY_SIZE: int = config(
+    "ATTACHMENT_MAX_MEMORY_SIZE", cast=int, default=16 * 1024 * 1024
+)
+
+# Single-flight (coalescing concurrent analyses of the same file)
+SINGLE_FLIGHT: bool = config("SINGLE_FLIGHT", cast=bool, default=True)
+SINGLE_FLIGHT_REDIS_LOCK: bool = config(
+    "SINGLE_FLIGHT_REDIS_LOCK", cast=bool, default=False
+)
+SINGLE_FLIGHT_LOCK_TIMEOUT: int = config(
+    "SINGLE_FLIGHT_LOCK_TIMEOUT", cast=int, default=120
+)
+SINGLE_FLIGHT_POLL_INTERVAL: float = config(
+    "SINGLE_FLIGHT_POLL_INTERVAL", cast=float, default=0.5
+)
+
+# Batches (many emails analyzed by a single request of /api/analyze/batch)
+BATCH_MAX_FILES: int = config("BATCH_MAX_FILES", cast=int, default=100)
+BATCH_MAX_AT_ONCE: int = config("BATCH_MAX_AT_ONCE", cast=int, default=4)
+# emails of an archive of /api/analyze/archive beyond it are skipped
+ARCHIVE_MAX_MESSAGES: int | None = config(
+    "ARCHIVE_MAX_MESSAGES", cast=int, default=10000
+)
+# members of a zip archive larger than it (once decompressed) are skipped
+ARCHIVE_MAX_MEMBER_SIZE: int | None = config(
+    "ARCHIVE_MAX_MEMBER_SIZE", cast=int, default=25 * 1024 * 1024
+)
+
+# Jobs (analyses queued in Redis and run by the workers of backend.worker)
+JOB_KEY_PREFIX: str = config("JOB_KEY_PREFIX", cast=str, default="job")
+JOB_EXPIRE: int = config("JOB_EXPIRE", cast=int, default=3600)
+JOB_MAX_QUEUED: int | None = config("JOB_MAX_QUEUED", cast=int, default=1000)
+JOB_WORKER_CONCURRENCY: int = config("JOB_WORKER_CONCURRENCY", cast=int, default=4)
+JOB_POLL_TIMEOUT: float = config("JOB_POLL_TIMEOUT", cast=float, default=1.0)
+# a worker (and each of its running jobs) refreshes its heartbeat every
+# JOB_HEARTBEAT_INTERVAL seconds, and the jobs of a worker whose lease has not been
+# renewed for JOB_LEASE_TIMEOUT seconds are queued again
+JOB_HEARTBEAT_INTERVAL: float = config(
+    "JOB_HEARTBEAT_INTERVAL", cast=float, default=10.0
+)
+JOB_LEASE_TIMEOUT: float = config("JOB_LEASE_TIMEOUT", cast=float, default=60.0)
+# a job taken by JOB_MAX_ATTEMPTS workers which all died with it fails
+JOB_MAX_ATTEMPTS: int = config("JOB_MAX_ATTEMPTS", cast=int, default=3)
 
 # 3rd party API keys
 VIRUSTOTAL_API_KEY: Secret | None = config(
@@ -42,11 +115,86 @@ IPQUALITYSCORE_API_KEY: Secret | None = config(
     "IPQUALITYSCORE_API_KEY", cast=Secret, default=None
 )
 
+# Connection pooling of the 3rd party API clients (shared for the app lifetime)
+HTTP_MAX_CONNECTIONS: int = config("HTTP_MAX_CONNECTIONS", cast=int, default=100)
+HTTP_MAX_KEEPALIVE_CONNECTIONS: int = config(
+    "HTTP_MAX_KEEPALIVE_CONNECTIONS", cast=int, default=20
+)
+HTTP_KEEPALIVE_EXPIRY: float = config("HTTP_KEEPALIVE_EXPIRY", cast=float, default=30.0)
+HTTP_TIMEOUT: float = config("HTTP_TIMEOUT", cast=float, default=5.0)
+# HTTP/2 needs the http2 extra (httpx[http2])
+HTTP_HTTP2: bool = config("HTTP_HTTP2", cast=bool, default=False)
+
+# Per-IOC cache of VirusTotal, urlscan.io, IPQualityScore and EmailRep lookups
+IOC_CACHE_ENABLED: bool = config("IOC_CACHE_ENABLED", cast=bool, default=True)
+IOC_CACHE_MAX_SIZE: int = config("IOC_CACHE_MAX_SIZE", cast=int, default=10000)
+IOC_CACHE_KEY_PREFIX: str = config("IOC_CACHE_KEY_PREFIX", cast=str, default="ioc")
+IOC_CACHE_NEGATIVE_TTL: int = config("IOC_CACHE_NEGATIVE_TTL", cast=int, default=600)
+IOC_CACHE_VIRUSTOTAL_TTL: int = config(
+    "IOC_CACHE_VIRUSTOTAL_TTL", cast=int, default=3600
+)
+IOC_CACHE_URLSCAN_TTL: int = config("IOC_CACHE_URLSCAN_TTL", cast=int, default=3600)
+IOC_CACHE_IPQS_TTL: int = config("IOC_CACHE_IPQS_TTL", cast=int, default=3600)
+IOC_CACHE_EMAILREP_TTL: int = config("IOC_CACHE_EMAILREP_TTL", cast=int, default=3600)
+
 # Clerk authentication
 CLERK_SECRET_KEY: Secret | None = config("CLERK_SECRET_KEY", cast=Secret, default=None)
 
+# Verdicts (the ones which do not finish in time are returned as timed out)
+VERDICT_TIMEOUT: float | None = config("VERDICT_TIMEOUT", cast=float, default=30.0)
+VERDICTS_DEADLINE: float | None = config("VERDICTS_DEADLINE", cast=float, default=60.0)
+VERDICTS_COMPLETE_LATE: bool = config(
+    "VERDICTS_COMPLETE_LATE", cast=bool, default=False
+)
+VERDICTS_LATE_TIMEOUT: float | None = config(
+    "VERDICTS_LATE_TIMEOUT", cast=float, default=300.0
+)
+
+# OleID ("thread" runs the checks of the attachments in a thread pool of OLEID_POOL_SIZE
+# threads, "process" in the process pool). A check which fails or runs longer than
+# OLEID_TIMEOUT seconds is given up on (but not stopped) and reported as not checked.
+OLEID_EXECUTOR: str = config("OLEID_EXECUTOR", cast=str, default="thread")
+OLEID_POOL_SIZE: int = config("OLEID_POOL_SIZE", cast=int, default=4)
+OLEID_TIMEOUT: float | None = config("OLEID_TIMEOUT", cast=float, default=10.0)
+
 # Async/aiometer
 ASYNC_MAX_AT_ONCE: int | None = config("ASYNC_MAX_AT_ONCE", cast=int, default=None)
 ASYNC_MAX_PER_SECOND: float | None = config(
     "ASYNC_MAX_PER_SECOND", cast=float, default=None
 )
+
+# Parsing ("inline" runs on the event loop, "process" runs in a process pool)
+PARSE_EXECUTOR: str = config("PARSE_EXECUTOR", cast=str, default="inline")
+PARSE_POOL_SIZE: int | None = config("PARSE_POOL_SIZE", cast=int, default=None)
+PARSE_POOL_MAX_TASKS_PER_CHILD: int | None = config(
+    "PARSE_POOL_MAX_TASKS_PER_CHILD", cast=int, default=None
+)
+PARSE_TIMEOUT: float | None = config("PARSE_TIMEOUT", cast=float, default=None)
+# import the parsers and the verdict factories on startup instead of on first use
+PARSE_WARM_UP: bool = config("PARSE_WARM_UP", cast=bool, default=False)
+
+# Parse limits (the parts of an email beyond them are skipped and flagged in the result)
+PARSE_STAGE_TIMEOUT: float | None = config(
+    "PARSE_STAGE_TIMEOUT", cast=float, default=10.0
+)
+PARSE_MAX_MIME_PARTS: int | None = config("PARSE_MAX_MIME_PARTS", cast=int, default=500)
+PARSE_MAX_BODY_SCAN_SIZE: int | None = config(
+    "PARSE_MAX_BODY_SCAN_SIZE", cast=int, default=2_000_000
+)
+PARSE_MAX_ATTACHMENT_BYTES: int | None = config(
+    "PARSE_MAX_ATTACHMENT_BYTES", cast=int, default=50 * 1024 * 1024
+)
+# attached emails (.eml and .msg attachments and inline forwards) are parsed as well,
+# up to PARSE_MAX_ATTACHED_DEPTH levels deep (0 disables it)
+PARSE_MAX_ATTACHED_DEPTH: int = config("PARSE_MAX_ATTACHED_DEPTH", cast=int, default=3)
+PARSE_MAX_ATTACHED_BYTES: int | None = config(
+    "PARSE_MAX_ATTACHED_BYTES", cast=int, default=20 * 1024 * 1024
+)
+
+# Uploads of /api/analyze/file and /api/analyze/raw (spooled to a temporary file beyond
+# UPLOAD_MAX_MEMORY_SIZE bytes and mapped for the parser)
+UPLOAD_MAX_SIZE: int | None = config("UPLOAD_MAX_SIZE", cast=int, default=None)
+UPLOAD_MAX_MEMORY_SIZE: int = config(
+    "UPLOAD_MAX_MEMORY_SIZE", cast=int, default=1024 * 1024
+)
+UPLOAD_CHUNK_SIZE: int = config("UPLOAD_CHUNK_SIZE", cast=int, default=64 * 1024)
@@ -0,0 +1,36 @@
+import asyncio
+import typing
+from collections.abc import Awaitable, Callable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call.
+
+    Callers arriving while a call for the key is in flight await the same future
+    instead of making a call of their own.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[str, asyncio.Future[typing.Any]] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._flights
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def _forget(self, key: str, flight: asyncio.Future[typing.Any]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def do(
+        self, key: str, func: Callable[[], Awaitable[typing.Any]]
+    ) -> typing.Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda f: self._forget(key, f))
+
+        # shield the shared flight so a cancelled caller does not cancel it for others
+        return await asyncio.shield(flight)
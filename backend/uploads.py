@@ -0,0 +1,127 @@
+import contextlib
+import hashlib
+import mmap
+import tempfile
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from backend import settings
+from backend.validator import is_eml_file, is_msg_file, is_msg_fobj, is_ole_file
+
+# number of the first bytes an EML file is told from
+SNIFF_SIZE = 2048
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class EmailSpool:
+    """An uploaded email, kept in memory up to max_memory_size and in a temporary file beyond.
+
+    The email is hashed as it is written and its type is sniffed from its first bytes, so
+    an upload is identified and validated without a whole copy of it in memory. The
+    parser reads it through view().
+    """
+
+    def __init__(
+        self,
+        *,
+        max_size: int | None = settings.UPLOAD_MAX_SIZE,
+        max_memory_size: int = settings.UPLOAD_MAX_MEMORY_SIZE,
+    ):
+        self.max_size = max_size
+        self.max_memory_size = max_memory_size
+        self.size = 0
+        self.head = b""
+
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._file: BinaryIO | None = None
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    async def write(self, chunk: bytes):
+        if self.max_size is not None and self.size + len(chunk) > self.max_size:
+            raise UploadTooLargeError(f"The email is larger than {self.max_size} bytes")
+
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        if len(self.head) < SNIFF_SIZE:
+            self.head += chunk[: SNIFF_SIZE - len(self.head)]
+
+        if self._file is None and self.size <= self.max_memory_size:
+            self._buffer += chunk
+            return
+
+        if self._file is None:
+            self._file = await run_in_threadpool(self._rollover)
+
+        await run_in_threadpool(self._file.write, chunk)
+
+    def _rollover(self) -> BinaryIO:
+        # closed by close()
+        file = tempfile.TemporaryFile()  # noqa: SIM115
+        file.write(self._buffer)
+        self._buffer = bytearray()
+        return file
+
+    def is_email(self) -> bool:
+        """Whether the email is an EML or MSG file (it may read a MSG file, so it blocks)."""
+        if not is_ole_file(self.head):
+            return is_eml_file(self.head)
+
+        # a MSG file is told from the other OLE files (e.g. Office documents) by its
+        # directory, which may be anywhere in the file
+        if self._file is None:
+            return is_msg_file(bytes(self._buffer))
+
+        self._file.flush()
+        return is_msg_fobj(self._file)
+
+    def view(self) -> memoryview | mmap.mmap:
+        """Get the email as a memoryview of the memory or as a read-only map of the file.
+
+        The view stays valid once the spool is closed (until it is dropped), so it may be
+        handed to an analysis which outlives the request, e.g. a shared one.
+        """
+        if self._file is None:
+            return memoryview(self._buffer)
+
+        self._file.flush()
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        self._buffer = bytearray()
+        if self._file is not None:
+            self._file.close()
+
+
+@contextlib.asynccontextmanager
+async def spool_email(
+    chunks: AsyncIterable[bytes],
+    *,
+    max_size: int | None = settings.UPLOAD_MAX_SIZE,
+    max_memory_size: int = settings.UPLOAD_MAX_MEMORY_SIZE,
+) -> AsyncIterator[EmailSpool]:
+    """Spool an email as its chunks are received. Raises UploadTooLargeError beyond max_size."""
+    spool = EmailSpool(max_size=max_size, max_memory_size=max_memory_size)
+    try:
+        async for chunk in chunks:
+            await spool.write(chunk)
+
+        yield spool
+    finally:
+        spool.close()
+
+
+async def iter_upload(
+    file: UploadFile, *, chunk_size: int = settings.UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    while chunk := await file.read(chunk_size):
+        yield chunk
@@ -1,15 +1,22 @@
 import base64
 import re
-from collections.abc import Iterable
+from collections.abc import Buffer, Iterable
 from io import BytesIO
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import html2text
-from bs4 import BeautifulSoup
-from ioc_finder import parse_urls
 from kachi import unsafe_link
 
-from backend.schemas.eml import Attachment
+from backend.attachments import AttachmentStore
+from backend.html_tokenizer import tokenize
+from backend.schemas.eml import Attachment, Eml
+from backend.validator import MSG_MIME_TYPES, is_eml_or_msg_file
+
+if TYPE_CHECKING:
+    from backend.ioc import IOCs
+
+# the extensions and MIME types of the attachments which are emails
+MESSAGE_EXTENSIONS = ["eml", "msg"]
+MESSAGE_MIME_TYPES = ["message/rfc822", *MSG_MIME_TYPES]
 
 
 def is_html(content_type: str) -> bool:
@@ -24,34 +31,44 @@ def normalize_urls(urls: Iterable[str]) -> set[str]:
     return {normalize_url(url) for url in urls}
 
 
+def is_http_link(link: str) -> bool:
+    return link.startswith("http://") or link.startswith("https://")
+
+
 def get_href_links(html: str) -> set[str]:
-    soup = BeautifulSoup(html, "html.parser")
-    links: set[str] = {str(link.get("href")) for link in soup.findAll("a")}
-    return {
-        link
-        for link in links
-        if link.startswith("http://") or link.startswith("https://")
-    }
+    return {link for link in tokenize(html).hrefs if is_http_link(link)}
 
 
 def unsafe_links(urls: Iterable[str]) -> set[str]:
     return {unsafe_link(url) or url for url in urls}
 
 
-def parse_urls_from_body(content: str, content_type: str) -> set[str]:
-    urls: set[str] = set()
+def extract_body_iocs(
+    content: str, content_type: str, *, deadline: float | None = None
+) -> tuple["IOCs", set[str]]:
+    """Extract the IOCs and the URLs of a body in a single scan.
 
-    if is_html(content_type):
-        # extract href links
-        urls.update(get_href_links(content))
+    An HTML body is tokenized once, and its visible text and links are scanned rather
+    than its markup (e.g. the address of a mailto link is found in the link).
+    deadline is the time.monotonic based deadline of the scan.
+    """
+    # (imported lazily as ioc_finder is slow to import)
+    from backend.ioc import extract_iocs
 
-        # convert HTML to text
-        h = html2text.HTML2Text()
-        h.ignore_links = True
-        content = h.handle(content)
+    if not is_html(content_type):
+        iocs = extract_iocs(content, deadline=deadline)
+        return iocs, unsafe_links(normalize_urls(iocs.urls))
 
-    urls.update(parse_urls(content, parse_urls_without_scheme=False))
-    return unsafe_links(normalize_urls(urls))
+    html = tokenize(content)
+    iocs = extract_iocs("\n".join([html.text, *html.hrefs]), deadline=deadline)
+    urls = {link for link in html.hrefs if is_http_link(link)} | iocs.urls
+    return iocs, unsafe_links(normalize_urls(urls))
+
+
+def parse_urls_from_body(
+    content: str, content_type: str, *, deadline: float | None = None
+) -> set[str]:
+    return extract_body_iocs(content, content_type, deadline=deadline)[1]
 
 
 def is_truthy(v: Any) -> bool:
@@ -70,9 +87,60 @@ def is_truthy(v: Any) -> bool:
         return False
 
 
-def attachment_to_file(attachment: Attachment) -> BytesIO:
-    bytes_ = base64.b64decode(attachment.raw)
+def attachment_to_file(
+    attachment: Attachment, content: Buffer | None = None
+) -> BytesIO:
+    bytes_ = content if content is not None else base64.b64decode(attachment.raw or "")
 
     file_like = BytesIO(bytes_)
     file_like.name = attachment.filename
     return file_like
+
+
+def is_message_attachment(attachment: Attachment) -> bool:
+    extension = (attachment.extension or "").lower().lstrip(".")
+    if extension in MESSAGE_EXTENSIONS:
+        return True
+
+    content_types = [
+        str(content_type).lower()
+        for content_type in attachment.content_header.get("content-type", [])
+    ]
+    content_types.append(attachment.mime_type_short.lower())
+    return any(
+        content_type.startswith(mime_type)
+        for content_type in content_types
+        for mime_type in MESSAGE_MIME_TYPES
+    )
+
+
+def get_attached_message_ids(eml: Eml) -> set[str]:
+    """Get the SHA-256s of the emails attached to the email (without decoding them)."""
+    return {
+        attachment.hash.sha256
+        for attachment in [*eml.attachments, *eml.inline_forwards]
+        if is_message_attachment(attachment)
+    }
+
+
+def get_attached_messages(eml: Eml, store: AttachmentStore) -> dict[str, bytes]:
+    """Get the emails attached to the email (as attachments or forwarded inline).
+
+    The emails are keyed by SHA-256, so an email attached more than once is got once.
+    """
+    messages: dict[str, bytes] = {}
+    for attachment in [*eml.attachments, *eml.inline_forwards]:
+        sha256 = attachment.hash.sha256
+        if sha256 in messages or not is_message_attachment(attachment):
+            continue
+
+        view = store.get(attachment)
+        if view is None:
+            continue
+
+        content = bytes(view)
+        # e.g. a file named .eml which is not an email
+        if is_eml_or_msg_file(content):
+            messages[sha256] = content
+
+    return messages
@@ -1,8 +1,20 @@
+import io
+import zipfile
+from collections.abc import Buffer
+from typing import BinaryIO
+
 import magic
 
 EML_MIME_TYPES = ["message/rfc822", "text/html", "text/plain"]
 MSG_MIME_TYPES = ["application/vnd.ms-outlook"]
 
+# the first bytes of an OLE compound file (such as a MSG file or an Office document)
+OLE_SIGNATURE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+# the first bytes of a zip file (such as an OOXML document)
+ZIP_SIGNATURE = b"PK\x03\x04"
+# the part every OOXML package has (which lists the content types of the others)
+OOXML_CONTENT_TYPES = "[Content_Types].xml"
+
 
 def check_mime_type(data: bytes, valid_types: list[str]) -> bool:
     detected = magic.detect_from_content(data)  # type: ignore
@@ -20,3 +32,45 @@ def is_eml_file(data: bytes) -> bool:
 
 def is_msg_file(data: bytes) -> bool:
     return check_mime_type(data, MSG_MIME_TYPES)
+
+
+def is_ole_file(head: Buffer) -> bool:
+    return bytes(memoryview(head)[: len(OLE_SIGNATURE)]) == OLE_SIGNATURE
+
+
+def is_zip_file(head: Buffer) -> bool:
+    return bytes(memoryview(head)[: len(ZIP_SIGNATURE)]) == ZIP_SIGNATURE
+
+
+def is_office_file(head: Buffer) -> bool:
+    """Whether the data starts like an OLE file or an OOXML (zip) file.
+
+    Any zip file starts like an OOXML file, so it is only a prefilter (see is_ooxml_file).
+    """
+    return is_ole_file(head) or is_zip_file(head)
+
+
+def is_ooxml_file(data: Buffer) -> bool:
+    """Whether the data is a zip file which holds the content types of an OOXML package."""
+    if not is_zip_file(data):
+        return False
+
+    file = io.BytesIO(data)
+    if not zipfile.is_zipfile(file):
+        return False
+
+    try:
+        with zipfile.ZipFile(file) as zf:
+            zf.getinfo(OOXML_CONTENT_TYPES)
+    except (KeyError, zipfile.BadZipFile):
+        return False
+
+    return True
+
+
+def is_msg_fobj(file: BinaryIO) -> bool:
+    # libmagic reads the file (from its descriptor) as far as it needs to
+    file.seek(0)
+    detected = magic.detect_from_fobj(file)  # type: ignore
+
+    return str(detected.mime_type) in MSG_MIME_TYPES
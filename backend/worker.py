@@ -0,0 +1,62 @@
+import asyncio
+import signal
+
+from loguru import logger
+
+from backend import clients, codec, executors, factories, settings
+from backend.cache import create_redis
+from backend.ioc_cache import ioc_cache
+from backend.jobs import run_worker
+
+
+async def main():
+    if not settings.REDIS_URL:
+        raise SystemExit("REDIS_URL is not set (jobs are queued in Redis)")
+
+    try:
+        codec.check_codec(settings.REDIS_CACHE_CODEC)
+    except ValueError as e:
+        raise SystemExit(str(e)) from e
+
+    logger.add(
+        settings.LOG_FILE, level=settings.LOG_LEVEL, backtrace=settings.LOG_BACKTRACE
+    )
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    redis = create_redis(str(settings.REDIS_URL))
+    ioc_cache.redis = redis
+
+    # a worker is long-lived, so the factories are imported ahead of the first job
+    factories.warm_up()
+
+    spam_assassin = clients.SpamAssassin(
+        host=settings.SPAMASSASSIN_HOST,
+        port=settings.SPAMASSASSIN_PORT,
+        timeout=settings.SPAMASSASSIN_TIMEOUT,
+    )
+    try:
+        async with clients.open_shared_clients() as shared_clients:
+            logger.info(
+                f"Worker started (concurrency: {settings.JOB_WORKER_CONCURRENCY})"
+            )
+            await run_worker(
+                redis,
+                shared_clients=shared_clients,
+                spam_assassin=spam_assassin,
+                stopping=stopping,
+            )
+    finally:
+        await redis.aclose()
+        ioc_cache.redis = None
+        executors.shutdown_process_pool()
+        executors.shutdown_thread_pool()
+
+    logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
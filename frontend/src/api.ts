@@ -4,6 +4,9 @@ import { ResponseSchema, type ResponseType, StatusSchema, type StatusType } from
 
 const client = axios.create()
 
+// the maximum limit of /api/cache
+const CACHE_KEYS_PAGE_SIZE = 1000
+
 export function setupAuthInterceptor(getToken: () => Promise<string | null>) {
   client.interceptors.request.use(async (config) => {
     const token = await getToken()
@@ -29,10 +32,24 @@ export const API = {
     const res = await client.get(`/api/lookup/${id}`)
     return ResponseSchema.parse(res.data)
   },
-  async getCacheKeys(): Promise<string[]> {
-    const res = await client.get<string[]>(`/api/cache/`)
+  async getAttachment(sha256: string): Promise<Blob> {
+    const res = await client.get<Blob>(`/api/attachments/${sha256}`, { responseType: 'blob' })
     return res.data
   },
+  async getCacheKeys(): Promise<string[]> {
+    // the keys are listed a page at a time (the cursor of the next page is in X-Next-Cursor)
+    const keys: string[] = []
+    let cursor: string | undefined = undefined
+    do {
+      const res = await client.get<string[]>(`/api/cache/`, {
+        params: { limit: CACHE_KEYS_PAGE_SIZE, cursor }
+      })
+      keys.push(...res.data)
+      const next = res.headers['x-next-cursor']
+      cursor = typeof next === 'string' && next !== '' ? next : undefined
+    } while (cursor)
+    return keys
+  },
   async getStatus(): Promise<StatusType> {
     const res = await client.get(`/api/status/`)
     return StatusSchema.parse(res.data)
@@ -36,7 +36,7 @@ export type HeaderItemType = z.infer<typeof HeaderItemSchema>
 const DictionarySchema = z.record(z.string(), z.array(z.union([z.string(), z.number()])))
 
 export const AttachmentSchema = z.object({
-  raw: z.string(),
+  raw: z.string().nullish(),
   filename: z.string(),
   size: z.number(),
   extension: z.string().nullish(),
@@ -96,7 +96,8 @@ export type HeaderType = z.infer<typeof HeaderSchema>
 export const EmlSchema = z.object({
   attachments: z.array(AttachmentSchema),
   bodies: z.array(BodySchema),
-  header: HeaderSchema
+  header: HeaderSchema,
+  exceededLimits: z.array(z.string()).default([])
 })
 
 export type EmlType = z.infer<typeof EmlSchema>
@@ -25,6 +25,16 @@ export function b64toBlob(b64data: string, contentType = '', sliceSize = 512): B
   return blob
 }
 
+export function blobToB64(blob: Blob): Promise<string> {
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader()
+    // a data URL, whose base64 content follows the comma
+    reader.onload = () => resolve((reader.result as string).split(',', 2)[1] || '')
+    reader.onerror = () => reject(reader.error)
+    reader.readAsDataURL(blob)
+  })
+}
+
 export function toCSV(values: string[]): string {
   return values.join(', ')
 }
@@ -0,0 +1,29 @@
+"""Index the cached analyses missing from the /api/cache listing.
+
+Usage: python -m scripts.backfill_cache_index
+
+Analyses cached before the listing was backed by an index are not listed until they
+are indexed by this one-off script. It connects to REDIS_URL and can be run again
+safely (indexed analyses are left as they are).
+"""
+
+import asyncio
+
+from backend import settings
+from backend.cache import backfill_index, create_redis
+
+
+async def main() -> int:
+    redis = create_redis(str(settings.REDIS_URL))
+    try:
+        return await backfill_index(redis)
+    finally:
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    if settings.REDIS_URL is None:
+        raise SystemExit("REDIS_URL is not set")
+
+    added = asyncio.run(main())
+    print(f"Indexed {added} cached analyses")
@@ -0,0 +1,111 @@
+"""Benchmark the HTML body processing against the former BeautifulSoup + html2text path.
+
+Usage: python -m scripts.benchmark_html [--rounds N] [paths ...]
+
+HTML bodies are collected from the given EML files (tests/fixtures by default).
+"""
+
+import argparse
+import glob
+import time
+from collections.abc import Callable
+
+import eml_parser
+import html2text
+from bs4 import BeautifulSoup
+
+from backend.html_tokenizer import tokenize
+from backend.utils import is_html, parse_urls_from_body
+
+
+def legacy_get_links_and_text(html: str) -> tuple[set[str], str]:
+    soup = BeautifulSoup(html, "html.parser")
+    links = {str(link.get("href")) for link in soup.find_all("a")}
+
+    h = html2text.HTML2Text()
+    h.ignore_links = True
+    return links, h.handle(html)
+
+
+def get_links_and_text(html: str) -> tuple[set[str], str]:
+    content = tokenize(html)
+    return set(content.hrefs), content.text
+
+
+def legacy_parse_urls_from_body(content: str, content_type: str) -> set[str]:
+    # parse_urls_from_body as it was before the single-pass tokenizer
+    from ioc_finder import parse_urls
+
+    from backend.utils import is_http_link, normalize_urls, unsafe_links
+
+    urls: set[str] = set()
+    if is_html(content_type):
+        links, content = legacy_get_links_and_text(content)
+        urls.update(link for link in links if is_http_link(link))
+
+    urls.update(parse_urls(content, parse_urls_without_scheme=False))
+    return unsafe_links(normalize_urls(urls))
+
+
+def collect_html_bodies(paths: list[str]) -> list[str]:
+    parser = eml_parser.EmlParser(include_raw_body=True)
+    bodies: list[str] = []
+    for path in paths:
+        with open(path, "rb") as f:
+            try:
+                parsed = parser.decode_email_bytes(f.read())
+            except Exception:
+                continue
+
+        for body in parsed.get("body", []):
+            if is_html(body.get("content_type", "")):
+                bodies.append(body.get("content", ""))
+
+    return bodies
+
+
+def measure(func: Callable[[str], object], bodies: list[str], rounds: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for body in bodies:
+            func(body)
+    return time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paths", nargs="*")
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    paths = args.paths or glob.glob("tests/fixtures/**/*.eml", recursive=True)
+    bodies = collect_html_bodies(paths)
+    print(f"{len(bodies)} HTML bodies from {len(paths)} files, {args.rounds} rounds")
+
+    mismatches = [
+        body
+        for body in bodies
+        if legacy_parse_urls_from_body(body, "text/html")
+        != parse_urls_from_body(body, "text/html")
+    ]
+    print(f"URL mismatches: {len(mismatches)}")
+
+    for name, legacy, current in [
+        ("links and text", legacy_get_links_and_text, get_links_and_text),
+        (
+            "parse_urls_from_body",
+            lambda body: legacy_parse_urls_from_body(body, "text/html"),
+            lambda body: parse_urls_from_body(body, "text/html"),
+        ),
+    ]:
+        legacy_elapsed = measure(legacy, bodies, args.rounds)
+        current_elapsed = measure(current, bodies, args.rounds)
+        print(
+            f"{name}: BeautifulSoup + html2text {legacy_elapsed:.3f}s, "
+            f"tokenizer {current_elapsed:.3f}s "
+            f"({legacy_elapsed / max(current_elapsed, 1e-9):.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
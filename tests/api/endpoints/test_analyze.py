@@ -1,6 +1,32 @@
+import hashlib
+import io
+import json
+import zipfile
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from backend import schemas
+from backend.api.endpoints import analyze
+from backend.cache import get_index_key, get_key
+from backend.factories.response import ResponseFactory
+from tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def analyses(monkeypatch: pytest.MonkeyPatch) -> list[bytes]:
+    # the files analyzed (rather than served from the cache)
+    analyses: list[bytes] = []
+    call = ResponseFactory.call
+
+    async def record_call(eml_file, **kwargs):
+        analyses.append(bytes(eml_file))
+        return await call(eml_file, **kwargs)
+
+    monkeypatch.setattr(ResponseFactory, "call", record_call)
+    return analyses
+
 
 def test_analyze(client: TestClient, sample_eml: bytes):
     payload = {"file": sample_eml.decode()}
@@ -11,6 +37,80 @@ def test_analyze(client: TestClient, sample_eml: bytes):
     assert json.get("eml", {}).get("header", {}).get("from") == "no-reply@example.com"
 
 
+def test_analyze_with_cache(
+    redis_client: TestClient,
+    redis: FakeRedis,
+    analyses: list[bytes],
+    sample_eml: bytes,
+):
+    payload = {"file": sample_eml.decode()}
+    miss = redis_client.post("/api/analyze/", json=payload)
+    assert miss.status_code == status.HTTP_200_OK
+    assert miss.json()["cache"] is None
+
+    id = hashlib.sha256(sample_eml).hexdigest()
+    assert miss.json()["id"] == id
+    assert get_key(id) in redis.data
+    assert id in redis.data[get_index_key()]
+
+    hit = redis_client.post("/api/analyze/", json=payload)
+    assert hit.status_code == status.HTTP_200_OK
+    assert hit.json()["cache"]["hit"] is True
+    assert hit.json()["cache"]["age"] >= 0
+    assert hit.json()["cache"]["stale"] is False
+    assert hit.json()["eml"] == miss.json()["eml"]
+    assert len(analyses) == 1
+
+    # an upload of the same file is served from the same entry
+    upload = redis_client.post("/api/analyze/file", files={"file": sample_eml})
+    assert upload.json()["cache"]["hit"] is True
+    assert len(analyses) == 1
+
+
+def test_analyze_with_force_refresh(
+    redis_client: TestClient, analyses: list[bytes], sample_eml: bytes
+):
+    payload = {"file": sample_eml.decode()}
+    redis_client.post("/api/analyze/", json=payload)
+
+    response = redis_client.post("/api/analyze/?force_refresh=true", json=payload)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["cache"] is None
+    assert len(analyses) == 2
+
+    # the refreshed analysis is cached in turn
+    response = redis_client.post("/api/analyze/", json=payload)
+    assert response.json()["cache"]["hit"] is True
+    assert len(analyses) == 2
+
+
+def test_analyze_with_parse_timeout(
+    monkeypatch: pytest.MonkeyPatch, client: TestClient, sample_eml: bytes
+):
+    async def call(eml_file, **kwargs) -> schemas.Response:
+        raise TimeoutError()
+
+    monkeypatch.setattr(ResponseFactory, "call", call)
+    response = client.post("/api/analyze/", json={"file": sample_eml.decode()})
+    assert response.status_code == status.HTTP_504_GATEWAY_TIMEOUT
+
+
+def test_analyze_with_cache_timeout(
+    monkeypatch: pytest.MonkeyPatch, redis_client: TestClient, sample_eml: bytes
+):
+    async def call(eml_file, **kwargs) -> schemas.Response:
+        return schemas.Response.model_construct(id=kwargs["id"])
+
+    async def cache_response(redis, response: schemas.Response):
+        raise TimeoutError()
+
+    monkeypatch.setattr(ResponseFactory, "call", call)
+    monkeypatch.setattr(analyze, "cache_response", cache_response)
+    # a timeout of Redis is not taken as one of the parse
+    with pytest.raises(TimeoutError):
+        redis_client.post("/api/analyze/", json={"file": sample_eml.decode()})
+
+
 def test_analyze_with_invalid_file(client: TestClient):
     payload = {"file": ""}
     response = client.post("/api/analyze/", json=payload)
@@ -30,3 +130,90 @@ def test_analyze_file_with_invalid_file(client: TestClient):
     data = {"file": b""}
     response = client.post("/api/analyze/file", files=data)
     assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_analyze_raw(client: TestClient, sample_eml: bytes):
+    response = client.post(
+        "/api/analyze/raw",
+        content=sample_eml,
+        headers={"content-type": "message/rfc822"},
+    )
+
+    json = response.json()
+    assert json.get("eml", {}).get("header", {}).get("subject") == "Winter promotions"
+    assert json.get("eml", {}).get("header", {}).get("from") == "no-reply@example.com"
+
+
+def test_analyze_raw_with_invalid_file(client: TestClient, encrypted_docx: bytes):
+    response = client.post("/api/analyze/raw", content=encrypted_docx)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_analyze_stream(client: TestClient, sample_eml: bytes):
+    payload = {"file": sample_eml.decode()}
+    response = client.post("/api/analyze/stream", json=payload)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    events = [json.loads(line) for line in response.iter_lines() if line]
+    assert events[0]["type"] == "eml"
+    assert events[0]["eml"]["header"]["subject"] == "Winter promotions"
+
+    verdicts = [event for event in events if event["type"] == "verdict"]
+    assert events[-1]["type"] == "summary"
+    assert events[-1]["verdicts"] == len(verdicts)
+
+
+def test_analyze_stream_with_invalid_file(client: TestClient):
+    payload = {"file": ""}
+    response = client.post("/api/analyze/stream", json=payload)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_analyze_batch(client: TestClient, sample_eml: bytes, cc_eml: bytes):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("cc.eml", cc_eml)
+
+    files = [
+        ("files", ("sample.eml", sample_eml)),
+        ("files", ("invalid.bin", b"\x00")),
+        ("files", ("emails.zip", archive.getvalue())),
+    ]
+    response = client.post("/api/analyze/batch", files=files)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    events = [json.loads(line) for line in response.iter_lines() if line]
+    results = {event["filename"]: event for event in events[:-1]}
+    assert results["sample.eml"]["type"] == "result"
+    assert results["emails.zip/cc.eml"]["type"] == "result"
+    assert results["invalid.bin"]["type"] == "error"
+    assert results["invalid.bin"]["status"] == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+    summary = events[-1]
+    assert summary["type"] == "summary"
+    assert (summary["total"], summary["analyzed"], summary["failed"]) == (3, 2, 1)
+
+
+def test_analyze_archive(client: TestClient, sample_eml: bytes, cc_eml: bytes):
+    mbox = b"".join(
+        b"From sender@example.com Mon Jan  1 00:00:00 2024\n" + eml + b"\n"
+        for eml in (sample_eml, cc_eml)
+    )
+    files = {"file": ("inbox.mbox", mbox)}
+    response = client.post("/api/analyze/archive", files=files)
+    assert response.status_code == status.HTTP_200_OK
+
+    events = [json.loads(line) for line in response.iter_lines() if line]
+    results = [event for event in events if event["type"] == "result"]
+    assert sorted(result["filename"] for result in results) == [
+        "inbox.mbox/1",
+        "inbox.mbox/2",
+    ]
+
+    summary = events[-1]
+    assert summary["type"] == "summary"
+    assert summary["total"] == 2
+    assert summary["truncated"] is False
+    assert len(summary["iocs"]["sha256s"]) > 0
@@ -0,0 +1,48 @@
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from backend.blobs import get_blob_key, store_attachments
+from tests.fake_redis import FakeRedis
+from tests.test_attachments import make_attachment
+
+
+def test_get_attachment_without_redis(client: TestClient):
+    response = client.get("/api/attachments/foo")
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+
+async def test_get_attachment(redis_client: TestClient, redis: FakeRedis):
+    content = b"foo" * 1000
+    attachment = make_attachment(content)
+    await store_attachments(redis, [attachment])  # type: ignore
+
+    response = redis_client.get(
+        f"/api/attachments/{attachment.hash.sha256}",
+        params={"filename": "foo bar.bin"},
+        # not compressed by the GZip middleware (which drops the content length)
+        headers={"Accept-Encoding": "identity"},
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.content == content
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-length"] == str(len(content))
+    assert (
+        response.headers["content-disposition"]
+        == "attachment; filename*=UTF-8''foo%20bar.bin"
+    )
+
+
+async def test_get_attachment_with_expired_blob(
+    redis_client: TestClient, redis: FakeRedis
+):
+    attachment = make_attachment(b"foo")
+    await store_attachments(redis, [attachment])  # type: ignore
+    await redis.delete(get_blob_key(attachment.hash.sha256))
+
+    response = redis_client.get(f"/api/attachments/{attachment.hash.sha256}")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_attachment_with_unknown_sha256(redis_client: TestClient):
+    response = redis_client.get("/api/attachments/foo")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -0,0 +1,32 @@
+import datetime
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from backend.cache import get_index_key
+from tests.fake_redis import FakeRedis
+
+
+def test_cache_keys_without_redis(client: TestClient):
+    response = client.get("/api/cache/")
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+
+
+async def test_cache_keys(redis_client: TestClient, redis: FakeRedis):
+    now = datetime.datetime.now(datetime.UTC).timestamp()
+    # c, b and a share a score
+    await redis.zadd(get_index_key(), {"a": now, "b": now, "c": now, "d": now + 1})
+
+    response = redis_client.get("/api/cache/", params={"limit": 2})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == ["d", "c"]
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = redis_client.get("/api/cache/", params={"limit": 2, "cursor": cursor})
+    assert response.json() == ["b", "a"]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_cache_keys_with_invalid_cursor(redis_client: TestClient):
+    response = redis_client.get("/api/cache/", params={"cursor": "foo"})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
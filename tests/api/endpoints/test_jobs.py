@@ -0,0 +1,14 @@
+import base64
+
+from fastapi.testclient import TestClient
+
+
+def test_submit_job_without_redis(client: TestClient, sample_eml: bytes):
+    payload = {"file": base64.b64encode(sample_eml).decode()}
+    response = client.post("/api/jobs/", json=payload)
+    assert response.status_code == 501
+
+
+def test_get_job_without_redis(client: TestClient):
+    response = client.get("/api/jobs/foo")
+    assert response.status_code == 501
@@ -0,0 +1,43 @@
+from fastapi.testclient import TestClient
+
+from backend import codec
+
+
+class FakeRedis:
+    def __init__(self, value: bytes | None):
+        self.value = value
+        self.keys: list[str] = []
+
+    async def get(self, key: str) -> bytes | None:
+        self.keys.append(key)
+        return self.value
+
+
+def test_lookup_without_redis(client: TestClient):
+    response = client.get("/api/lookup/foo")
+    assert response.status_code == 501
+
+
+def test_lookup(client: TestClient):
+    redis = FakeRedis(codec.encode(b'{"foo":"bar"}', codec=codec.ZLIB))
+    client.app.state.redis = redis  # type: ignore
+    try:
+        response = client.get("/api/lookup/foo")
+    finally:
+        client.app.state.redis = None  # type: ignore
+
+    assert response.status_code == 200
+    assert response.json() == {"foo": "bar"}
+    assert redis.keys == ["analysis:foo"]
+
+
+def test_lookup_with_undecodable_entry(client: TestClient):
+    # an unknown codec ID
+    client.app.state.redis = FakeRedis(codec.MAGIC + bytes([codec.VERSION, 9]) + b"{}")  # type: ignore
+    try:
+        response = client.get("/api/lookup/foo")
+    finally:
+        client.app.state.redis = None  # type: ignore
+
+    assert response.status_code == 500
+    assert "cannot be decoded" in response.json()["detail"]
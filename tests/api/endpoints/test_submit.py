@@ -1,7 +1,13 @@
+import io
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
-from backend import schemas
+from backend import clients, schemas
+from backend.blobs import store_attachments
+from tests.fake_redis import FakeRedis
+from tests.test_attachments import make_attachment
 
 
 def test_submit_to_virustotal_without_api_key(
@@ -9,3 +15,53 @@ def test_submit_to_virustotal_without_api_key(
 ):
     response = client.post("/api/submit/virustotal", json=docx_attachment.model_dump())
     assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+class FakeVirusTotal:
+    def __init__(self):
+        self.files: list[tuple[str, bytes]] = []
+
+    async def scan_file_async(self, file: io.BytesIO):
+        self.files.append((file.name, file.getvalue()))
+
+    async def close_async(self):
+        pass
+
+
+@pytest.fixture
+def vt(client: TestClient, monkeypatch: pytest.MonkeyPatch) -> FakeVirusTotal:
+    vt = FakeVirusTotal()
+    monkeypatch.setattr(client.app.state, "clients", clients.SharedClients(vt=vt))  # type: ignore
+    return vt
+
+
+async def test_submit_to_virustotal_by_hash(
+    redis_client: TestClient, redis: FakeRedis, vt: FakeVirusTotal
+):
+    attachment = make_attachment(b"foo")
+    # the raw content is stripped as the attachment is stored as a blob
+    await store_attachments(redis, [attachment])  # type: ignore
+    assert attachment.raw is None
+
+    response = redis_client.post(
+        "/api/submit/virustotal", json=attachment.model_dump(by_alias=True)
+    )
+    assert response.status_code == status.HTTP_200_OK
+    sha256 = attachment.hash.sha256
+    assert response.json()["referenceUrl"] == (
+        f"https://www.virustotal.com/gui/file/{sha256}/detection"
+    )
+    assert vt.files == [(attachment.filename, b"foo")]
+
+
+async def test_submit_to_virustotal_by_unknown_hash(
+    redis_client: TestClient, vt: FakeVirusTotal
+):
+    attachment = make_attachment(b"foo")
+    attachment.raw = None
+
+    response = redis_client.post(
+        "/api/submit/virustotal", json=attachment.model_dump(by_alias=True)
+    )
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert vt.files == []
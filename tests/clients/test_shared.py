@@ -0,0 +1,96 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.datastructures import Secret
+
+from backend import clients, settings
+from backend.clients import shared as shared_module
+from backend.clients.shared import SharedClients, create_shared_clients
+from backend.main import create_app
+
+API_KEYS = (
+    "VIRUSTOTAL_API_KEY",
+    "URLSCAN_API_KEY",
+    "EMAIL_REP_API_KEY",
+    "IPQUALITYSCORE_API_KEY",
+)
+
+
+@pytest.fixture
+def api_keys(monkeypatch: pytest.MonkeyPatch):
+    for name in API_KEYS:
+        monkeypatch.setattr(settings, name, Secret("foo"))
+
+
+@pytest.fixture
+def vt_closed(monkeypatch: pytest.MonkeyPatch) -> list[clients.VirusTotal]:
+    closed: list[clients.VirusTotal] = []
+    close_async = clients.VirusTotal.close_async
+
+    async def record_close_async(self: clients.VirusTotal):
+        closed.append(self)
+        await close_async(self)
+
+    monkeypatch.setattr(clients.VirusTotal, "close_async", record_close_async)
+    return closed
+
+
+async def test_create_shared_clients_without_api_keys(monkeypatch: pytest.MonkeyPatch):
+    for name in API_KEYS:
+        monkeypatch.setattr(settings, name, None)
+
+    shared = create_shared_clients()
+    assert shared == SharedClients()
+    await shared.aclose()
+
+
+@pytest.mark.usefixtures("api_keys")
+async def test_create_shared_clients(vt_closed: list[clients.VirusTotal]):
+    shared = create_shared_clients()
+    assert shared.vt is not None
+    assert shared.urlscan is not None
+    assert shared.email_rep is not None
+    assert shared.ipqs is not None
+
+    assert shared.urlscan.timeout.read == settings.HTTP_TIMEOUT
+
+    await shared.aclose()
+    assert vt_closed == [shared.vt]
+    assert shared.urlscan.is_closed
+    assert shared.email_rep.is_closed
+    assert shared.ipqs.is_closed
+
+
+def test_get_httpx_options():
+    options = shared_module.get_httpx_options()
+    assert options["http2"] is False
+    assert options["timeout"].read == settings.HTTP_TIMEOUT
+
+
+@pytest.mark.usefixtures("api_keys")
+def test_shared_clients_lifespan(
+    monkeypatch: pytest.MonkeyPatch, vt_closed: list[clients.VirusTotal]
+):
+    created: list[SharedClients] = []
+
+    def record_create_shared_clients() -> SharedClients:
+        created.append(create_shared_clients())
+        return created[-1]
+
+    monkeypatch.setattr(
+        shared_module, "create_shared_clients", record_create_shared_clients
+    )
+
+    app = create_app()
+    with TestClient(app) as client:
+        assert created == [app.state.clients]
+        for _ in range(2):
+            client.get("/api/cache/stats")
+
+        # requests share the clients created on startup
+        assert len(created) == 1
+        shared: SharedClients = app.state.clients
+
+    assert vt_closed == [shared.vt]
+    for http_client in (shared.urlscan, shared.email_rep, shared.ipqs):
+        assert http_client is not None
+        assert http_client.is_closed
@@ -9,6 +9,7 @@ from syncer import sync
 
 from backend import clients, factories, schemas
 from backend.main import create_app
+from tests.fake_redis import FakeRedis
 
 
 @pytest.fixture(scope="session")
@@ -136,6 +137,21 @@ def docx_attachment(encrypted_docx_eml: bytes) -> schemas.Attachment:
 
 
 @pytest.fixture
-def client() -> TestClient:
+def client():
     app = create_app()
-    return TestClient(app)
+    # run the lifespan handler (which sets up the shared API clients)
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def redis() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture
+def redis_client(client: TestClient, redis: FakeRedis):
+    # the app is served with the fake Redis (after the lifespan handler set it up)
+    client.app.state.redis = redis  # type: ignore
+    yield client
+    client.app.state.redis = None  # type: ignore
@@ -1,9 +1,12 @@
+import datetime
 from pathlib import Path
 
 import pytest
+from eml_parser import EmlParser
 
 from backend import factories
-from backend.factories.eml import is_inline_forward_attachment
+from backend.budget import ParseBudget
+from backend.factories.eml import is_inline_forward_attachment, parse_datetime
 
 
 @pytest.fixture()
@@ -21,6 +24,17 @@ def test_sample(sample_eml: bytes, factory: factories.EmlFactory):
     assert len(eml.bodies) == 2
 
 
+def test_without_repair_multipart(
+    monkeypatch: pytest.MonkeyPatch,
+    multipart_eml: bytes,
+    factory: factories.EmlFactory,
+):
+    # older eml_parser versions (e.g. 2.0.0) do not repair multipart parts
+    monkeypatch.delattr(EmlParser, "repair_multipart", raising=False)
+    eml = factory.call(multipart_eml)
+    assert len(eml.bodies) > 0
+
+
 def test_cc(cc_eml: bytes, factory: factories.EmlFactory):
     eml = factory.call(cc_eml)
     assert eml.header.message_id == "<ecc38b11-aa06-44c9-b8de-283b06a1d89e@example.com>"
@@ -106,6 +120,35 @@ def test_is_inline_forward_attachment(attachment: dict, expected: bool):
     assert is_inline_forward_attachment(attachment) is expected
 
 
+@pytest.mark.parametrize(
+    "dt,expected",
+    [
+        (
+            "Tue, 1 Jan 2019 10:00:00 +0100",
+            datetime.datetime(
+                2019, 1, 1, 10, tzinfo=datetime.timezone(datetime.timedelta(hours=1))
+            ),
+        ),
+        # comments are ignored
+        (
+            "Tue, 1 Jan 2019 10:00:00 +0000 (UTC)",
+            datetime.datetime(2019, 1, 1, 10, tzinfo=datetime.UTC),
+        ),
+        # "-0000" (unknown time zone) falls back to dateparser (as UTC)
+        (
+            "Tue, 1 Jan 2019 10:00:00 -0000",
+            datetime.datetime(2019, 1, 1, 10, tzinfo=datetime.UTC),
+        ),
+        # non RFC 5322 dates fall back to dateparser
+        ("2019-01-01 10:00:00", datetime.datetime(2019, 1, 1, 10)),
+        ("foo", "foo"),
+        (None, None),
+    ],
+)
+def test_parse_datetime(dt: str | None, expected: datetime.datetime | str | None):
+    assert parse_datetime(dt) == expected
+
+
 @pytest.fixture
 def invalid_datetime_eml() -> bytes:
     with open("tests/fixtures/invalid_datetime.eml", "rb") as f:
@@ -118,3 +161,43 @@ def test_invalid_datetime(factory: factories.EmlFactory, invalid_datetime_eml: b
     # delay should be None because the base datetime (= header.received[0].date) is invalid
     for r in eml.header.received:
         assert r.delay is None
+
+
+def test_without_exceeded_limits(sample_eml: bytes, factory: factories.EmlFactory):
+    eml = factory.call(sample_eml)
+    assert eml.exceeded_limits == []
+
+
+def test_max_mime_parts(multipart_eml: bytes, factory: factories.EmlFactory):
+    eml = factory.call(multipart_eml, ParseBudget(max_mime_parts=1))
+    assert eml.attachments == []
+    assert eml.exceeded_limits == ["mime_parts"]
+
+
+def test_max_attachment_bytes(multipart_eml: bytes, factory: factories.EmlFactory):
+    eml = factory.call(multipart_eml, ParseBudget(max_attachment_bytes=1))
+    assert eml.attachments == []
+    assert eml.exceeded_limits == ["attachment_bytes"]
+
+
+def test_max_body_scan_size(sample_eml: bytes, factory: factories.EmlFactory):
+    eml = factory.call(sample_eml, ParseBudget(max_body_scan_size=0))
+    assert len(eml.bodies) == 2
+    assert all(body.urls == [] for body in eml.bodies)
+    assert eml.exceeded_limits == ["body_scan_size"]
+
+
+def test_stage_timeout(sample_eml: bytes, factory: factories.EmlFactory):
+    eml = factory.call(sample_eml, ParseBudget(stage_timeout=-1))
+    assert len(eml.bodies) == 2
+    assert all(body.urls == [] for body in eml.bodies)
+    assert eml.exceeded_limits == ["parse_time", "bodies_time"]
+
+
+def test_max_ioc_size(factory: factories.EmlFactory):
+    url = "https://example.com/" + "a" * 5000
+    eml = factory.call(
+        b"Subject: foo\r\nContent-Type: text/plain\r\n\r\n" + url.encode() + b"\r\n"
+    )
+    assert len(eml.bodies) == 1
+    assert eml.exceeded_limits == ["ioc_size"]
@@ -1,6 +1,16 @@
+import asyncio
+import base64
+import hashlib
+import io
+import time
+import zipfile
+
 import pytest
 
 from backend import factories, schemas
+from backend.attachments import AttachmentStore
+from backend.factories import oldid
+from backend.schemas.eml import Hash
 
 
 @pytest.fixture
@@ -13,15 +23,161 @@ def get_attachments(eml_file: bytes) -> list[schemas.Attachment]:
     return eml.attachments
 
 
-def test_encrypted_docx(
+def to_attachment(content: bytes, filename: str) -> schemas.Attachment:
+    return schemas.Attachment(
+        raw=base64.b64encode(content).decode(),
+        filename=filename,
+        size=len(content),
+        hash=Hash(
+            md5="", sha1="", sha256=hashlib.sha256(content).hexdigest(), sha512=""
+        ),
+        mime_type="application/octet-stream",
+        mime_type_short="bin",
+        content_header={},
+    )
+
+
+@pytest.fixture
+def docx_with_external_template() -> bytes:
+    rels = "http://schemas.openxmlformats.org/package/2006/relationships"
+    office = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as f:
+        f.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            "</Types>",
+        )
+        f.writestr(
+            "_rels/.rels",
+            f'<?xml version="1.0"?><Relationships xmlns="{rels}">'
+            f'<Relationship Id="rId1" Type="{office}/officeDocument" Target="word/document.xml"/>'
+            "</Relationships>",
+        )
+        f.writestr("word/document.xml", "<w:document/>")
+        f.writestr(
+            "word/_rels/document.xml.rels",
+            f'<?xml version="1.0"?><Relationships xmlns="{rels}">'
+            f'<Relationship Id="rId9" Type="{office}/attachedTemplate" Target="http://example.com/t.dotm" TargetMode="External"/>'
+            "</Relationships>",
+        )
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_encrypted_docx(
     encrypted_docx_eml: bytes, factory: factories.OleIDVerdictFactory
 ):
-    verdict = factory.call(get_attachments(encrypted_docx_eml))
+    verdict = await factory.call(get_attachments(encrypted_docx_eml))
     assert verdict.malicious is True
     assert len(verdict.details) == 1
 
 
-def test_sample(sample_eml: bytes, factory: factories.OleIDVerdictFactory):
-    verdict = factory.call(get_attachments(sample_eml))
+@pytest.mark.asyncio
+async def test_sample(sample_eml: bytes, factory: factories.OleIDVerdictFactory):
+    verdict = await factory.call(get_attachments(sample_eml))
     assert verdict.malicious is False
     assert len(verdict.details) == 1
+
+
+@pytest.mark.asyncio
+async def test_ooxml(
+    docx_with_external_template: bytes, factory: factories.OleIDVerdictFactory
+):
+    verdict = await factory.call(
+        [to_attachment(docx_with_external_template, "template.docx")]
+    )
+    assert verdict.malicious is True
+    assert [detail.key for detail in verdict.details] == ["ext_rels"]
+
+
+@pytest.mark.asyncio
+async def test_prefiltering(factory: factories.OleIDVerdictFactory):
+    attachments = [
+        to_attachment(b"%PDF-1.7\n" + b"\x00" * 1024, "foo.pdf"),
+        to_attachment(b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024, "foo.png"),
+    ]
+    store = AttachmentStore()
+    verdict = await factory.call(attachments, store=store)
+    assert verdict.malicious is False
+    # neither of them is decoded
+    assert store.memory_size == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_and_timeout(
+    monkeypatch: pytest.MonkeyPatch, encrypted_docx_eml: bytes
+):
+    def slow_data_to_details(data, file_info):
+        time.sleep(0.5)
+        return []
+
+    monkeypatch.setattr(oldid, "data_to_details", slow_data_to_details)
+    attachments = get_attachments(encrypted_docx_eml) * 4
+
+    # the attachments are checked at once, and the ones timed out are flagged
+    started = asyncio.get_running_loop().time()
+    verdict = await factories.OleIDVerdictFactory(timeout=0.1).call(attachments)
+    assert asyncio.get_running_loop().time() - started < 0.4
+    # but not as malicious (nor as benign)
+    assert verdict.malicious is False
+    assert [detail.key for detail in verdict.details] == ["timeout"] * 4
+    assert verdict.error is not None
+
+
+@pytest.mark.asyncio
+async def test_error(monkeypatch: pytest.MonkeyPatch, encrypted_docx_eml: bytes):
+    def broken_data_to_details(data, file_info):
+        raise ValueError("foo")
+
+    monkeypatch.setattr(oldid, "data_to_details", broken_data_to_details)
+    verdict = await factories.OleIDVerdictFactory().call(
+        get_attachments(encrypted_docx_eml)
+    )
+    assert verdict.malicious is False
+    assert [detail.key for detail in verdict.details] == ["error"]
+    assert verdict.details[0].description.endswith("could not be checked: foo")
+    assert verdict.error is not None
+
+
+@pytest.mark.asyncio
+async def test_error_with_findings(
+    monkeypatch: pytest.MonkeyPatch,
+    encrypted_docx_eml: bytes,
+    docx_with_external_template: bytes,
+):
+    data_to_details = oldid.data_to_details
+
+    def broken_data_to_details(data, file_info):
+        if file_info.startswith("template.docx"):
+            return data_to_details(data, file_info)
+
+        raise ValueError("foo")
+
+    monkeypatch.setattr(oldid, "data_to_details", broken_data_to_details)
+    verdict = await factories.OleIDVerdictFactory().call(
+        [
+            *get_attachments(encrypted_docx_eml),
+            to_attachment(docx_with_external_template, "template.docx"),
+        ]
+    )
+    assert verdict.malicious is True
+    assert [detail.key for detail in verdict.details] == ["ext_rels", "error"]
+
+
+@pytest.mark.asyncio
+async def test_zip_which_is_not_ooxml(factory: factories.OleIDVerdictFactory):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as f:
+        f.writestr("foo.txt", "foo")
+
+    attachments = [
+        to_attachment(buffer.getvalue(), "foo.zip"),
+        # a zip signature without a zip file
+        to_attachment(b"PK\x03\x04" + b"\x00" * 1024, "foo.docx"),
+    ]
+    verdict = await factory.call(attachments)
+    assert verdict.malicious is False
+    assert [detail.key for detail in verdict.details] == ["benign"]
+    assert verdict.error is None
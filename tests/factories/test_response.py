@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+from email.message import EmailMessage
+from functools import partial
+
+import pytest
+
+from backend import schemas
+from backend.budget import ATTACHED_BYTES, ATTACHED_DEPTH
+from backend.factories import response as response_factory
+from backend.factories.response import (
+    TIMED_OUT,
+    complete_late_verdicts,
+    parse,
+    parse_async,
+    run_verdict,
+)
+
+
+async def get_verdict(name: str, delay: float) -> schemas.Verdict:
+    await asyncio.sleep(delay)
+    return schemas.Verdict(name=name, malicious=False)
+
+
+@pytest.mark.asyncio
+async def test_parse_async_inline(sample_eml: bytes):
+    got = await parse_async(sample_eml, executor="inline")
+    assert got == parse(sample_eml)
+
+
+@pytest.mark.asyncio
+async def test_parse_async_with_id(monkeypatch: pytest.MonkeyPatch, sample_eml: bytes):
+    def get_id(eml_file):
+        raise AssertionError("The email is hashed again")
+
+    # e.g. a view of a spooled email, which is hashed as it is received
+    id = hashlib.sha256(sample_eml).hexdigest()
+    monkeypatch.setattr(response_factory, "get_id", get_id)
+    got = await parse_async(
+        memoryview(sample_eml), executor="inline", max_attached_depth=0, id=id
+    )
+    assert got.id == id
+
+
+@pytest.mark.asyncio
+async def test_parse_async_process(sample_eml: bytes):
+    got = await parse_async(sample_eml, executor="process", parse_timeout=60)
+    assert got == parse(sample_eml)
+
+
+def forward(message: EmailMessage, url: str) -> EmailMessage:
+    forwarded = EmailMessage()
+    forwarded["From"] = "user@example.com"
+    forwarded["To"] = "soc@example.com"
+    forwarded["Subject"] = f"Fwd: {message['Subject']}"
+    forwarded.set_content(f"See the attached email {url}")
+    forwarded.add_attachment(message, filename="forwarded.eml")
+    return forwarded
+
+
+@pytest.fixture
+def forwarded_eml() -> bytes:
+    phishing = EmailMessage()
+    phishing["From"] = "it@examp1e.com"
+    phishing["To"] = "user@example.com"
+    phishing["Subject"] = "Reset your password"
+    phishing.set_content("Reset it at https://examp1e.com/reset")
+    # forwarded to the SOC by the user, then escalated by the SOC
+    return forward(
+        forward(phishing, "https://soc.example.com/1"), "https://soc.example.com/2"
+    ).as_bytes()
+
+
+@pytest.mark.asyncio
+async def test_parse_async_with_attached_messages(forwarded_eml: bytes):
+    got = await parse_async(forwarded_eml, executor="inline")
+
+    assert len(got.children) == 1
+    child = got.children[0]
+    assert child.parent_id == got.id
+    assert child.eml.header.subject == "Fwd: Reset your password"
+
+    assert len(child.children) == 1
+    grandchild = child.children[0]
+    assert grandchild.parent_id == child.id
+    assert grandchild.eml.header.from_ == "it@examp1e.com"
+
+    assert got.urls == {
+        "https://examp1e.com/reset",
+        "https://soc.example.com/1",
+        "https://soc.example.com/2",
+    }
+
+
+@pytest.mark.asyncio
+async def test_parse_async_with_attached_limits(forwarded_eml: bytes):
+    got = await parse_async(forwarded_eml, executor="inline", max_attached_depth=1)
+    assert len(got.children) == 1
+    assert got.children[0].children == []
+    assert got.children[0].eml.exceeded_limits == [ATTACHED_DEPTH]
+
+    got = await parse_async(forwarded_eml, executor="inline", max_attached_bytes=1)
+    assert got.children == []
+    assert got.eml.exceeded_limits == [ATTACHED_BYTES]
+
+    got = await parse_async(forwarded_eml, executor="inline", max_attached_depth=0)
+    assert got.children == []
+    assert got.eml.exceeded_limits == []
+
+
+@pytest.mark.asyncio
+async def test_run_verdict():
+    got = await run_verdict("foo", partial(get_verdict, "foo", 0), verdict_timeout=1)
+    assert got == schemas.Verdict(name="foo", malicious=False)
+
+
+@pytest.mark.asyncio
+async def test_run_verdict_with_timeout():
+    got = await run_verdict(
+        "foo", partial(get_verdict, "foo", 10), verdict_timeout=0.01
+    )
+    assert got == schemas.Verdict(name="foo", malicious=False, error=TIMED_OUT)
+
+
+@pytest.mark.asyncio
+async def test_run_verdict_with_deadline():
+    deadline = asyncio.get_running_loop().time() + 0.01
+    got = await run_verdict(
+        "foo", partial(get_verdict, "foo", 10), verdict_timeout=None, deadline=deadline
+    )
+    assert got is not None
+    assert got.error == TIMED_OUT
+
+
+@pytest.mark.asyncio
+async def test_complete_late_verdicts(sample_eml: bytes):
+    late: dict[str, asyncio.Future] = {}
+    verdicts = [
+        await run_verdict(
+            "foo", partial(get_verdict, "foo", 0.05), verdict_timeout=0.01, late=late
+        ),
+        await run_verdict("bar", partial(get_verdict, "bar", 0), verdict_timeout=1),
+    ]
+    assert list(late) == ["foo"]
+
+    response = parse(sample_eml)
+    response.verdicts = [verdict for verdict in verdicts if verdict]
+
+    completed: list[schemas.Response] = []
+
+    async def callback(got: schemas.Response):
+        completed.append(got)
+
+    await complete_late_verdicts(response, late, callback)
+    assert len(completed) == 1
+    assert completed[0].verdicts == [
+        schemas.Verdict(name="foo", malicious=False),
+        schemas.Verdict(name="bar", malicious=False),
+    ]
+    # the original response is left as it is
+    assert response.verdicts[0].error == TIMED_OUT
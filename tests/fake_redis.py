@@ -0,0 +1,312 @@
+import asyncio
+import fnmatch
+from collections import defaultdict
+from typing import Any
+
+from redis.exceptions import WatchError
+
+
+def _encode(value: Any) -> bytes:
+    if isinstance(value, bytes | bytearray | memoryview):
+        return bytes(value)
+
+    return str(value).encode()
+
+
+def _parse_bound(bound: float | str) -> tuple[float, bool]:
+    """Parse a score bound of a sorted set command into its score and exclusiveness."""
+    if isinstance(bound, str) and bound.startswith("("):
+        return float(bound[1:]), True
+
+    return float(bound), False
+
+
+def _in_range(score: float, min_: float | str, max_: float | str) -> bool:
+    low, low_exclusive = _parse_bound(min_)
+    high, high_exclusive = _parse_bound(max_)
+    above = score > low if low_exclusive else score >= low
+    below = score < high if high_exclusive else score <= high
+    return above and below
+
+
+class FakePipeline:
+    """A pipeline of FakeRedis: commands run at once while watching, else on execute."""
+
+    def __init__(self, redis: "FakeRedis"):
+        self.redis = redis
+        self.reset()
+
+    def reset(self):
+        self.watched: dict[str, int] = {}
+        self.queued: list[tuple[Any, tuple, dict]] = []
+        self.buffering = True
+
+    async def __aenter__(self) -> "FakePipeline":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.reset()
+
+    async def watch(self, *keys: str):
+        self.watched = {key: self.redis.versions[key] for key in keys}
+        self.buffering = False
+
+    def multi(self):
+        self.buffering = True
+
+    def __getattr__(self, name: str):
+        command = getattr(self.redis, name)
+        if not self.buffering:
+            return command
+
+        def queue(*args, **kwargs):
+            self.queued.append((command, args, kwargs))
+            return self
+
+        return queue
+
+    async def execute(self) -> list:
+        changed = any(
+            self.redis.versions[key] != version for key, version in self.watched.items()
+        )
+        try:
+            if changed:
+                raise WatchError("Watched variable changed.")
+
+            return [
+                await command(*args, **kwargs) for command, args, kwargs in self.queued
+            ]
+        finally:
+            self.reset()
+
+
+class FakeRedis:
+    """The subset of Redis the app uses (strings, hashes, lists, sets, sorted sets and optimistic transactions)."""
+
+    def __init__(self):
+        self.data: dict[str, Any] = {}
+        self.versions: defaultdict[str, int] = defaultdict(int)
+        # recorded but never applied
+        self.expirations: dict[str, int] = {}
+
+    def _touch(self, key: str):
+        self.versions[key] += 1
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def exists(self, *keys: str) -> int:
+        return sum(key in self.data for key in keys)
+
+    async def delete(self, *keys: str) -> int:
+        deleted = [key for key in keys if self.data.pop(key, None) is not None]
+        for key in deleted:
+            self._touch(key)
+        return len(deleted)
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        if key not in self.data:
+            return False
+
+        self.expirations[key] = seconds
+        return True
+
+    async def ttl(self, key: str) -> int:
+        if key not in self.data:
+            return -2
+
+        return self.expirations.get(key, -1)
+
+    async def scan_iter(self, match: str = "*", count: int | None = None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield _encode(key)
+
+    async def get(self, key: str) -> bytes | None:
+        return self.data.get(key)
+
+    async def set(
+        self, key: str, value: Any, ex: int | None = None, px: int | None = None
+    ) -> bool:
+        self.data[key] = _encode(value)
+        if ex is not None:
+            self.expirations[key] = ex
+        if px is not None:
+            self.expirations[key] = px // 1000
+        self._touch(key)
+        return True
+
+    async def strlen(self, key: str) -> int:
+        return len(self.data.get(key, b""))
+
+    async def getrange(self, key: str, start: int, end: int) -> bytes:
+        return self.data.get(key, b"")[start : end + 1]
+
+    async def hset(self, key: str, field=None, value=None, mapping=None) -> int:
+        hash_ = self.data.setdefault(key, {})
+        items = {**(mapping or {}), **({field: value} if field is not None else {})}
+        hash_.update({field: _encode(value) for field, value in items.items()})
+        self._touch(key)
+        return len(items)
+
+    async def hget(self, key: str, field: str) -> bytes | None:
+        return self.data.get(key, {}).get(field)
+
+    async def hmget(self, key: str, fields: list[str]) -> list[bytes | None]:
+        hash_ = self.data.get(key, {})
+        return [hash_.get(field) for field in fields]
+
+    async def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        hash_ = self.data.setdefault(key, {})
+        value = int(hash_.get(field, b"0")) + amount
+        hash_[field] = _encode(value)
+        self._touch(key)
+        return value
+
+    async def hdel(self, key: str, *fields: str) -> int:
+        hash_ = self.data.get(key, {})
+        deleted = [field for field in fields if hash_.pop(field, None) is not None]
+        self._touch(key)
+        return len(deleted)
+
+    async def llen(self, key: str) -> int:
+        return len(self.data.get(key, []))
+
+    async def lpush(self, key: str, *values: str) -> int:
+        list_ = self.data.setdefault(key, [])
+        for value in values:
+            list_.insert(0, _encode(value))
+        self._touch(key)
+        return len(list_)
+
+    async def rpush(self, key: str, *values: str) -> int:
+        list_ = self.data.setdefault(key, [])
+        list_.extend(_encode(value) for value in values)
+        self._touch(key)
+        return len(list_)
+
+    async def lrange(self, key: str, start: int, end: int) -> list[bytes]:
+        list_ = self.data.get(key, [])
+        return list_[start : None if end == -1 else end + 1]
+
+    async def lrem(self, key: str, count: int, value: str) -> int:
+        list_ = self.data.get(key, [])
+        if _encode(value) not in list_:
+            return 0
+
+        # only the first occurrence (count=1), as the app removes a job once
+        list_.remove(_encode(value))
+        if len(list_) == 0:
+            del self.data[key]
+        self._touch(key)
+        return 1
+
+    async def blmove(
+        self,
+        first_list: str,
+        second_list: str,
+        timeout: float,  # noqa: ASYNC109 (the signature of Redis.blmove)
+        src: str = "LEFT",
+        dest: str = "RIGHT",
+    ) -> bytes | None:
+        source = self.data.get(first_list)
+        if not source:
+            # blocks until the timeout, as nothing else can push meanwhile
+            await asyncio.sleep(timeout)
+            return None
+
+        value = source.pop(0 if src == "LEFT" else -1)
+        if len(source) == 0:
+            del self.data[first_list]
+        destination = self.data.setdefault(second_list, [])
+        destination.insert(0 if dest == "LEFT" else len(destination), value)
+        self._touch(first_list)
+        self._touch(second_list)
+        return value
+
+    async def brpop(
+        self,
+        keys: list[str],
+        timeout: float,  # noqa: ASYNC109 (the signature of Redis.brpop)
+    ) -> tuple[bytes, bytes] | None:
+        for key in keys:
+            if self.data.get(key):
+                self._touch(key)
+                return key.encode(), self.data[key].pop()
+        return None
+
+    async def sadd(self, key: str, *members: str) -> int:
+        set_ = self.data.setdefault(key, set())
+        added = {_encode(member) for member in members} - set_
+        set_.update(added)
+        self._touch(key)
+        return len(added)
+
+    async def srem(self, key: str, *members: str) -> int:
+        set_ = self.data.get(key, set())
+        removed = {_encode(member) for member in members} & set_
+        set_.difference_update(removed)
+        if len(set_) == 0:
+            self.data.pop(key, None)
+        self._touch(key)
+        return len(removed)
+
+    async def smembers(self, key: str) -> "set[bytes]":  # (set is shadowed here)
+        return set(self.data.get(key, set()))
+
+    async def zadd(self, key: str, mapping: dict[str, float], nx: bool = False) -> int:
+        zset = self.data.setdefault(key, {})
+        added = 0
+        for member, score in mapping.items():
+            if member not in zset:
+                added += 1
+            elif nx:
+                continue
+
+            zset[member] = float(score)
+        self._touch(key)
+        return added
+
+    async def zremrangebyscore(
+        self, key: str, min: float | str, max: float | str
+    ) -> int:
+        zset = self.data.get(key, {})
+        removed = [
+            member for member, score in zset.items() if _in_range(score, min, max)
+        ]
+        for member in removed:
+            del zset[member]
+        self._touch(key)
+        return len(removed)
+
+    async def zrange(
+        self,
+        key: str,
+        start: float | str,
+        end: float | str,
+        desc: bool = False,
+        withscores: bool = False,
+        byscore: bool = False,
+        offset: int | None = None,
+        num: int | None = None,
+    ) -> list:
+        if not byscore:
+            raise NotImplementedError("FakeRedis only supports zrange by score")
+
+        # the bounds are given as max, min with desc (as ZRANGE ... BYSCORE REV)
+        min_, max_ = (end, start) if desc else (start, end)
+        members = sorted(
+            (
+                (score, member)
+                for member, score in self.data.get(key, {}).items()
+                if _in_range(score, min_, max_)
+            ),
+            reverse=desc,
+        )
+        page = members[offset or 0 :]
+        if num is not None and num >= 0:
+            page = page[:num]
+        if withscores:
+            return [(_encode(member), score) for score, member in page]
+
+        return [_encode(member) for _, member in page]
@@ -0,0 +1,85 @@
+import io
+import struct
+import zipfile
+
+import pytest
+
+from backend.archives import iter_mbox, iter_messages, iter_zip
+
+MBOX = b"""From alice@example.com Mon Jan  1 00:00:00 2024
+Subject: first
+
+Hello
+>From the escaped line
+
+From bob@example.com Mon Jan  1 00:00:00 2024
+Subject: second
+
+World
+"""
+
+
+def test_iter_mbox():
+    messages = list(iter_mbox(io.BytesIO(MBOX), "inbox.mbox"))
+    assert messages == [
+        ("inbox.mbox/1", b"Subject: first\n\nHello\nFrom the escaped line\n"),
+        ("inbox.mbox/2", b"Subject: second\n\nWorld\n"),
+    ]
+
+
+def test_iter_messages_with_zip():
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as f:
+        f.writestr("folder/", b"")
+        f.writestr("folder/a.eml", b"Subject: a\n")
+        f.writestr("b.msg", b"msg")
+
+    messages = list(iter_messages(archive, "emails.zip"))
+    assert messages == [
+        ("emails.zip/folder/a.eml", b"Subject: a\n"),
+        ("emails.zip/b.msg", b"msg"),
+    ]
+
+
+def test_iter_messages_with_mbox():
+    assert len(list(iter_messages(io.BytesIO(MBOX)))) == 2
+
+
+def test_iter_messages_with_email():
+    assert list(iter_messages(io.BytesIO(b"Subject: a\n"), "a.eml")) == [
+        ("a.eml", b"Subject: a\n")
+    ]
+
+
+def test_iter_messages_with_broken_zip():
+    # left to the validation of the file
+    assert list(iter_messages(io.BytesIO(b"PK\x03\x04broken"), "a.zip")) == [
+        ("a.zip", b"PK\x03\x04broken")
+    ]
+
+
+def make_zip(members: dict[str, bytes]) -> io.BytesIO:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_DEFLATED) as f:
+        for name, content in members.items():
+            f.writestr(name, content)
+    return archive
+
+
+def test_iter_zip_with_large_member():
+    archive = make_zip({"a.eml": b"Subject: a\n", "bomb.eml": b"\x00" * 1_000_000})
+    assert list(iter_zip(archive, "emails.zip", max_member_size=1024)) == [
+        ("emails.zip/a.eml", b"Subject: a\n")
+    ]
+
+
+@pytest.mark.parametrize("max_member_size", [1024, None])
+def test_iter_zip_with_lying_member(max_member_size: int | None):
+    archive = make_zip({"bomb.eml": b"\x00" * 1_000_000, "a.eml": b"Subject: a\n"})
+    # claim a size of 16 bytes in the central directory entry of the bomb
+    data = bytearray(archive.getvalue())
+    offset = data.index(b"PK\x01\x02") + 24
+    data[offset : offset + 4] = struct.pack("<I", 16)
+
+    members = list(iter_zip(io.BytesIO(data), max_member_size=max_member_size))
+    assert members == [("a.eml", b"Subject: a\n")]
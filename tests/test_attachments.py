@@ -0,0 +1,78 @@
+import base64
+import copy
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend import schemas
+from backend.attachments import AttachmentStore
+from backend.factories.response import parse
+from backend.schemas.eml import Hash
+
+
+def make_attachment(content: bytes) -> schemas.Attachment:
+    return schemas.Attachment(
+        raw=base64.b64encode(content).decode(),
+        filename="foo.bin",
+        size=len(content),
+        hash=Hash(
+            md5="", sha1="", sha256=hashlib.sha256(content).hexdigest(), sha512=""
+        ),
+        mime_type="application/octet-stream",
+        mime_type_short="bin",
+        content_header={},
+    )
+
+
+@pytest.mark.parametrize("max_memory_size", [1024 * 1024, 0])
+def test_attachment_store(max_memory_size: int):
+    # larger than a decoded chunk
+    content = os.urandom(100 * 1024)
+    attachment = make_attachment(content)
+    store = AttachmentStore(max_memory_size=max_memory_size)
+
+    view = store.get(attachment)
+    assert view is not None
+    assert view.readonly
+    assert bytes(view) == content
+    assert store.memory_size == (len(content) if max_memory_size > 0 else 0)
+
+    # decoded once, even once the raw content is stripped
+    attachment.raw = None
+    assert store.get(attachment) is view
+    # shared by the copies of a response
+    assert copy.deepcopy(store) is store
+
+
+def test_attachment_store_concurrently():
+    attachments = [make_attachment(os.urandom(100 * 1024)) for _ in range(4)]
+    # room for two of them in memory
+    store = AttachmentStore(max_memory_size=250 * 1024)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        views = list(executor.map(store.get, attachments * 8))
+
+    # each attachment is decoded once, and the memory bound holds
+    for i, attachment in enumerate(attachments):
+        assert all(view is views[i] for view in views[i :: len(attachments)])
+        assert bytes(views[i] or b"") == base64.b64decode(attachment.raw or "")
+    assert store.memory_size == 200 * 1024
+
+
+def test_attachment_store_without_raw():
+    attachment = make_attachment(b"foo")
+    attachment.raw = None
+    assert AttachmentStore().get(attachment) is None
+
+
+def test_response_attachment_store(sample_eml: bytes):
+    response = parse(sample_eml)
+    attachment = response.attachments[0]
+    view = response.attachment_store.get(attachment)
+    assert view is not None
+    assert bytes(view) == base64.b64decode(attachment.raw or "")
+
+    copied = response.model_copy(deep=True)
+    assert copied.attachment_store is response.attachment_store
@@ -0,0 +1,31 @@
+import asyncio
+from collections.abc import AsyncIterator
+
+import pytest
+
+from backend.batch import map_unordered
+
+
+async def count(n: int) -> AsyncIterator[int]:
+    for i in range(n):
+        yield i
+
+
+@pytest.mark.asyncio
+async def test_map_unordered():
+    running = 0
+    max_running = 0
+
+    async def double(i: int) -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # the later items finish first
+        await asyncio.sleep(0.01 * (5 - i))
+        running -= 1
+        return i * 2
+
+    got = [i async for i in map_unordered(double, count(5), max_at_once=2)]
+    assert sorted(got) == [0, 2, 4, 6, 8]
+    assert got != [0, 2, 4, 6, 8]
+    assert max_running == 2
@@ -0,0 +1,74 @@
+import pytest
+
+from backend.attachments import AttachmentStore
+from backend.blobs import (
+    BlobExpiredError,
+    get_blob,
+    get_blob_key,
+    get_blob_size,
+    iter_blob,
+    store_attachments,
+)
+from tests.fake_redis import FakeRedis
+from tests.test_attachments import make_attachment
+
+
+async def test_store_attachments(redis: FakeRedis):
+    stored, new = make_attachment(b"foo"), make_attachment(b"bar")
+    # stored by another analysis
+    await redis.set(get_blob_key(stored.hash.sha256), b"foo")
+
+    await store_attachments(redis, [stored, new], store=AttachmentStore(), expire=60)  # type: ignore
+    assert stored.raw is None
+    assert new.raw is None
+    assert await get_blob(redis, new.hash.sha256) == b"bar"  # type: ignore
+    # the stored one only has its expiration extended
+    assert redis.expirations[get_blob_key(stored.hash.sha256)] == 60
+    assert redis.expirations[get_blob_key(new.hash.sha256)] == 60
+
+
+async def test_store_attachments_with_expired_blob(redis: FakeRedis):
+    attachment = make_attachment(b"foo")
+    await store_attachments(redis, [attachment], expire=60)  # type: ignore
+    # the blob expires, while the cached analysis still points at it
+    await redis.delete(get_blob_key(attachment.hash.sha256))
+
+    attachment = make_attachment(b"foo")
+    await store_attachments(redis, [attachment], expire=60)  # type: ignore
+    assert await get_blob(redis, attachment.hash.sha256) == b"foo"  # type: ignore
+
+
+async def test_iter_blob(redis: FakeRedis):
+    content = bytes(range(256)) * 10
+    attachment = make_attachment(content)
+    await store_attachments(redis, [attachment])  # type: ignore
+
+    sha256 = attachment.hash.sha256
+    size = await get_blob_size(redis, sha256)  # type: ignore
+    assert size == len(content)
+
+    chunks = [chunk async for chunk in iter_blob(redis, sha256, size, chunk_size=1000)]  # type: ignore
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 560]
+    assert b"".join(chunks) == content
+
+
+async def test_iter_blob_with_expired_blob(redis: FakeRedis):
+    content = bytes(range(256)) * 10
+    attachment = make_attachment(content)
+    await store_attachments(redis, [attachment])  # type: ignore
+
+    sha256 = attachment.hash.sha256
+    size = await get_blob_size(redis, sha256)  # type: ignore
+    assert size is not None
+
+    chunks = iter_blob(redis, sha256, size, chunk_size=1000)  # type: ignore
+    assert len(await anext(chunks)) == 1000
+    # the blob expires midway
+    await redis.delete(get_blob_key(sha256))
+    with pytest.raises(BlobExpiredError):
+        await anext(chunks)
+
+
+async def test_get_blob_size_with_unknown_blob(redis: FakeRedis):
+    assert await get_blob_size(redis, "foo") is None  # type: ignore
+    assert await get_blob(redis, "foo") is None  # type: ignore
@@ -0,0 +1,167 @@
+import datetime
+
+import pytest
+
+from backend import codec, settings
+from backend.cache import (
+    backfill_index,
+    create_redis,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    get_cache_status,
+    get_cached_response,
+    get_etag,
+    get_index_key,
+    get_key,
+    list_cached_ids,
+)
+from tests.fake_redis import FakeRedis
+
+NOW = datetime.datetime(2024, 1, 1, 12, 0, 0, tzinfo=datetime.UTC)
+
+
+def test_get_cache_status():
+    analyzed_at = NOW - datetime.timedelta(seconds=30)
+    got = get_cache_status(analyzed_at, stale_after=60, now=NOW)
+    assert got.hit is True
+    assert got.age == 30
+    assert got.stale is False
+
+
+def test_get_cache_status_with_stale_entry():
+    analyzed_at = NOW - datetime.timedelta(seconds=90)
+    got = get_cache_status(analyzed_at, stale_after=60, now=NOW)
+    assert got.age == 90
+    assert got.stale is True
+
+
+def test_get_cache_status_without_stale_after():
+    analyzed_at = NOW - datetime.timedelta(days=1)
+    assert get_cache_status(analyzed_at, stale_after=0, now=NOW).stale is False
+
+
+def test_get_cache_status_without_analyzed_at():
+    got = get_cache_status(None, now=NOW)
+    assert got.hit is True
+    assert got.age is None
+
+
+def test_create_redis():
+    redis = create_redis("redis://localhost:6379/0")
+    pool = redis.connection_pool
+    assert pool.max_connections == settings.REDIS_MAX_CONNECTIONS
+    assert pool.connection_kwargs["socket_timeout"] == settings.REDIS_SOCKET_TIMEOUT
+    assert (
+        pool.connection_kwargs["health_check_interval"]
+        == settings.REDIS_HEALTH_CHECK_INTERVAL
+    )
+
+
+def test_cursor():
+    score = NOW.timestamp()
+    assert decode_cursor(encode_cursor(score, "foo")) == (score, "foo")
+
+
+@pytest.mark.parametrize("cursor", ["foo", "1.0:", "foo:bar"])
+def test_decode_cursor_with_invalid_cursor(cursor: str):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_etag_matches():
+    etag = get_etag(b"foo")
+    assert etag != get_etag(b"bar")
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"foo", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(get_etag(b"bar"), etag)
+
+
+async def list_all_ids(redis: FakeRedis, **kwargs) -> list[list[str]]:
+    pages: list[list[str]] = []
+    cursor: str | None = None
+    while True:
+        ids, cursor = await list_cached_ids(redis, cursor=cursor, **kwargs)  # type: ignore
+        pages.append(ids)
+        if cursor is None:
+            return pages
+
+
+async def test_list_cached_ids(redis: FakeRedis):
+    score = NOW.timestamp()
+    await redis.zadd(
+        get_index_key(), {"a": score - 2, "b": score - 1, "c": score, "d": score + 1}
+    )
+
+    pages = await list_all_ids(redis, limit=3, expire=0)
+    assert pages == [["d", "c", "b"], ["a"]]
+
+
+async def test_list_cached_ids_with_tied_scores(redis: FakeRedis):
+    score = NOW.timestamp()
+    await redis.zadd(get_index_key(), dict.fromkeys("abcde", score))
+    await redis.zadd(get_index_key(), {"f": score + 1, "0": score - 1})
+
+    pages = await list_all_ids(redis, limit=2, expire=0)
+    assert pages == [["f", "e"], ["d", "c"], ["b", "a"], ["0"]]
+
+
+async def test_list_cached_ids_with_range(redis: FakeRedis):
+    score = NOW.timestamp()
+    await redis.zadd(get_index_key(), {"a": score - 60, "b": score, "c": score + 60})
+
+    ids, cursor = await list_cached_ids(
+        redis,  # type: ignore
+        since=NOW - datetime.timedelta(seconds=30),
+        until=NOW + datetime.timedelta(seconds=30),
+        expire=0,
+    )
+    assert (ids, cursor) == (["b"], None)
+
+
+async def test_list_cached_ids_without_expired_entries(redis: FakeRedis):
+    now = datetime.datetime.now(datetime.UTC).timestamp()
+    await redis.zadd(get_index_key(), {"old": now - 120, "new": now})
+
+    ids, _ = await list_cached_ids(redis, expire=60)  # type: ignore
+    assert ids == ["new"]
+
+
+async def test_backfill_index(redis: FakeRedis):
+    # cached before the index was introduced (one 10 minutes ago) and since then
+    await redis.set(get_key("old"), b"{}", ex=3000)
+    await redis.set(get_key("new"), b"{}", ex=3600)
+    await redis.zadd(get_index_key(), {"new": 1.0})
+    # not cached analyses
+    await redis.set("blob:foo", b"")
+    await redis.set(f"lock:{get_key('foo')}", b"")
+
+    assert await backfill_index(redis, expire=3600) == 1  # type: ignore
+    index = redis.data[get_index_key()]
+    assert set(index) == {"old", "new"}
+    assert index["new"] == 1.0
+
+    now = datetime.datetime.now(datetime.UTC).timestamp()
+    assert now - 610 < index["old"] < now - 590
+
+    ids, _ = await list_cached_ids(redis, expire=3600)  # type: ignore
+    assert ids == ["old"]
+
+    # indexed entries are left as they are
+    assert await backfill_index(redis, expire=3600) == 0  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "cached",
+    [
+        # e.g. written with another version of the schema
+        codec.encode(b'{"id": "foo", "eml": null}'),
+        # a legacy plain JSON entry
+        b'{"id": "foo"}',
+    ],
+)
+async def test_get_cached_response_with_invalid_entry(redis: FakeRedis, cached: bytes):
+    await redis.set(get_key("foo"), cached)
+    assert await get_cached_response(redis, "foo") is None  # type: ignore
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from backend import codec, settings
+
+DATA = json.dumps({"raw": "QUFBQUFB" * 1000}).encode()
+
+
+@pytest.mark.parametrize("name", [codec.JSON, codec.ZLIB])
+def test_encode_and_decode(name: str):
+    stored = codec.encode(DATA, codec=name)
+    assert stored.startswith(codec.MAGIC)
+    assert codec.decode(stored) == DATA
+
+
+def test_encode_with_zlib():
+    assert len(codec.encode(DATA, codec=codec.ZLIB)) < len(DATA) / 10
+
+
+def test_decode_with_legacy_entry():
+    assert codec.is_legacy(DATA)
+    assert codec.decode(DATA) == DATA
+
+
+@pytest.mark.parametrize(
+    "stored",
+    [
+        codec.MAGIC,
+        codec.MAGIC + bytes([99, 0]),
+        codec.MAGIC + bytes([codec.VERSION, 99]),
+        codec.MAGIC + bytes([codec.VERSION, codec.CODEC_IDS[codec.ZLIB]]) + b"foo",
+    ],
+)
+def test_decode_with_invalid_value(stored: bytes):
+    with pytest.raises(codec.CodecError):
+        codec.decode(stored)
+
+
+def test_decode_with_corrupted_zstd_value():
+    pytest.importorskip("zstandard")
+
+    stored = codec.encode(DATA, codec=codec.ZSTD)
+    header_size = len(codec.MAGIC) + 2
+    with pytest.raises(codec.CodecError):
+        codec.decode(stored[: header_size + 8])
+
+    with pytest.raises(codec.CodecError):
+        codec.decode(stored[:header_size] + b"foo")
+
+
+@pytest.mark.parametrize("name", list(codec.CODEC_IDS))
+def test_check_codec(name: str, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(codec, "_import_zstandard", lambda: object())
+    codec.check_codec(name)
+
+
+@pytest.mark.parametrize("name", ["foo", ""])
+def test_check_codec_with_unknown_codec(name: str):
+    with pytest.raises(ValueError, match="Unknown cache codec"):
+        codec.check_codec(name)
+
+
+def test_check_codec_without_zstandard(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(codec, "_import_zstandard", lambda: None)
+    with pytest.raises(ValueError, match="zstd extra"):
+        codec.check_codec(codec.ZSTD)
+
+
+def test_counter():
+    writes = codec.counter.writes
+    stored = codec.encode(DATA, codec=codec.ZLIB)
+    assert codec.counter.writes == writes + 1
+    assert codec.counter.stored_bytes >= len(stored)
+
+
+def test_encode_with_level_setting(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(settings, "REDIS_CACHE_COMPRESSION_LEVEL", 0)
+    stored = codec.encode(DATA, codec=codec.ZLIB)
+    # level 0 stores the data as it is
+    assert len(stored) > len(DATA)
+
+    # unless a level is given
+    assert len(codec.encode(DATA, codec=codec.ZLIB, level=9)) < len(DATA) / 10
@@ -0,0 +1,38 @@
+import time
+
+import pytest
+
+from backend.executors import (
+    PARSE_EXECUTORS,
+    check_parse_executor,
+    run_in_process,
+    shutdown_process_pool,
+    start_process_pool,
+)
+
+
+@pytest.mark.parametrize("executor", PARSE_EXECUTORS)
+def test_check_parse_executor(executor: str):
+    check_parse_executor(executor)
+
+
+@pytest.mark.parametrize("executor", ["processes", "thread", ""])
+def test_check_parse_executor_with_unknown_executor(executor: str):
+    with pytest.raises(ValueError, match="Unknown parse executor"):
+        check_parse_executor(executor)
+
+
+@pytest.fixture
+def single_worker_pool():
+    start_process_pool(max_workers=1)
+    yield
+    shutdown_process_pool()
+
+
+@pytest.mark.usefixtures("single_worker_pool")
+async def test_run_in_process_recycles_pool_on_timeout():
+    with pytest.raises(TimeoutError):
+        await run_in_process(time.sleep, 60, job_timeout=0.5)
+
+    # the only worker would be sleeping for a minute if it were not killed
+    assert await run_in_process(abs, -1, job_timeout=30) == 1
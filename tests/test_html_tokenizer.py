@@ -0,0 +1,48 @@
+import pytest
+
+from backend.html_tokenizer import tokenize
+
+
+def test_tokenize():
+    got = tokenize(
+        '<html><head><title>https://title.example.com</title></head><body><a href="https://a.com">A&amp;B</a><img src="https://b.com/a.png" alt="img"></body></html>'
+    )
+    assert got.hrefs == ["https://a.com"]
+    assert "A&B" in got.text
+    assert "https://b.com/a.png" in got.text
+    assert "title.example.com" not in got.text
+
+
+@pytest.mark.parametrize(
+    ("html", "expected"),
+    [
+        # inline elements do not separate text
+        ("https://exa<b>mple.com</b>", "https://example.com"),
+        # block elements do
+        ("<td>foo</td><td>bar</td>", "\nfoo\n\nbar\n"),
+        # script and style contents are not visible
+        ("<script>var x = 1;</script><style>a {}</style>foo", "foo"),
+    ],
+)
+def test_tokenize_text(html: str, expected: str):
+    assert tokenize(html).text == expected
+
+
+@pytest.mark.parametrize(
+    "html",
+    [
+        "<html><head><meta charset=utf-8><body><p>see https://evil.example.com/x</p>",
+        "<html><head><title>foo<p>see https://evil.example.com/x</p>",
+        "<head><title>foo</title>see <a href='x'>https://evil.example.com/x</a>",
+    ],
+)
+@pytest.mark.parametrize("use_lxml", [False, None])
+def test_tokenize_with_unclosed_head(html: str, use_lxml: bool | None):
+    assert "https://evil.example.com/x" in tokenize(html, use_lxml=use_lxml).text
+
+
+def test_tokenize_with_broken_html():
+    got = tokenize('<div><a href="https://a.com">foo<p>bar')
+    assert got.hrefs == ["https://a.com"]
+    assert "foo" in got.text
+    assert "bar" in got.text
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+import pytest
+
+# heavy dependencies which are imported on first use (see backend.factories)
+LAZY_MODULES = [
+    "confusable_homoglyphs",
+    "dateparser",
+    "dkim",
+    "eml_parser",
+    "ioc_finder",
+    "oletools",
+]
+
+
+def import_module(module: str) -> tuple[list[tuple[str, int]], set[str]]:
+    """Import a module in a fresh interpreter.
+
+    Returns the cumulative import time (in microseconds) of each module and the names
+    of the imported modules.
+    """
+    code = f"import sys, {module}; print('\\n'.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    timings: list[tuple[str, int]] = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        timings.append((name.strip(), int(cumulative)))
+
+    return timings, set(result.stdout.split())
+
+
+@pytest.fixture(scope="module")
+def imported() -> tuple[list[tuple[str, int]], set[str]]:
+    return import_module("backend.main")
+
+
+def test_lazy_imports(
+    imported: tuple[list[tuple[str, int]], set[str]], record_property
+):
+    timings, modules = imported
+
+    # the report of the slowest imports (in the JUnit XML report and on failure)
+    slowest = sorted(timings, key=lambda t: t[1], reverse=True)[:20]
+    report = "\n".join(
+        f"{cumulative / 1000:10.1f} ms  {name}" for name, cumulative in slowest
+    )
+    record_property("import_time", report)
+
+    eager = [module for module in LAZY_MODULES if module in modules]
+    assert eager == [], report
@@ -0,0 +1,125 @@
+import glob
+import time
+
+import eml_parser
+import pytest
+from ioc_finder import (
+    parse_domain_names,
+    parse_email_addresses,
+    parse_ipv4_addresses,
+    parse_urls,
+)
+
+from backend.ioc import MAX_CANDIDATE_SIZE, IOCs, extract_iocs
+
+
+def find_iocs(text: str) -> IOCs:
+    return IOCs(
+        urls=set(parse_urls(text, parse_urls_without_scheme=False)),
+        emails=set(parse_email_addresses(text)),
+        domains=set(parse_domain_names(text)),
+        ipv4s=set(parse_ipv4_addresses(text)),
+    )
+
+
+def collect_bodies() -> list[str]:
+    parser = eml_parser.EmlParser(include_raw_body=True)
+    bodies: list[str] = []
+    for path in sorted(glob.glob("tests/fixtures/**/*.eml", recursive=True)):
+        with open(path, "rb") as f:
+            parsed = parser.decode_email_bytes(f.read())
+
+        bodies.extend(body.get("content", "") for body in parsed.get("body", []))
+
+    return bodies
+
+
+def test_extract_iocs():
+    got = extract_iocs(
+        "Visit HXXP://Example.COM/path?q=1#top or mail Foo@Example.com from 10.0.0.01"
+    )
+    assert got.urls == {"hxxp://example.com/path?q=1#top"}
+    assert got.emails == {"foo@example.com"}
+    assert got.domains == {"example.com"}
+    assert got.ipv4s == {"10.0.0.1"}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "1.2.3.4.",
+        "1.2.3.4.5",
+        "1.2.3.4_",
+        "256.1.1.1",
+        "1.2.3.4\n.org",
+        "_foo.com",
+        "x._foo.com",
+        "a.com-x",
+        "a.xn--p1ai",
+        "x@_a.com",
+        "x@[1.2.3.4]",
+        "x@[IPv6:2001:db8::1]",
+        "http://a.com:/x",
+        "http://a.com/?",
+        "http://a.com/é",
+        "http://localhost/x",
+        "http://fe80::1/x",
+        "http://user@a.com:8080/x#f?q",
+        '<a href="http://a.com/x"/>',
+        "(see http://a.com/x)",
+        "mailto:foo@a.com,bar@b.org",
+    ],
+)
+def test_extract_iocs_parity(text: str):
+    assert extract_iocs(text) == find_iocs(text)
+
+
+def test_extract_iocs_parity_with_fixtures():
+    for body in collect_bodies():
+        assert extract_iocs(body) == find_iocs(body)
+
+
+def test_extract_iocs_with_long_run():
+    # matching a run of dotted labels is roughly quadratic in its length
+    started = time.monotonic()
+    got = extract_iocs("a." * 16 * 1024 + " see example.com")
+    assert time.monotonic() - started < 1.0
+    assert got.truncated is False
+    assert got.domains == {"example.com"}
+
+
+def test_extract_iocs_after_long_run():
+    text = "-" * (MAX_CANDIDATE_SIZE + 4) + ">http://evil.example.com/login"
+    got = extract_iocs(text)
+    assert got == find_iocs(text)
+    assert got.urls == {"http://evil.example.com/login"}
+
+
+@pytest.mark.parametrize(
+    "prefix", ["a." * MAX_CANDIDATE_SIZE, "x," * MAX_CANDIDATE_SIZE * 3]
+)
+def test_extract_iocs_after_long_run_of_candidates(prefix: str):
+    # (ioc_finder is too slow to compare with)
+    got = extract_iocs(prefix + ",foo@evil.example.com,10.0.0.1")
+    assert got.emails == {"foo@evil.example.com"}
+    assert got.domains == {"evil.example.com"}
+    assert got.ipv4s == {"10.0.0.1"}
+    assert got.truncated is False
+
+
+def test_extract_iocs_with_long_ioc():
+    url = "http://example.com/" + "a" * MAX_CANDIDATE_SIZE
+    got = extract_iocs(url)
+    # the URL is cut
+    assert got.urls == {url[:MAX_CANDIDATE_SIZE]}
+    assert got.truncated is True
+
+
+def test_extract_iocs_with_deadline():
+    # the local part of an email address is matched from each of its labels
+    text = "a-" * 200_000 + "@"
+    started = time.monotonic()
+    got = extract_iocs(text, deadline=started + 0.5)
+    assert time.monotonic() - started < 1.0
+    assert got.truncated is True
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+import pytest
+
+from backend.ioc_cache import MISSING, IOCCache, LRUCache
+
+
+@pytest.fixture
+def cache() -> IOCCache:
+    return IOCCache(ttls={"foo": 60}, negative_ttl=60, max_size=10, enabled=True)
+
+
+async def get_or_fetch(cache: IOCCache, ioc: str, value: dict | None, calls: list):
+    async def fetch():
+        calls.append(ioc)
+        await asyncio.sleep(0.01)
+        return value
+
+    return await cache.get_or_fetch(
+        "foo", ioc, fetch, dumps=json.dumps, loads=json.loads
+    )
+
+
+def test_lru_cache():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+
+    # "b" is the least recently used one
+    cache.set("c", 3, ttl=60)
+    assert len(cache) == 2
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get("b") is MISSING
+
+
+def test_lru_cache_with_expired_entry():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1, ttl=-1)
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch(cache: IOCCache):
+    calls: list[str] = []
+    assert await get_or_fetch(cache, "bar", {"bar": 1}, calls) == {"bar": 1}
+    assert await get_or_fetch(cache, "bar", {"bar": 1}, calls) == {"bar": 1}
+    assert calls == ["bar"]
+
+    counter = cache.counters["foo"]
+    assert counter.misses == 1
+    assert counter.memory_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_with_not_found(cache: IOCCache):
+    calls: list[str] = []
+    assert await get_or_fetch(cache, "bar", None, calls) is None
+    assert await get_or_fetch(cache, "bar", None, calls) is None
+    assert calls == ["bar"]
+    assert cache.counters["foo"].negative_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_with_concurrent_lookups(cache: IOCCache):
+    calls: list[str] = []
+    got = await asyncio.gather(
+        *[get_or_fetch(cache, "bar", {"bar": 1}, calls) for _ in range(5)]
+    )
+    assert got == [{"bar": 1}] * 5
+    assert calls == ["bar"]
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_with_unknown_provider(cache: IOCCache):
+    calls: list[str] = []
+
+    async def fetch():
+        calls.append("bar")
+        return {"bar": 1}
+
+    for _ in range(2):
+        await cache.get_or_fetch(
+            "unknown", "bar", fetch, dumps=json.dumps, loads=json.loads
+        )
+
+    assert calls == ["bar", "bar"]
+
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_within_batch():
+    cache = IOCCache(ttls={"foo": 60}, negative_ttl=60, max_size=10, enabled=False)
+    calls: list[str] = []
+    with cache.batch():
+        got = await asyncio.gather(
+            *[get_or_fetch(cache, "bar", {"bar": 1}, calls) for _ in range(3)]
+        )
+        assert got == [{"bar": 1}] * 3
+        assert await get_or_fetch(cache, "bar", {"bar": 1}, calls) == {"bar": 1}
+
+    assert calls == ["bar"]
+
+    # lookups are not shared outside of a batch
+    await get_or_fetch(cache, "bar", {"bar": 1}, calls)
+    assert calls == ["bar", "bar"]
@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import time
+
+import pytest
+
+from backend import clients, jobs, schemas
+from backend.cache import get_key
+from backend.factories.response import parse
+from backend.jobs import (
+    ABANDONED_ERROR,
+    ATTEMPTS,
+    DONE,
+    FAILED,
+    HEARTBEAT_AT,
+    QUEUED,
+    RUNNING,
+    QueueFullError,
+    enqueue_job,
+    get_job,
+    get_job_key,
+    get_lease_key,
+    get_processing_key,
+    get_queue_key,
+    get_workers_key,
+    requeue_abandoned_jobs,
+    run_job,
+    run_worker,
+)
+from tests.fake_redis import FakeRedis
+
+
+@pytest.fixture
+def response(sample_eml: bytes) -> schemas.Response:
+    return parse(sample_eml)
+
+
+@pytest.fixture(autouse=True)
+def cached(monkeypatch: pytest.MonkeyPatch) -> dict[str, schemas.Response]:
+    # the analysis cache, holding the responses as they are
+    cached: dict[str, schemas.Response] = {}
+
+    async def cache_response(redis, response: schemas.Response):
+        cached[response.id] = response
+
+    async def get_cached_response(redis, id: str):
+        return cached.get(id)
+
+    monkeypatch.setattr(jobs, "cache_response", cache_response)
+    monkeypatch.setattr(jobs, "get_cached_response", get_cached_response)
+    return cached
+
+
+def test_get_job_key():
+    assert get_job_key("foo", key_prefix="job") == "job:foo"
+
+
+def test_get_queue_key():
+    assert get_queue_key(key_prefix="job") == "queue:job"
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job(redis: FakeRedis, sample_eml: bytes):
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    assert job.id == hashlib.sha256(sample_eml).hexdigest()
+    assert job.status == QUEUED
+    assert job.submitted_at is not None
+
+    # a queued job is not queued again
+    again = await enqueue_job(redis, sample_eml)  # type: ignore
+    assert again.status == QUEUED
+    assert await redis.llen(get_queue_key()) == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job_concurrently(
+    monkeypatch: pytest.MonkeyPatch, redis: FakeRedis, sample_eml: bytes
+):
+    # another submission of the same file queues it between the check and the queueing
+    exists = redis.exists
+    submitted = False
+
+    async def exists_and_submit(*keys: str) -> int:
+        nonlocal submitted
+        if not submitted:
+            submitted = True
+            await enqueue_job(redis, sample_eml)  # type: ignore
+        return await exists(*keys)
+
+    monkeypatch.setattr(redis, "exists", exists_and_submit)
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    assert job.status == QUEUED
+    assert await redis.llen(get_queue_key()) == 1
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job_with_full_queue(
+    redis: FakeRedis, sample_eml: bytes, cc_eml: bytes
+):
+    await enqueue_job(redis, sample_eml, max_queued=1)  # type: ignore
+    with pytest.raises(QueueFullError):
+        await enqueue_job(redis, cc_eml, max_queued=1)  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_enqueue_job_with_cached_response(
+    redis: FakeRedis,
+    sample_eml: bytes,
+    response: schemas.Response,
+    cached: dict[str, schemas.Response],
+):
+    cached[response.id] = response
+    await redis.hset(get_key(response.id), "response", "{}")
+
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    assert job.status == DONE
+    assert job.response is not None
+    assert await redis.llen(get_queue_key()) == 0
+
+    # unless it is refreshed
+    job = await enqueue_job(redis, sample_eml, force_refresh=True)  # type: ignore
+    assert job.status == QUEUED
+
+
+@pytest.mark.asyncio
+async def test_run_job(
+    monkeypatch: pytest.MonkeyPatch,
+    redis: FakeRedis,
+    sample_eml: bytes,
+    response: schemas.Response,
+):
+    statuses: list[str | None] = []
+
+    async def call(file: bytes, **kwargs) -> schemas.Response:
+        # the event loop is not blocked by the parser (which keeps the heartbeats going)
+        assert kwargs["executor"] == "process"
+        await asyncio.sleep(0.05)
+        job = await get_job(redis, response.id)  # type: ignore
+        statuses.append(job.status if job else None)
+        return response
+
+    monkeypatch.setattr(jobs.ResponseFactory, "call", call)
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    await run_job(
+        redis,  # type: ignore
+        job.id,
+        shared_clients=clients.SharedClients(),
+        spam_assassin=clients.SpamAssassin(),
+        heartbeat_interval=0.01,
+    )
+
+    assert statuses == [RUNNING]
+    job = await get_job(redis, job.id)  # type: ignore
+    assert job is not None
+    assert job.status == DONE
+    assert job.started_at is not None
+    assert job.finished_at is not None
+    assert job.response is not None
+    # the file is removed, and the heartbeats were sent while the job was running
+    key = get_job_key(job.id)
+    assert await redis.hget(key, "file") is None
+    heartbeat_at = await redis.hget(key, HEARTBEAT_AT)
+    assert heartbeat_at is not None
+    assert float(heartbeat_at) > time.time() - 1
+    assert await redis.hget(key, ATTEMPTS) == b"1"
+
+
+@pytest.mark.asyncio
+async def test_run_job_with_error(
+    monkeypatch: pytest.MonkeyPatch, redis: FakeRedis, sample_eml: bytes
+):
+    async def call(file: bytes, **kwargs) -> schemas.Response:
+        raise ValueError("foo")
+
+    monkeypatch.setattr(jobs.ResponseFactory, "call", call)
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    await run_job(
+        redis,  # type: ignore
+        job.id,
+        shared_clients=clients.SharedClients(),
+        spam_assassin=clients.SpamAssassin(),
+    )
+
+    job = await get_job(redis, job.id)  # type: ignore
+    assert job is not None
+    assert job.status == FAILED
+    assert job.error == "foo"
+    assert await redis.hget(get_job_key(job.id), "file") is None
+
+
+async def take_job(redis: FakeRedis, worker_id: str) -> str:
+    # a worker takes a job as run_worker does, and dies
+    await redis.sadd(get_workers_key(), worker_id)
+    taken = await redis.blmove(
+        get_queue_key(), get_processing_key(worker_id), 0, "RIGHT", "LEFT"
+    )
+    assert taken is not None
+    await redis.hset(
+        get_job_key(taken.decode()),
+        mapping={"status": RUNNING, HEARTBEAT_AT: str(time.time() - 120)},
+    )
+    await redis.hincrby(get_job_key(taken.decode()), ATTEMPTS)
+    return taken.decode()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_job(redis: FakeRedis, sample_eml: bytes, cc_eml: bytes):
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    await take_job(redis, "dead")
+    # a job which was queued then is left to the other workers
+    other = await enqueue_job(redis, cc_eml)  # type: ignore
+
+    # a resubmission does not queue it twice
+    got = await enqueue_job(redis, sample_eml)  # type: ignore
+    assert got.status == RUNNING
+    assert await redis.llen(get_queue_key()) == 1
+
+    # the lease of the worker has expired, so its job is queued again (to be taken
+    # first)
+    assert await requeue_abandoned_jobs(redis) == 1  # type: ignore
+    got = await get_job(redis, job.id)  # type: ignore
+    assert got is not None
+    assert got.status == QUEUED
+    assert got.started_at is None
+    assert await redis.lrange(get_queue_key(), 0, -1) == [
+        other.id.encode(),
+        job.id.encode(),
+    ]
+    assert await redis.llen(get_processing_key("dead")) == 0
+    assert await redis.smembers(get_workers_key()) == set()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_job_of_live_worker(redis: FakeRedis, sample_eml: bytes):
+    await enqueue_job(redis, sample_eml)  # type: ignore
+    await take_job(redis, "alive")
+    await redis.set(get_lease_key("alive"), "1", px=60_000)
+
+    assert await requeue_abandoned_jobs(redis) == 0  # type: ignore
+    assert await redis.llen(get_processing_key("alive")) == 1
+    assert await redis.llen(get_queue_key()) == 0
+
+
+@pytest.mark.asyncio
+async def test_abandoned_job_with_max_attempts(redis: FakeRedis, sample_eml: bytes):
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    await take_job(redis, "dead")
+    assert await requeue_abandoned_jobs(redis, max_attempts=2) == 1  # type: ignore
+    await take_job(redis, "dead")
+
+    # the job has crashed two workers, so it is not queued a third time
+    assert await requeue_abandoned_jobs(redis, max_attempts=2) == 0  # type: ignore
+    got = await get_job(redis, job.id)  # type: ignore
+    assert got is not None
+    assert got.status == FAILED
+    assert got.error == ABANDONED_ERROR
+    assert await redis.llen(get_queue_key()) == 0
+    assert await redis.hget(get_job_key(job.id), "file") is None
+
+
+@pytest.mark.asyncio
+async def test_run_worker(
+    monkeypatch: pytest.MonkeyPatch,
+    redis: FakeRedis,
+    sample_eml: bytes,
+    response: schemas.Response,
+):
+    stopping = asyncio.Event()
+    processing: list[list[bytes]] = []
+
+    async def call(file: bytes, **kwargs) -> schemas.Response:
+        processing.append(await redis.lrange(get_processing_key("worker"), 0, -1))
+        stopping.set()
+        return response
+
+    monkeypatch.setattr(jobs.ResponseFactory, "call", call)
+    job = await enqueue_job(redis, sample_eml)  # type: ignore
+    # a worker died with a job, which the worker queues again and runs
+    await take_job(redis, "dead")
+
+    await asyncio.wait_for(
+        run_worker(
+            redis,  # type: ignore
+            shared_clients=clients.SharedClients(),
+            spam_assassin=clients.SpamAssassin(),
+            stopping=stopping,
+            worker_id="worker",
+            poll_timeout=0.01,
+            heartbeat_interval=0.01,
+        ),
+        timeout=5,
+    )
+
+    # the job was in the processing list of the worker while it ran
+    assert processing == [[job.id.encode()]]
+    got = await get_job(redis, job.id)  # type: ignore
+    assert got is not None
+    assert got.status == DONE
+    assert await redis.hget(get_job_key(job.id), ATTEMPTS) == b"2"
+    assert await redis.llen(get_processing_key("worker")) == 0
+    # the lease is released on stopping
+    assert await redis.exists(get_lease_key("worker")) == 0
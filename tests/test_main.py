@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+
+from backend.__main__ import end_last_line, load_done_ids, main
+
+
+def test_main(tmp_path: Path, sample_eml: bytes, cc_eml: bytes):
+    emails = tmp_path / "emails"
+    (emails / "nested").mkdir(parents=True)
+    (emails / "sample.eml").write_bytes(sample_eml)
+    (emails / "nested" / "cc.eml").write_bytes(cc_eml)
+    (emails / "notes.txt").write_bytes(b"\x00\x01")
+    output = tmp_path / "results.jsonl"
+
+    main([str(emails), "-o", str(output), "--workers", "0"])
+
+    events = [json.loads(line) for line in output.read_bytes().splitlines()]
+    assert sorted(event["type"] for event in events) == ["error", "result", "result"]
+    assert len(load_done_ids(str(output))) == 2
+
+    # a rerun skips the emails already analyzed (but retries the failed ones)
+    main([str(emails), "-o", str(output), "--workers", "0"])
+
+    events = [json.loads(line) for line in output.read_bytes().splitlines()]
+    assert [event["type"] for event in events[3:]] == ["error"]
+
+
+def test_main_after_interrupted_run(tmp_path: Path, sample_eml: bytes, cc_eml: bytes):
+    emails = tmp_path / "emails"
+    emails.mkdir()
+    (emails / "sample.eml").write_bytes(sample_eml)
+    (emails / "cc.eml").write_bytes(cc_eml)
+    output = tmp_path / "results.jsonl"
+    # the truncated last line of an interrupted run
+    output.write_bytes(b'{"type":"result","index":0,"filen')
+
+    main([str(emails), "-o", str(output), "--workers", "0"])
+
+    lines = output.read_bytes().splitlines()
+    assert lines[0] == b'{"type":"result","index":0,"filen'
+    # the results are not glued to it
+    events = [json.loads(line) for line in lines[1:]]
+    assert [event["type"] for event in events] == ["result", "result"]
+    assert len(load_done_ids(str(output))) == 2
+
+
+def test_end_last_line(tmp_path: Path):
+    output = tmp_path / "results.jsonl"
+    for content, expected in [
+        (b"", b""),
+        (b"{}\n", b"{}\n"),
+        (b"{}\n{", b"{}\n{\n"),
+    ]:
+        output.write_bytes(content)
+        with open(output, "a+b") as f:
+            end_last_line(f)
+        assert output.read_bytes() == expected
+
+
+def test_load_done_ids(tmp_path: Path):
+    output = tmp_path / "results.jsonl"
+    output.write_bytes(
+        b'{"type":"result","index":0,"filename":"a.eml","response":{"id":"a"}}\n'
+        b'{"type":"error","index":1,"filename":"b.eml","status":422,"detail":"x"}\n'
+        # the truncated last line of an interrupted run
+        b'{"type":"result","index":2,"filen'
+    )
+    assert load_done_ids(str(output)) == {"a"}
+    assert load_done_ids(str(tmp_path / "missing.jsonl")) == set()
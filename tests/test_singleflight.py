@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from backend.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_do():
+    flight = SingleFlight()
+    calls: list[str] = []
+
+    async def func():
+        calls.append("called")
+        await asyncio.sleep(0.01)
+        return "result"
+
+    got = await asyncio.gather(*[flight.do("key", func) for _ in range(10)])
+    assert got == ["result"] * 10
+    assert len(calls) == 1
+    assert "key" not in flight
+
+
+@pytest.mark.asyncio
+async def test_do_with_different_keys():
+    flight = SingleFlight()
+    calls: list[str] = []
+
+    async def func(key: str):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    got = await asyncio.gather(
+        flight.do("foo", lambda: func("foo")), flight.do("bar", lambda: func("bar"))
+    )
+    assert got == ["foo", "bar"]
+    assert sorted(calls) == ["bar", "foo"]
+
+
+@pytest.mark.asyncio
+async def test_do_with_error():
+    flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.01)
+        raise ValueError("oops")
+
+    got = await asyncio.gather(
+        flight.do("key", func), flight.do("key", func), return_exceptions=True
+    )
+    assert all(isinstance(e, ValueError) for e in got)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_do_with_cancelled_caller():
+    flight = SingleFlight()
+
+    async def func():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    first = asyncio.create_task(flight.do("key", func))
+    second = asyncio.create_task(flight.do("key", func))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == "result"
@@ -0,0 +1,108 @@
+import asyncio
+import email
+import hashlib
+import os
+import tracemalloc
+from collections.abc import AsyncIterator, Callable
+from email.message import EmailMessage
+
+import pytest
+
+from backend.factories import eml
+from backend.factories.eml import EmlFactory
+from backend.uploads import UploadTooLargeError, spool_email
+
+
+async def iter_chunks(data: bytes, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def get_peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def large_eml() -> bytes:
+    message = EmailMessage()
+    message["From"] = "sender@example.com"
+    message["To"] = "recipient@example.com"
+    message["Subject"] = "Large attachment"
+    message.set_content("See the attachment")
+    message.add_attachment(
+        os.urandom(4 * 1024 * 1024),
+        maintype="application",
+        subtype="octet-stream",
+        filename="large.bin",
+    )
+    return message.as_bytes()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_memory_size", [1024 * 1024, 1024])
+async def test_spool_email(sample_eml: bytes, max_memory_size: int):
+    async with spool_email(
+        iter_chunks(sample_eml, 1000), max_memory_size=max_memory_size
+    ) as spool:
+        assert spool.size == len(sample_eml)
+        assert spool.sha256 == hashlib.sha256(sample_eml).hexdigest()
+        assert spool.is_email()
+        view = spool.view()
+
+    # the view outlives the spool
+    assert bytes(view) == sample_eml
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_memory_size", [1024 * 1024, 1024])
+async def test_spool_email_sniffing(
+    outer_msg: bytes, xls_with_macro: bytes, max_memory_size: int
+):
+    async with spool_email(
+        iter_chunks(outer_msg), max_memory_size=max_memory_size
+    ) as spool:
+        assert spool.is_email()
+
+    # an OLE file which is not a msg file
+    async with spool_email(
+        iter_chunks(xls_with_macro), max_memory_size=max_memory_size
+    ) as spool:
+        assert not spool.is_email()
+
+
+@pytest.mark.asyncio
+async def test_spool_email_with_max_size(sample_eml: bytes):
+    with pytest.raises(UploadTooLargeError):
+        async with spool_email(iter_chunks(sample_eml, 1000), max_size=1000):
+            pass
+
+
+def test_spooled_email_peak_memory(monkeypatch: pytest.MonkeyPatch, large_eml: bytes):
+    def analyze_spooled():
+        async def spool_and_parse():
+            async with spool_email(iter_chunks(large_eml)) as spool:
+                view = spool.view()
+
+            EmlFactory().call(view)
+
+        asyncio.run(spool_and_parse())
+
+    def analyze_in_memory():
+        # as an upload used to be: read into bytes, then decoded at once
+        file = bytes(memoryview(large_eml))
+        with monkeypatch.context() as m:
+            m.setattr(
+                eml,
+                "message_from_buffer",
+                lambda data, policy: email.message_from_bytes(data, policy=policy),
+            )
+            EmlFactory().call(file)
+
+    spooled = get_peak_memory(analyze_spooled)
+    in_memory = get_peak_memory(analyze_in_memory)
+    assert spooled < in_memory * 0.75
@@ -1,6 +1,19 @@
+import base64
+import hashlib
+from email.message import EmailMessage
+
 import pytest
 
-from backend.utils import normalize_url, parse_urls_from_body
+from backend import schemas
+from backend.factories.response import parse
+from backend.schemas.eml import Hash
+from backend.utils import (
+    attachment_to_file,
+    extract_body_iocs,
+    get_attached_messages,
+    normalize_url,
+    parse_urls_from_body,
+)
 
 
 @pytest.mark.parametrize(
@@ -54,6 +67,12 @@ def test_normalize_url(url: str, expected: str):
             "text/html",
             {"https://a.com", "https://b.com"},
         ),
+        # HTML with an unclosed head
+        (
+            "<html><head><meta charset=utf-8><body><p>see https://evil.example.com/x</p>",
+            "text/html",
+            {"https://evil.example.com/x"},
+        ),
         # non-http hrefs are excluded
         (
             '<a href="mailto:a@b.com">email</a>',
@@ -64,3 +83,70 @@ def test_normalize_url(url: str, expected: str):
 )
 def test_parse_urls_from_body(content: str, content_type: str, expected: set[str]):
     assert parse_urls_from_body(content, content_type) == expected
+
+
+def test_extract_body_iocs():
+    iocs, urls = extract_body_iocs(
+        "<html><head><style>p { font-family: x.example.org; }</style></head><body>"
+        '<p style="color: red">mail 1.2.3.4 or <a href="mailto:a@example.com">us</a>'
+        ' <a href="https://a.example.com/x">here</a></p></body></html>',
+        "text/html",
+    )
+    # the visible text and the links are scanned (but not the markup)
+    assert urls == {"https://a.example.com/x"}
+    assert iocs.emails == {"a@example.com"}
+    assert iocs.ipv4s == {"1.2.3.4"}
+    assert "x.example.org" not in iocs.domains
+    assert {"example.com", "a.example.com"} <= iocs.domains
+
+    iocs, urls = extract_body_iocs("see https://a.com or a@b.com", "text/plain")
+    assert urls == {"https://a.com"}
+    assert iocs.emails == {"a@b.com"}
+
+
+@pytest.fixture
+def attachment() -> schemas.Attachment:
+    return schemas.Attachment(
+        raw=base64.b64encode(b"foo").decode(),
+        filename="foo.txt",
+        size=3,
+        hash=Hash(md5="", sha1="", sha256="", sha512=""),
+        mime_type="text/plain",
+        mime_type_short="txt",
+        content_header={},
+    )
+
+
+def test_attachment_to_file(attachment: schemas.Attachment):
+    file = attachment_to_file(attachment)
+    assert file.read() == b"foo"
+    assert file.name == "foo.txt"
+
+
+def test_attachment_to_file_with_blob(attachment: schemas.Attachment):
+    # an attachment whose raw content is stored as a blob
+    attachment.raw = None
+    assert attachment_to_file(attachment, b"bar").read() == b"bar"
+
+
+def make_message(subject: str, content: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "user@example.com"
+    message["Subject"] = subject
+    message.set_content(content)
+    return message
+
+
+def test_get_attached_messages():
+    small = make_message("small", "foo")
+    # quotes the small one, which is not attached to it though
+    quoting = make_message("quoting", small.as_string())
+    outer = make_message("outer", "bar")
+    for attached in [small, quoting, small]:
+        outer.add_attachment(attached, filename="attached.eml")
+
+    response = parse(outer.as_bytes())
+    messages = get_attached_messages(response.eml, response.attachment_store)
+    assert len(messages) == 2
+    for sha256, message in messages.items():
+        assert hashlib.sha256(message).hexdigest() == sha256